@@ -0,0 +1,115 @@
+'''
+Decoding of tagger predictions given as label ids (as a model outputs them)
+against the labels text round trip: writing the predicted labels as text and
+decoding the blocks with LinearizedTree.from_string. Both start from the same
+words, postags and label id array and produce the same decoded trees, which
+is checked, for the constituent (ABS) and dependency (ABS, REL, BRK) encodings.
+Both sides spend most of their time in decode and postprocess_tree, so the
+difference only shows where decoding is cheap (the dependency ABS and REL
+encodings, which decode the whole batch with array operations).
+
+    python -m benchmarks.bench_array_decode [--trees file.trees] [--conllu file.conllu]
+'''
+from codelin.encs.enc_const import C_DepthBasedAbsolute
+from codelin.encs.enc_deps import D_NaiveAbsoluteEncoding, D_NaiveRelativeEncoding, D_BrkBasedEncoding
+from codelin.encs.constituent import decode_constituent_arrays
+from codelin.encs.dependency import decode_dependencies_arrays
+from codelin.models.const_tree import C_Tree
+from codelin.models.deps_tree import D_Tree
+from codelin.models.label_vocab import LabelVocabulary
+from codelin.models.linearized_tree import LinearizedTree
+from codelin.utils.conllu import ConlluWriter
+from codelin.utils.constants import C_STRAT_MAX, D_ROOT_HEAD
+from benchmarks.synthetic import write_const_treebank, write_deps_treebank
+
+import numpy as np
+import argparse
+import tempfile
+import time
+import os
+
+def predictions(encoder, trees, mode):
+    '''
+    Turns encoded trees into what a tagger outputs: the words and postags
+    of all the sentences, the label id of each word and the sentence offsets
+    '''
+    vocab = LabelVocabulary(mode, encoder.separator, "[+]")
+    words, postags, label_ids, offsets = [], [], [], [0]
+    for tree in trees:
+        lin_tree = encoder.encode(tree)
+        words.extend(lin_tree.words)
+        postags.extend(lin_tree.postags)
+        label_ids.extend(vocab.add(label) for label in lin_tree.labels)
+        offsets.append(len(words))
+    return words, postags, np.array(label_ids, dtype=np.int32), np.array(offsets), vocab
+
+def text_round_trip(mode, decoder, words, postags, label_ids, offsets, vocab):
+    strings = vocab.strings
+    blocks = []
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        blocks.append("\n".join(words[i]+"\t"+postags[i]+"\t"+strings[label_ids[i]] for i in range(start, end)))
+    text = "\n\n".join(blocks)
+
+    trees = []
+    for block in text.split("\n\n"):
+        lin_tree = LinearizedTree.from_string(block, mode=mode, separator=decoder.separator, unary_joiner="[+]")
+        tree = decoder.decode(lin_tree)
+        if mode == "CONST":
+            trees.append(tree.postprocess_tree(C_STRAT_MAX, True))
+        else:
+            tree.postprocess_tree(D_ROOT_HEAD, False)
+            trees.append(tree)
+    if mode == "CONST":
+        return "".join(str(tree).replace('\n', '') + '\n' for tree in trees)
+    writer = ConlluWriter()
+    writer.write_trees(trees)
+    return writer.getvalue()
+
+def array_decode(mode, decoder, words, postags, label_ids, offsets, vocab):
+    if mode == "CONST":
+        return decode_constituent_arrays(decoder, words, label_ids, offsets, vocab, postags=postags, to_string=True)
+    return decode_dependencies_arrays(decoder, words, label_ids, offsets, vocab, postags=postags, to_string=True)
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Decoding from label id arrays benchmark')
+    parser.add_argument('--trees', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--conllu', type=str, default=None, help='Conllu treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=5000, help='Number of synthetic trees')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    trees_path, conllu_path = args.trees, args.conllu
+    if trees_path is None:
+        trees_path = os.path.join(tmp_dir, "synthetic.trees")
+        write_const_treebank(trees_path, args.n_trees)
+    if conllu_path is None:
+        conllu_path = os.path.join(tmp_dir, "synthetic.conllu")
+        write_deps_treebank(conllu_path, args.n_trees)
+
+    c_trees = C_Tree.read_trees_file(trees_path)
+    d_trees = D_Tree.read_conllu_file(conllu_path)
+    cases = [
+        ('CONST (ABS)', "CONST", C_DepthBasedAbsolute("_", "[+]", False, False), c_trees),
+        ('DEPS (ABS)', "DEPS", D_NaiveAbsoluteEncoding("@"), d_trees),
+        ('DEPS (REL)', "DEPS", D_NaiveRelativeEncoding("@", False), d_trees),
+        ('DEPS (BRK)', "DEPS", D_BrkBasedEncoding("@", False), d_trees),
+    ]
+
+    print("-----------------------------------------")
+    print('%-12s %10s %10s %10s %6s' % ('', 'text', 'arrays', 'speedup', 'same'))
+    for name, mode, encoder, trees in cases:
+        preds = predictions(encoder, trees, mode)
+        t_text, text_out = best_time(lambda: text_round_trip(mode, encoder, *preds), args.repeat)
+        t_arrays, arrays_out = best_time(lambda: array_decode(mode, encoder, *preds), args.repeat)
+        print('%-12s %9.2fs %9.2fs %9.1fx %6s' % (name, t_text, t_arrays, t_text/t_arrays, text_out == arrays_out))
+    print("-----------------------------------------")
@@ -0,0 +1,81 @@
+'''
+Measures the tokens/sec written by the buffered ConlluWriter against
+the previous path, which formatted every node through a deepcopy of its
+__dict__ and concatenated the node strings of each tree.
+
+    python -m benchmarks.bench_conllu_write [--input file.conllu] [--n_trees N] [--repeat N]
+'''
+from codelin.models.deps_tree import D_Tree
+from codelin.utils.conllu import ConlluWriter
+from benchmarks.synthetic import write_deps_treebank
+
+import argparse
+import tempfile
+import copy
+import time
+import os
+
+def legacy_node_repr(node):
+    '''
+    Previous implementation of D_Node.__repr__.
+    '''
+    node_fields = copy.deepcopy({'id': node.id, 'form': node.form, 'lemma': node.lemma, 'upos': node.upos,
+                                 'xpos': node.xpos, 'feats': node.feats, 'head': node.head,
+                                 'relation': node.relation, 'deps': node.deps, 'misc': node.misc})
+    node_fields['feats'] = node.feats_to_str()
+    return '\t'.join(str(e) for e in list(node_fields.values()))+'\n'
+
+def legacy_write(file_io, trees):
+    for tree in trees:
+        file_io.write("# text = "+tree.get_sentence()+"\n")
+        file_io.write("".join(legacy_node_repr(node) for node in tree)+"\n")
+
+def buffered_write(file_io, trees):
+    with ConlluWriter(file_io) as writer:
+        writer.write_trees(trees)
+
+def time_writer(writer, out_path, trees, repeat):
+    '''
+    Returns the best time out of repeat runs writing all trees.
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(out_path, "w", encoding="utf-8") as f:
+            writer(f, trees)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CoNLL-U writing throughput benchmark')
+    parser.add_argument('--input', type=str, default=None, help='CoNLL-U treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=5000, help='Number of synthetic trees')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tmp_dir, "synthetic.conllu")
+        write_deps_treebank(in_path, args.n_trees)
+
+    trees = D_Tree.read_conllu_file(in_path, filter_projective=False)
+    n_tokens = sum(len(tree) for tree in trees)
+
+    legacy_path = os.path.join(tmp_dir, "legacy.conllu")
+    buffered_path = os.path.join(tmp_dir, "buffered.conllu")
+    t_legacy = time_writer(legacy_write, legacy_path, trees, args.repeat)
+    t_buffered = time_writer(buffered_write, buffered_path, trees, args.repeat)
+
+    with open(legacy_path) as f_legacy, open(buffered_path) as f_buffered:
+        if f_legacy.read() != f_buffered.read():
+            print("[*] Warning: writers produced different files")
+
+    print("-----------------------------------------")
+    print('%-22s %d' % ('trees', len(trees)))
+    print('%-22s %d' % ('tokens', n_tokens))
+    print('%-22s %.3fs (%.0f tokens/s)' % ('deepcopy repr', t_legacy, n_tokens/t_legacy))
+    print('%-22s %.3fs (%.0f tokens/s)' % ('buffered writer', t_buffered, n_tokens/t_buffered))
+    print('%-22s %.2fx' % ('speedup', t_legacy/t_buffered))
+    print("-----------------------------------------")
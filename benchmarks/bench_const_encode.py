@@ -0,0 +1,73 @@
+'''
+Compares the constituent encoding pipeline that pickles parsed trees to a fresh
+process pool (one tree per task) against the persistent worker pool that ships
+chunks of raw bracketed lines.
+
+    python -m benchmarks.bench_const_encode [--input file.trees] [--enc ABS] [--workers N] [--chunk_size N]
+'''
+from codelin.encs.constituent import encode_constituent
+from codelin.encs.enc_const import *
+from codelin.models.const_tree import C_Tree
+from codelin.utils.constants import C_ABSOLUTE_ENCODING, C_RELATIVE_ENCODING, C_DYNAMIC_ENCODING, C_TETRA_ENCODING
+from benchmarks.synthetic import write_const_treebank
+from concurrent.futures import ProcessPoolExecutor
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+import os
+
+def encode_pickled_trees(in_path, out_path, encoder, n_workers):
+    '''
+    Previous pipeline: parse everything, map encode over the
+    trees with chunksize=1 and write at the end.
+    '''
+    with open(in_path, encoding="utf-8") as f:
+        trees = [C_Tree.from_string(line.rstrip()) for line in f if line.strip()]
+    
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        linearized_trees = list(executor.map(encoder.encode, trees))
+    
+    with open(out_path, "w", encoding="utf-8") as f:
+        for lt in linearized_trees:
+            f.write(lt.to_string(None, add_bos_eos=False) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Constituent encoding throughput benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=5000, help='Number of synthetic trees')
+    parser.add_argument('--enc', type=str, default=C_ABSOLUTE_ENCODING, choices=[C_ABSOLUTE_ENCODING, C_RELATIVE_ENCODING, C_DYNAMIC_ENCODING, C_TETRA_ENCODING])
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--chunk_size', type=int, default=1000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tmp_dir, "synthetic.trees")
+        write_const_treebank(in_path, args.n_trees)
+
+    if args.enc == C_TETRA_ENCODING:
+        encoder = C_Tetratag("_", "+", "inorder", "R", "*")
+    else:
+        encoder = {C_ABSOLUTE_ENCODING: C_DepthBasedAbsolute, C_RELATIVE_ENCODING: C_DepthBasedRelative, 
+                   C_DYNAMIC_ENCODING: C_DepthBasedDynamic}[args.enc]("_", "+", False, False, "R", "*")
+
+    start = time.time()
+    encode_pickled_trees(in_path, os.path.join(tmp_dir, "pickled.labels"), encoder, args.workers)
+    t_pickled = time.time() - start
+
+    start = time.time()
+    _, n_trees, *_ = encode_constituent(in_path, os.path.join(tmp_dir, "pool.labels"), args.enc, False, "_", False, 1, "+", None,
+                                        False, "R", "*", "inorder", False, False, args.chunk_size, args.workers)
+    t_pool = time.time() - start
+
+    print("-----------------------------------------")
+    print('%-22s %s' % ('encoding', args.enc))
+    print('%-22s %d' % ('trees', n_trees))
+    print('%-22s %d' % ('workers', args.workers))
+    print('%-22s %.3fs (%.0f trees/s)' % ('pickled trees', t_pickled, n_trees/t_pickled))
+    print('%-22s %.3fs (%.0f trees/s)' % ('worker pool', t_pool, n_trees/t_pool))
+    print('%-22s %.2fx' % ('speedup', t_pickled/t_pool))
+    print("-----------------------------------------")
@@ -0,0 +1,87 @@
+'''
+Columnar (D_TreeBatch) encoding and decoding of the ABS and REL dependency
+encodings against the tree by tree path: time to turn conllu blocks into the
+labels text, and time to decode the labels back into trees. The outputs of
+both paths are checked to be the same.
+
+    python -m benchmarks.bench_deps_batch [--input file.conllu] [--chunk_size 1000]
+'''
+from codelin.encs.enc_deps import D_NaiveAbsoluteEncoding, D_NaiveRelativeEncoding
+from codelin.models.deps_batch import D_TreeBatch, D_LabelBatch
+from codelin.models.deps_tree import D_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from benchmarks.synthetic import write_deps_treebank
+
+import argparse
+import tempfile
+import time
+import os
+
+def encode_trees(encoder, blocks):
+    text = []
+    for block in blocks:
+        text.append(encoder.encode(D_Tree.from_string(block)).to_string(add_bos_eos=False))
+        text.append("\n")
+    return "".join(text)
+
+def encode_batch(encoder, blocks):
+    tree_batch = D_TreeBatch.from_conllu_blocks(blocks)
+    return encoder.encode_tree_batch(tree_batch).to_string(tree_batch, add_bos_eos=False)
+
+def decode_trees(encoder, label_blocks):
+    return [encoder.decode(LinearizedTree.from_string(block, mode="DEPS", separator="_")) for block in label_blocks]
+
+def decode_batch(encoder, label_blocks):
+    forms, postags, labels, offsets = [], [], [], [0]
+    for block in label_blocks:
+        for line in block.split("\n"):
+            word, postag, label = line.split("\t")
+            forms.append(word)
+            postags.append(postag)
+            labels.append(label)
+        offsets.append(len(forms))
+    label_batch = D_LabelBatch.from_strings(labels, offsets, "_")
+    return encoder.decode_label_batch(label_batch, forms, postags)
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def arcs(trees):
+    return [[(n.id, n.form, n.upos, n.head, n.relation) for n in tree] for tree in trees]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Columnar ABS and REL dependency encoding benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Conllu treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=5000, help='Number of synthetic trees')
+    parser.add_argument('--chunk_size', type=int, default=1000, help='Number of trees per batch')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tempfile.mkdtemp(), "synthetic.conllu")
+        write_deps_treebank(in_path, args.n_trees)
+    with open(in_path, encoding="utf-8") as f:
+        blocks = list(D_Tree.iter_conllu_blocks(f))
+    chunks = [blocks[i:i+args.chunk_size] for i in range(0, len(blocks), args.chunk_size)]
+
+    print("-----------------------------------------")
+    print('%-6s %-8s %12s %12s %10s %8s' % ('enc', '', 'per tree', 'batch', 'speedup', 'same'))
+    for name, encoder in [('ABS', D_NaiveAbsoluteEncoding("_")), ('REL', D_NaiveRelativeEncoding("_", True))]:
+        t_trees, text = best_time(lambda: "".join(encode_trees(encoder, chunk) for chunk in chunks), args.repeat)
+        t_batch, batch_text = best_time(lambda: "".join(encode_batch(encoder, chunk) for chunk in chunks), args.repeat)
+        print('%-6s %-8s %11.2fs %11.2fs %9.1fx %8s' % (name, 'encode', t_trees, t_batch, t_trees/t_batch, text == batch_text))
+
+        label_blocks = [b for b in text.split("\n\n") if b.strip()]
+        label_chunks = [label_blocks[i:i+args.chunk_size] for i in range(0, len(label_blocks), args.chunk_size)]
+        t_trees, trees = best_time(lambda: [t for chunk in label_chunks for t in decode_trees(encoder, chunk)], args.repeat)
+        t_batch, batches = best_time(lambda: [decode_batch(encoder, chunk) for chunk in label_chunks], args.repeat)
+        same = arcs(trees) == arcs(t for batch in batches for t in batch.to_trees())
+        print('%-6s %-8s %11.2fs %11.2fs %9.1fx %8s' % (name, 'decode', t_trees, t_batch, t_trees/t_batch, same))
+    print("-----------------------------------------")
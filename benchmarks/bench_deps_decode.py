@@ -0,0 +1,61 @@
+'''
+Measures the decoding time of the dependency decoders against the sentence
+length. With the id-indexed D_Tree updates the time per token should stay
+flat as sentences grow, instead of growing linearly with their length.
+
+    python -m benchmarks.bench_deps_decode [--lengths 10,100,1000] [--repeat N]
+'''
+from codelin.models.deps_tree import D_Tree
+from codelin.encs.enc_deps import *
+from codelin.utils.constants import D_2P_GREED
+from benchmarks.synthetic import random_conllu_tree
+
+import argparse
+import random
+import time
+
+DECODERS = {
+    'ABS': lambda: D_NaiveAbsoluteEncoding("_"),
+    'REL': lambda: D_NaiveRelativeEncoding("_", False),
+    'POS': lambda: D_PosBasedEncoding("_"),
+    'BRK': lambda: D_BrkBasedEncoding("_", False),
+    'BRK_2P': lambda: D_Brk2PBasedEncoding("_", False, D_2P_GREED),
+    'BRK_4B': lambda: D_Brk4BitsEncoding("_"),
+    'BRK_7B': lambda: D_Brk7BitsEncoding("_"),
+}
+
+def time_decode(encoder, conllu_str, repeat):
+    '''
+    Encodes the tree once and returns the best decoding time out of repeat runs.
+    '''
+    lin_tree = encoder.encode(D_Tree.from_string(conllu_str))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encoder.decode(lin_tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Dependency decoding time against sentence length')
+    parser.add_argument('--lengths', type=str, default="10,50,100,250,500,1000", help='Comma separated sentence lengths')
+    parser.add_argument('--encs', type=str, default=",".join(DECODERS.keys()), help='Comma separated encodings')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    lengths = [int(l) for l in args.lengths.split(",")]
+    encs = args.encs.split(",")
+    rnd = random.Random(1)
+    sentences = {n: random_conllu_tree(n, rnd) for n in lengths}
+
+    print("-----------------------------------------")
+    print('%-8s' % 'length' + "".join('%12s' % enc for enc in encs))
+    for n in lengths:
+        row = []
+        for enc in encs:
+            elapsed = time_decode(DECODERS[enc](), sentences[n], args.repeat)
+            row.append('%10.2fus' % (elapsed/n*1e6))
+        print('%-8d' % n + "".join(row))
+    print("(decoding time per token)")
+    print("-----------------------------------------")
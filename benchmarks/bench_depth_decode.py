@@ -0,0 +1,103 @@
+'''
+Measures the depth-based (ABS) decoding time against the length of
+right-branching trees, where the depth grows with the sentence. The
+previous decoder walked down from the root for every word and deep copied
+preterminals; the right-spine decoder should keep the time per token flat.
+
+    python -m benchmarks.bench_depth_decode [--lengths 10,100,1000] [--repeat N]
+'''
+from codelin.encs.enc_const import C_DepthBasedAbsolute
+from codelin.models.const_tree import C_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from codelin.utils.constants import C_ROOT_LABEL, C_NONE_LABEL, C_CONFLICT_SEPARATOR
+from benchmarks.synthetic import right_branching_tree
+
+import argparse
+import copy
+import sys
+import time
+
+def legacy_decode(encoder, linearized_tree):
+    '''
+    Previous implementation of C_DepthBasedAbsolute.decode
+    (without look-behind and binarization).
+    '''
+    tree = C_Tree(C_ROOT_LABEL, [])
+    old_n_commons = 0
+    old_level = None
+    for word, postag, feats, label in linearized_tree.iterrows():
+        current_level = tree
+        for level_index in range(int(label.n_commons)):
+            if (current_level.is_terminal()) or (level_index >= old_n_commons):
+                current_level.add_child(C_Tree(C_NONE_LABEL, []))
+            current_level = current_level.r_child()
+
+        last_common = label.last_common.split(encoder.unary_joiner)
+        if len(last_common) == 1:
+            if (current_level.label == C_NONE_LABEL):
+                current_level.label = last_common[0].rstrip()
+            else:
+                current_level.label = current_level.label + C_CONFLICT_SEPARATOR + last_common[0]
+        else:
+            current_level = tree
+            descend_levels = max(label.n_commons - (len(last_common)) + 1, 1)
+            for level_index in range(descend_levels):
+                current_level = current_level.r_child() if current_level.r_child() is not None else current_level
+            for i in range(len(last_common)-1):
+                if (current_level.label == C_NONE_LABEL):
+                    current_level.label = last_common[i]
+                else:
+                    current_level.label = current_level.label + C_CONFLICT_SEPARATOR + last_common[i]
+                current_level = current_level.r_child() if current_level.r_child() is not None else current_level
+            if current_level.is_preterminal():
+                temp_current_level = copy.deepcopy(current_level)
+                current_level.label = last_common[i+1]
+                current_level.children = [temp_current_level]
+            else:
+                current_level.label = last_common[i+1]
+
+        if (label.n_commons >= old_n_commons):
+            current_level.fill_pos_nodes(postag, word, label.unary_chain, encoder.unary_joiner)
+        else:
+            old_level.fill_pos_nodes(postag, word, label.unary_chain, encoder.unary_joiner)
+        old_n_commons = label.n_commons
+        old_level = current_level
+
+    tree.inherit_tree()
+    return tree
+
+def time_decode(decode, encoder, labels, repeat):
+    '''
+    Returns the decoded tree and the best time out of repeat runs; labels
+    are parsed again on every run as decoding modifies them.
+    '''
+    best = None
+    for _ in range(repeat):
+        linearized_tree = LinearizedTree.from_string(labels, mode="CONST", separator="_", unary_joiner="[+]")
+        start = time.perf_counter()
+        tree = decode(encoder, linearized_tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return tree, best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Depth-based decoding time against tree depth')
+    parser.add_argument('--lengths', type=str, default="10,50,100,250,500,1000", help='Comma separated lengths of the right-branching trees')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    # the tree utilities (and the previous decoder) are recursive
+    sys.setrecursionlimit(100000)
+
+    encoder = C_DepthBasedAbsolute("_", "[+]", False, False)
+    print("-----------------------------------------")
+    print('%-8s %14s %14s %10s' % ('length', 'root walk', 'right spine', 'speedup'))
+    for n in [int(l) for l in args.lengths.split(",")]:
+        labels = encoder.encode(C_Tree.from_string(right_branching_tree(n))).to_string(add_bos_eos=False)
+        legacy_tree, t_legacy = time_decode(legacy_decode, encoder, labels, args.repeat)
+        spine_tree, t_spine = time_decode(C_DepthBasedAbsolute.decode, encoder, labels, args.repeat)
+        if str(legacy_tree) != str(spine_tree):
+            print("[*] Warning: decoders produced different trees for length", n)
+        print('%-8d %12.2fus %12.2fus %9.1fx' % (n, t_legacy/n*1e6, t_spine/n*1e6, t_legacy/t_spine))
+    print("(decoding time per token)")
+    print("-----------------------------------------")
@@ -0,0 +1,105 @@
+'''
+Checks that the single traversal used by the depth-based encodings (ABS, REL
+and DYN) produces the same labels as the previous comparison of root-to-leaf
+paths, and compares the time of both on a treebank and on deep right-branching
+trees, where the paths grow with the sentence length.
+
+    python -m benchmarks.bench_depth_encode [--input file.trees] [--lengths 10,100,250]
+'''
+from codelin.encs.enc_const import *
+from codelin.models.const_tree import C_Tree
+from benchmarks.synthetic import write_const_treebank, right_branching_tree
+
+import argparse
+import tempfile
+import time
+import os
+
+def legacy_depth_rows(encoder, constituent_tree):
+    '''
+    Previous computation of n_commons and last_common: zip the
+    (deep copied) paths of adjacent leaves until they diverge.
+    '''
+    leaf_paths = constituent_tree.path_to_leaves()
+    rows = []
+    for i in range(0, len(leaf_paths)-1):
+        path_a = leaf_paths[i]
+        path_b = leaf_paths[i+1]
+        last_common = ""
+        n_commons = 0
+        for a,b in zip(path_a, path_b):
+            if (a!=b):
+                last_common = encoder.clean_last_common(last_common)
+                unary_chain, postag = encoder.get_unary_chain(path_a[-2])
+                postag, feats = encoder.get_features(postag)
+                rows.append((path_a[-1], postag, feats, unary_chain, n_commons, last_common))
+                break
+            n_commons += len(a.split(encoder.unary_joiner))
+            last_common = a
+    return rows
+
+def prepare(encoder, tree_string):
+    '''
+    Collapsed (and binarized) tree as the encoders build it
+    '''
+    tree = C_Tree.from_string(tree_string).collapse_unary(encoder.unary_joiner)
+    if encoder.binary:
+        tree = C_Tree.to_binary_right(tree, encoder.binary_marker)
+    return tree
+
+def time_rows(rows_fn, encoder, tree_strings, repeat):
+    '''
+    Returns the best time out of repeat runs; trees are rebuilt
+    on every run as both functions append the end node to them.
+    '''
+    best = None
+    for _ in range(repeat):
+        trees = [prepare(encoder, tree_string) for tree_string in tree_strings]
+        start = time.perf_counter()
+        for tree in trees:
+            rows_fn(encoder, tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Depth-based encodings equivalence check and benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=2000, help='Number of synthetic trees')
+    parser.add_argument('--lengths', type=str, default="10,50,100,250", help='Comma separated lengths of the right-branching trees (collapse_unary is recursive and fails over ~300)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tempfile.mkdtemp(), "synthetic.trees")
+        write_const_treebank(in_path, args.n_trees)
+    with open(in_path, encoding="utf-8") as f:
+        tree_strings = list(C_Tree.iter_tree_strings(f))
+
+    print("-----------------------------------------")
+    for unary_joiner in ["[+]", "+"]:
+        for binary in [False, True]:
+            encoder = C_DepthBasedAbsolute("_", unary_joiner, False, binary, "R", "*")
+            mismatches = 0
+            for tree_string in tree_strings:
+                if encoder.get_depth_rows(prepare(encoder, tree_string)) != legacy_depth_rows(encoder, prepare(encoder, tree_string)):
+                    mismatches += 1
+            print('%-30s %d/%d' % ('mismatches joiner=%s%s' % (unary_joiner, " binary" if binary else ""), mismatches, len(tree_strings)))
+
+    encoder = C_DepthBasedAbsolute("_", "[+]", False, False)
+    t_legacy = time_rows(legacy_depth_rows, encoder, tree_strings, args.repeat)
+    t_lca = time_rows(C_DepthBasedAbsolute.get_depth_rows, encoder, tree_strings, args.repeat)
+    print()
+    print('%-22s %d' % ('trees', len(tree_strings)))
+    print('%-22s %.3fs' % ('leaf paths', t_legacy))
+    print('%-22s %.3fs' % ('single traversal', t_lca))
+    print('%-22s %.2fx' % ('speedup', t_legacy/t_lca))
+
+    print()
+    print('%-8s %14s %14s %10s' % ('length', 'leaf paths', 'traversal', 'speedup'))
+    for n in [int(l) for l in args.lengths.split(",")]:
+        t_legacy = time_rows(legacy_depth_rows, encoder, [right_branching_tree(n)], args.repeat)
+        t_lca = time_rows(C_DepthBasedAbsolute.get_depth_rows, encoder, [right_branching_tree(n)], args.repeat)
+        print('%-8d %12.2fms %12.2fms %9.1fx' % (n, t_legacy*1e3, t_lca*1e3, t_legacy/t_lca))
+    print("-----------------------------------------")
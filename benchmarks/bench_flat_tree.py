@@ -0,0 +1,78 @@
+'''
+Constituent trees stored as flat arrays (FlatCTree) against linked C_Tree
+nodes: memory per token of the loaded treebank, and time to parse and encode
+it with the depth-based and tetratag encodings. The labels of both kinds of
+tree are checked to be the same. FlatCTree takes less memory but encodes
+slower, as the encoders walk it node by node through its methods.
+
+    python -m benchmarks.bench_flat_tree [--input file.trees] [--encs ABS,REL,DYN,4EC]
+'''
+from codelin.encs.enc_const import *
+from codelin.models.const_tree import C_Tree
+from codelin.models.flat_const_tree import FlatCTree
+from benchmarks.synthetic import write_const_treebank
+from benchmarks.bench_memory import retained_bytes
+
+import argparse
+import tempfile
+import time
+import sys
+import os
+
+ENCODERS = {
+    'ABS': lambda: C_DepthBasedAbsolute("_", "[+]", False, True, "R", "[b]"),
+    'REL': lambda: C_DepthBasedRelative("_", "[+]", False, True, "R", "[b]"),
+    'DYN': lambda: C_DepthBasedDynamic("_", "[+]", False, True, "R", "[b]"),
+    '4EC': lambda: C_Tetratag("_", "[+]", "inorder", "R", "[b]"),
+}
+
+def encode_all(encoder, trees):
+    return [encoder.encode(tree).to_string(add_bos_eos=False) for tree in trees]
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='FlatCTree against C_Tree memory and encoding benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=2000, help='Number of synthetic trees')
+    parser.add_argument('--encs', type=str, default="ABS,REL,DYN,4EC", help='Comma separated encodings')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    # the C_Tree transformations are recursive
+    sys.setrecursionlimit(100000)
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tempfile.mkdtemp(), "synthetic.trees")
+        write_const_treebank(in_path, args.n_trees)
+
+    # memory (for FlatCTree it includes the symbol table of the file)
+    c_trees, c_bytes = retained_bytes(lambda: C_Tree.read_trees_file(in_path))
+    f_trees, f_bytes = retained_bytes(lambda: FlatCTree.read_trees_file(in_path))
+    n_tokens = sum(len(t.get_words()) for t in f_trees)
+
+    print("-----------------------------------------")
+    print('%-26s %10s %10s %8s' % ('', 'C_Tree', 'FlatCTree', 'saved'))
+    print('%-26s %9.0fB %9.0fB %7.0f%%' % ('memory per token', c_bytes/n_tokens, f_bytes/n_tokens, 100*(1-f_bytes/c_bytes)))
+    print('%-26s %9.2fs %9.2fs %8s' % ('read_trees_file', best_time(lambda: C_Tree.read_trees_file(in_path), args.repeat),
+                                       best_time(lambda: FlatCTree.read_trees_file(in_path), args.repeat), ''))
+
+    print()
+    print('%-6s %12s %12s %12s %12s %10s' % ('enc', 'C_Tree', 'FlatCTree', 'C_Tree', 'FlatCTree', 'mismatch'))
+    print('%-6s %12s %12s %12s %12s %10s' % ('', 'encode', 'encode', 'read+enc', 'read+enc', ''))
+    for name in args.encs.split(","):
+        encoder = ENCODERS[name]()
+        mismatches = sum(a != b for a, b in zip(encode_all(encoder, c_trees), encode_all(encoder, f_trees)))
+        t_c = best_time(lambda: encode_all(encoder, c_trees), args.repeat)
+        t_f = best_time(lambda: encode_all(encoder, f_trees), args.repeat)
+        t_c_read = best_time(lambda: encode_all(encoder, C_Tree.read_trees_file(in_path)), args.repeat)
+        t_f_read = best_time(lambda: encode_all(encoder, FlatCTree.read_trees_file(in_path)), args.repeat)
+        print('%-6s %11.2fs %11.2fs %11.2fs %11.2fs %10d' % (name, t_c, t_f, t_c_read, t_f_read, mismatches))
+    print("-----------------------------------------")
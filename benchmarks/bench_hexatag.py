@@ -0,0 +1,93 @@
+'''
+Hexatag encoding: checks that the labels of every projective tree in a
+treebank decode back to the same tree, counts the non-projective trees whose
+rows the previous encoder misplaced when matching them by word form, and
+compares the encoding time of both on growing sentences (with a different
+form per word, the only case the previous encoder handled).
+
+    python -m benchmarks.bench_hexatag [--input file.conllu] [--lengths 10,100,1000]
+'''
+from codelin.encs.enc_deps import D_HexatagEncoding
+from codelin.models.deps_tree import D_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from benchmarks.synthetic import write_deps_treebank, random_conllu_tree
+
+import argparse
+import tempfile
+import random
+import time
+import sys
+import os
+
+def legacy_encode(encoder, dep_tree):
+    '''
+    Previous D_HexatagEncoding.encode (without printing the bht)
+    '''
+    bht_tree = D_Tree.to_bht(dep_tree, include_reltype=True)
+    lin_tree = encoder.tagger.encode(bht_tree)
+    return LinearizedTree.sort_words(lin_tree, dep_tree)
+
+def unique_forms(conllu_str):
+    '''
+    Gives a different form to every word, the best case for matching by form
+    '''
+    rows = [line.split("\t") for line in conllu_str.split("\n")]
+    return "\n".join("\t".join(row[:1] + ["w"+row[0]] + row[2:]) for row in rows)
+
+def arcs(dep_tree):
+    return [(node.id, node.form, node.head, node.relation) for node in dep_tree if node.id != 0]
+
+def time_encode(encode, encoder, conllu_strs, repeat):
+    best = None
+    for _ in range(repeat):
+        trees = [D_Tree.from_string(c) for c in conllu_strs]
+        start = time.perf_counter()
+        for tree in trees:
+            encode(encoder, tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hexatag round trip check and benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Conllu treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=1000, help='Number of synthetic trees')
+    parser.add_argument('--lengths', type=str, default="10,50,100,250,500", help='Comma separated sentence lengths')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    # the tetratag encoding of the bht is recursive
+    sys.setrecursionlimit(100000)
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tempfile.mkdtemp(), "synthetic.conllu")
+        write_deps_treebank(in_path, args.n_trees)
+    trees = list(D_Tree.iter_conllu_file(in_path, filter_projective=False))
+
+    encoder = D_HexatagEncoding("_")
+    projective, round_trips, misplaced = 0, 0, 0
+    for tree in trees:
+        lin_tree = encoder.encode(tree)
+        # the arc from the dummy root must not be crossed either
+        if tree.is_projective(filter_root=False):
+            projective += 1
+            labels = lin_tree.to_string(add_bos_eos=False)
+            decoded = encoder.decode(LinearizedTree.from_string(labels, mode="CONST", separator="_", unary_joiner="[+]"))
+            round_trips += arcs(decoded) == arcs(tree)
+        else:
+            misplaced += [str(l) for l in legacy_encode(encoder, tree).labels] != [str(l) for l in lin_tree.labels]
+
+    print("-----------------------------------------")
+    print('%-30s %d/%d' % ('round trip (projective)', round_trips, projective))
+    print('%-30s %d/%d' % ('rows misplaced by form', misplaced, len(trees)-projective))
+
+    print()
+    print('%-8s %14s %14s %10s' % ('length', 'form match', 'positions', 'speedup'))
+    rnd = random.Random(1)
+    for n in [int(l) for l in args.lengths.split(",")]:
+        sentences = [unique_forms(random_conllu_tree(n, rnd, projective=True)) for _ in range(5)]
+        t_legacy = time_encode(legacy_encode, encoder, sentences, args.repeat)
+        t_positions = time_encode(D_HexatagEncoding.encode, encoder, sentences, args.repeat)
+        print('%-8d %12.2fms %12.2fms %9.1fx' % (n, t_legacy*1e3/len(sentences), t_positions*1e3/len(sentences), t_legacy/t_positions))
+    print("(encoding time per sentence)")
+    print("-----------------------------------------")
@@ -0,0 +1,160 @@
+'''
+Attach-juxtapose encoding: checks that the labels of every tree in a treebank
+decode back to the same tree, counts the label sequences that differ from the
+previous oracle and compares the encoding time of both on growing sentences.
+Exits with status 1 if a tree does not round trip, so --check (only the round
+trip, on the fixed synthetic treebank unless --input is given) can be run as
+a test.
+
+    python -m benchmarks.bench_jux [--input file.trees] [--lengths 10,50,100] [--check]
+'''
+from codelin.encs.enc_const import C_AttachJuxtapose
+from codelin.encs.enc_const.attach_juxtapose import Action
+from codelin.models.const_tree import C_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from benchmarks.synthetic import write_const_treebank, random_bracketed_tree
+
+import argparse
+import tempfile
+import random
+import time
+import sys
+import os
+
+def legacy_get_level_of_subtree(t, st):
+    if t == st:
+        return -1
+    else:
+        return 1 + legacy_get_level_of_subtree(t.children[-1], st)
+
+def legacy_get_action_list(tree):
+    '''
+    Previous implementation of _get_action_list
+    '''
+    last_postag = tree.get_terminals()[-1].parent
+    last_word   = last_postag.children[0]
+    siblings    = last_postag.parent.children[:-1] if last_postag.parent is not None else []
+    if siblings != []:
+        parent_label = None
+        last_subtree = last_postag
+        last_subtree_siblings = siblings
+    else:
+        last_subtree = last_postag.parent
+        if last_subtree is None:
+            return last_word.label, last_postag.label, Action("attach", 0, None, None), None
+        last_subtree_siblings = last_subtree.parent.children[:-1] if last_subtree.parent is not None else []
+        parent_label = last_subtree.label
+
+    if last_subtree.parent is None:
+        return last_word.label, last_postag.label, Action("attach", 0, parent_label, None), None
+    elif len(last_subtree_siblings)==1 and not last_subtree_siblings[0].is_preterminal():
+        target_node_depth = legacy_get_level_of_subtree(tree, last_subtree)
+        new_label = last_subtree.parent.label
+        target_node = last_subtree_siblings[0]
+        grand_parent = last_subtree.parent.parent
+        if grand_parent is None:
+            tree = target_node
+            target_node.parent = None
+        else:
+            grand_parent.children = [target_node if c == last_subtree.parent else c for c in grand_parent.children]
+            target_node.parent = grand_parent
+        return last_word.label, last_postag.label, Action("juxtapose", target_node_depth, parent_label, new_label), tree
+    else:
+        target_node_depth = legacy_get_level_of_subtree(tree, last_subtree)
+        target_node = last_subtree.parent
+        target_node.children.remove(last_subtree)
+        return last_word.label, last_postag.label, Action("attach", target_node_depth, parent_label, None), tree
+
+def legacy_oracle(t):
+    '''
+    Previous implementation of oracle_action_sequence
+    '''
+    if t is None:
+        return []
+    if len(t.children)==0 or (len(t.children)==1 and t.children[0].is_preterminal()):
+        p = t.children[0].label if len(t.children) > 0 else "POS"
+        w = t.children[0].children[0].label if len(t.children) > 0 else "WORD"
+        return [(w, p, Action("attach", 0, t.label, None))]
+    else:
+        w, p, a, t = legacy_get_action_list(t)
+        return legacy_oracle(t) + [(w, p, a)]
+
+def legacy_encode(encoder, tree):
+    '''
+    Previous C_AttachJuxtapose.encode (without binarization)
+    '''
+    from codelin.encs.enc_const import attach_juxtapose
+    oracle = attach_juxtapose.oracle_action_sequence
+    attach_juxtapose.oracle_action_sequence = legacy_oracle
+    try:
+        return encoder.encode(tree)
+    finally:
+        attach_juxtapose.oracle_action_sequence = oracle
+
+def time_encode(encode, encoder, tree_strings, repeat):
+    best = None
+    for _ in range(repeat):
+        trees = [C_Tree.from_string(t) for t in tree_strings]
+        start = time.perf_counter()
+        for tree in trees:
+            encode(encoder, tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def random_sentence(n_words, rnd):
+    '''
+    Random bracketed tree with (about) n_words words
+    '''
+    subtrees = []
+    while sum(len(st.get_terminals()) for st in subtrees) < n_words:
+        subtrees.append(C_Tree.from_string(random_bracketed_tree(2, rnd)))
+    return str(C_Tree("S", subtrees))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Attach-juxtapose round trip check and benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=1000, help='Number of synthetic trees')
+    parser.add_argument('--lengths', type=str, default="10,50,100,200", help='Comma separated sentence lengths (the previous oracle is cubic)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    parser.add_argument('--check', action='store_true', help='Only run the round trip check')
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(100000)
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tempfile.mkdtemp(), "synthetic.trees")
+        write_const_treebank(in_path, args.n_trees)
+    with open(in_path, encoding="utf-8") as f:
+        tree_strings = list(C_Tree.iter_tree_strings(f))
+
+    print("-----------------------------------------")
+    failed = False
+    for binary in [False, True]:
+        encoder = C_AttachJuxtapose("_", "[+]", binary, "R", "*")
+        round_trips = 0
+        for tree_string in tree_strings:
+            labels = encoder.encode(C_Tree.from_string(tree_string)).to_string(add_bos_eos=False)
+            decoded = encoder.decode(LinearizedTree.from_string(labels, mode="CONST", separator="_", unary_joiner="[+]"))
+            round_trips += str(decoded) == str(C_Tree.from_string(tree_string))
+        print('%-30s %d/%d' % ('round trip%s' % (" binary" if binary else ""), round_trips, len(tree_strings)))
+        failed = failed or round_trips < len(tree_strings)
+    if failed or args.check:
+        print("-----------------------------------------")
+        sys.exit(1 if failed else 0)
+
+    # the previous oracle removed nodes by equality, so it mixed up identical siblings
+    encoder = C_AttachJuxtapose("_", "[+]", False)
+    different = sum(encoder.encode(C_Tree.from_string(t)).to_string() != legacy_encode(encoder, C_Tree.from_string(t)).to_string() for t in tree_strings)
+    print('%-30s %d/%d' % ('labels != previous oracle', different, len(tree_strings)))
+
+    print()
+    print('%-8s %14s %14s %10s' % ('length', 'previous', 'linear', 'speedup'))
+    rnd = random.Random(1)
+    for n in [int(l) for l in args.lengths.split(",")]:
+        sentences = [random_sentence(n, rnd) for _ in range(5)]
+        t_legacy = time_encode(legacy_encode, encoder, sentences, args.repeat)
+        t_linear = time_encode(C_AttachJuxtapose.encode, encoder, sentences, args.repeat)
+        print('%-8d %12.2fms %12.2fms %9.1fx' % (n, t_legacy*1e3/len(sentences), t_linear*1e3/len(sentences), t_legacy/t_linear))
+    print("(encoding time per sentence)")
+    print("-----------------------------------------")
@@ -0,0 +1,75 @@
+'''
+Parsing throughput of labels files with and without a label cache passed to
+LinearizedTree.from_string, for the constituent (ABS) and dependency (REL)
+encodings and several cache sizes. Reports the labels parsed per second
+and the hit rate of the cache.
+
+    python -m benchmarks.bench_label_cache [--trees file.trees] [--conllu file.conllu] [--sizes 64,1024,65536]
+'''
+from codelin.encs.enc_const import C_DepthBasedAbsolute
+from codelin.encs.enc_deps import D_NaiveRelativeEncoding
+from codelin.models.const_tree import C_Tree
+from codelin.models.deps_tree import D_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from codelin.utils.cache import LRUCache
+from benchmarks.synthetic import write_const_treebank, write_deps_treebank
+
+import argparse
+import tempfile
+import time
+import os
+
+def parse_file(path, mode, label_cache=None):
+    with open(path, encoding="utf-8") as f:
+        return [LinearizedTree.from_string(block, mode=mode, separator="_", unary_joiner="[+]", label_cache=label_cache)
+                for block in LinearizedTree.iter_blocks(f)]
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Label cache parsing throughput benchmark')
+    parser.add_argument('--trees', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--conllu', type=str, default=None, help='Conllu treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=5000, help='Number of synthetic trees')
+    parser.add_argument('--sizes', type=str, default="64,1024,65536", help='Comma separated cache sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    trees_path, conllu_path = args.trees, args.conllu
+    if trees_path is None:
+        trees_path = os.path.join(tmp_dir, "synthetic.trees")
+        write_const_treebank(trees_path, args.n_trees)
+    if conllu_path is None:
+        conllu_path = os.path.join(tmp_dir, "synthetic.conllu")
+        write_deps_treebank(conllu_path, args.n_trees)
+
+    # labels files as written by the encoders
+    c_encoder = C_DepthBasedAbsolute("_", "[+]", False, False)
+    d_encoder = D_NaiveRelativeEncoding("_", False)
+    c_labels_path = os.path.join(tmp_dir, "const.labels")
+    d_labels_path = os.path.join(tmp_dir, "deps.labels")
+    with open(c_labels_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(c_encoder.encode(t).to_string(add_bos_eos=False) for t in C_Tree.read_trees_file(trees_path)))
+    with open(d_labels_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(d_encoder.encode(t).to_string(add_bos_eos=False) for t in D_Tree.read_conllu_file(conllu_path)))
+
+    print("-----------------------------------------")
+    print('%-12s %-10s %14s %10s %10s' % ('', 'cache', 'labels/s', 'speedup', 'hit rate'))
+    for name, mode, path in [('CONST (ABS)', "CONST", c_labels_path), ('DEPS (REL)', "DEPS", d_labels_path)]:
+        n_labels = sum(len(t) for t in parse_file(path, mode))
+        t_none = best_time(lambda: parse_file(path, mode), args.repeat)
+        print('%-12s %-10s %14.0f %10s %10s' % (name, 'none', n_labels/t_none, '', ''))
+        for size in [int(s) for s in args.sizes.split(",")]:
+            label_cache = LRUCache(size)
+            t_cache = best_time(lambda: parse_file(path, mode, label_cache), args.repeat)
+            _, _, hit_rate = label_cache.stats()
+            print('%-12s %-10d %14.0f %9.1fx %10.3f' % ('', size, n_labels/t_cache, t_none/t_cache, hit_rate))
+    print("-----------------------------------------")
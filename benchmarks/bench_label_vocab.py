@@ -0,0 +1,74 @@
+'''
+Labels read with and without a LabelVocabulary: time to parse the linearized
+trees of a labels file and memory per token taken by their labels, for the
+constituent (ABS) and dependency (REL) encodings. The trees decoded from
+both are checked to be the same.
+
+    python -m benchmarks.bench_label_vocab [--trees file.trees] [--conllu file.conllu]
+'''
+from codelin.encs.enc_const import C_DepthBasedAbsolute
+from codelin.encs.enc_deps import D_NaiveRelativeEncoding
+from codelin.models.const_tree import C_Tree
+from codelin.models.deps_tree import D_Tree
+from codelin.models.label_vocab import LabelVocabulary
+from codelin.models.linearized_tree import LinearizedTree
+from benchmarks.synthetic import write_const_treebank, write_deps_treebank
+from benchmarks.bench_memory import retained_bytes
+
+import argparse
+import tempfile
+import time
+import os
+
+def read_blocks(blocks, mode, vocabulary=None):
+    return [LinearizedTree.from_string(b, mode=mode, separator="_", unary_joiner="[+]", vocabulary=vocabulary) for b in blocks]
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Label vocabulary parsing and memory benchmark')
+    parser.add_argument('--trees', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--conllu', type=str, default=None, help='Conllu treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=2000, help='Number of synthetic trees')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    trees_path, conllu_path = args.trees, args.conllu
+    if trees_path is None:
+        trees_path = os.path.join(tmp_dir, "synthetic.trees")
+        write_const_treebank(trees_path, args.n_trees)
+    if conllu_path is None:
+        conllu_path = os.path.join(tmp_dir, "synthetic.conllu")
+        write_deps_treebank(conllu_path, args.n_trees)
+
+    c_encoder = C_DepthBasedAbsolute("_", "[+]", False, False)
+    d_encoder = D_NaiveRelativeEncoding("_", False)
+    cases = [
+        ('CONST (ABS)', "CONST", c_encoder, [c_encoder.encode(t).to_string(add_bos_eos=False) for t in C_Tree.read_trees_file(trees_path)]),
+        ('DEPS (REL)', "DEPS", d_encoder, [d_encoder.encode(t).to_string(add_bos_eos=False) for t in D_Tree.read_conllu_file(conllu_path)]),
+    ]
+
+    print("-----------------------------------------")
+    print('%-12s %8s %10s %10s %10s %10s %6s' % ('', 'labels', 'parse', 'parse', 'memory', 'memory', 'same'))
+    print('%-12s %8s %10s %10s %10s %10s %6s' % ('', '', 'new', 'vocab', 'new', 'vocab', ''))
+    for name, mode, encoder, blocks in cases:
+        n_tokens = sum(b.count("\n")+1 for b in blocks)
+        vocab = LabelVocabulary(mode, "_", "[+]")
+        read_blocks(blocks, mode, vocab)
+
+        t_new = best_time(lambda: read_blocks(blocks, mode), args.repeat)
+        t_vocab = best_time(lambda: read_blocks(blocks, mode, vocab), args.repeat)
+        new_trees, b_new = retained_bytes(lambda: read_blocks(blocks, mode))
+        vocab_trees, b_vocab = retained_bytes(lambda: read_blocks(blocks, mode, vocab))
+        same = all(str(encoder.decode(a)) == str(encoder.decode(b)) for a, b in zip(new_trees, vocab_trees))
+        print('%-12s %8d %9.2fs %9.2fs %9.0fB %9.0fB %6s' % (name, len(vocab), t_new, t_vocab, b_new/n_tokens, b_vocab/n_tokens, same))
+    print("(memory of the linearized trees per token)")
+    print("-----------------------------------------")
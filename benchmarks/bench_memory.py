@@ -0,0 +1,122 @@
+'''
+Memory taken per token by a treebank loaded with C_Tree.read_trees_file and
+D_Tree.read_conllu_file, and by the labels of its linearized trees. The node
+and label classes are slotted; they are compared with copies of themselves
+that keep their attributes in a __dict__ (as they did before).
+
+    python -m benchmarks.bench_memory [--trees file.trees] [--conllu file.conllu]
+'''
+from codelin.encs.enc_const import C_DepthBasedAbsolute
+from codelin.encs.enc_deps import D_NaiveAbsoluteEncoding
+from codelin.models import const_tree, deps_tree, const_label, deps_label
+from codelin.models.const_tree import C_Tree
+from codelin.models.deps_tree import D_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from benchmarks.synthetic import write_const_treebank, write_deps_treebank
+
+import contextlib
+import tracemalloc
+import argparse
+import tempfile
+import gc
+import os
+
+SLOTTED = [(const_tree, 'C_Tree'), (deps_tree, 'D_Node'), (const_label, 'C_Label'), (deps_label, 'D_Label')]
+
+def dict_variant(cls):
+    '''
+    Copy of a slotted class that stores its attributes in a __dict__
+    '''
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in cls.__slots__ and k != '__slots__'}
+    return type(cls.__name__, (object,), namespace)
+
+@contextlib.contextmanager
+def dict_classes():
+    '''
+    Replaces the slotted classes in their modules, so the
+    readers of the library build their dict based copies
+    '''
+    saved = [getattr(module, name) for module, name in SLOTTED]
+    for module, name in SLOTTED:
+        setattr(module, name, dict_variant(getattr(module, name)))
+    try:
+        yield
+    finally:
+        for (module, name), cls in zip(SLOTTED, saved):
+            setattr(module, name, cls)
+
+def retained_bytes(load):
+    '''
+    Returns the result of load and the bytes it keeps allocated
+    '''
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = load()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+def const_labels(path):
+    encoder = C_DepthBasedAbsolute("_", "[+]", False, False)
+    return [encoder.encode(t).to_string(add_bos_eos=False) for t in C_Tree.read_trees_file(path)]
+
+def deps_labels(path):
+    encoder = D_NaiveAbsoluteEncoding("_")
+    return [encoder.encode(t).to_string(add_bos_eos=False) for t in D_Tree.read_conllu_file(path)]
+
+def measure(path, n_tokens, load):
+    '''
+    Bytes per token retained by load, with dict based and slotted classes
+    '''
+    with dict_classes():
+        _, dict_bytes = retained_bytes(load)
+    _, slots_bytes = retained_bytes(load)
+    return os.path.getsize(path)/n_tokens, dict_bytes/n_tokens, slots_bytes/n_tokens
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Memory per token of the loaded treebanks and labels')
+    parser.add_argument('--trees', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--conllu', type=str, default=None, help='Conllu treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=2000, help='Number of synthetic trees')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    trees_path, conllu_path = args.trees, args.conllu
+    if trees_path is None:
+        trees_path = os.path.join(tmp_dir, "synthetic.trees")
+        write_const_treebank(trees_path, args.n_trees)
+    if conllu_path is None:
+        conllu_path = os.path.join(tmp_dir, "synthetic.conllu")
+        write_deps_treebank(conllu_path, args.n_trees)
+
+    c_tokens = sum(len(t.get_terminals()) for t in C_Tree.read_trees_file(trees_path))
+    d_tokens = sum(len(t) for t in D_Tree.read_conllu_file(conllu_path))
+
+    # labels are written once and parsed back while measuring
+    c_labels_path = os.path.join(tmp_dir, "const.labels")
+    d_labels_path = os.path.join(tmp_dir, "deps.labels")
+    with open(c_labels_path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(const_labels(trees_path)))
+    with open(d_labels_path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(deps_labels(conllu_path)))
+
+    def read_labels(path, mode):
+        with open(path, encoding="utf-8") as f:
+            blocks = f.read().split("\n\n")
+        return lambda: [LinearizedTree.from_string(b, mode=mode, separator="_", unary_joiner="[+]") for b in blocks]
+
+    rows = [
+        ('C_Tree.read_trees_file', trees_path, c_tokens, lambda: C_Tree.read_trees_file(trees_path)),
+        ('D_Tree.read_conllu_file', conllu_path, d_tokens, lambda: D_Tree.read_conllu_file(conllu_path)),
+        ('C_Label (ABS)', c_labels_path, c_tokens, read_labels(c_labels_path, "CONST")),
+        ('D_Label (ABS)', d_labels_path, d_tokens, read_labels(d_labels_path, "DEPS")),
+    ]
+
+    print("-----------------------------------------")
+    print('%-26s %10s %10s %10s %8s' % ('', 'text', '__dict__', 'slots', 'saved'))
+    for name, path, n_tokens, load in rows:
+        text, with_dict, with_slots = measure(path, n_tokens, load)
+        print('%-26s %9.0fB %9.0fB %9.0fB %7.0f%%' % (name, text, with_dict, with_slots, 100*(1-with_slots/with_dict)))
+    print("(bytes per token)")
+    print("-----------------------------------------")
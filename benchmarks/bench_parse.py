@@ -0,0 +1,105 @@
+'''
+Compares the parsing throughput of C_Tree.from_string against the previous
+parser, which ran two str.replace passes and a split before a stack loop
+that called add_child for every token.
+
+    python -m benchmarks.bench_parse [--input file.trees] [--n_trees N] [--repeat N]
+'''
+from codelin.models.const_tree import C_Tree
+from benchmarks.synthetic import write_const_treebank
+
+import argparse
+import tempfile
+import time
+import os
+
+def legacy_node(label):
+    '''
+    Node creation as done by the previous C_Tree constructor,
+    which always went through add_child.
+    '''
+    t = C_Tree(label)
+    t.add_child([])
+    return t
+
+def legacy_from_string(s):
+    '''
+    Previous implementation of C_Tree.from_string.
+    '''
+    s = s.replace("(","( ")
+    s = s.replace(")"," )")
+    s = s.split(" ")
+
+    stack = []
+    i=0
+    while i < (len(s)):
+        if s[i]=="(":
+            w = s[i+1]
+            t = legacy_node(w)
+            stack.append(t)
+            i+=1
+
+        elif s[i]==")":
+            t = stack.pop()
+            if len(stack)==0:
+                return t
+
+            pt = stack.pop()
+            pt.add_child(t)
+            stack.append(pt)
+
+        else:
+            t = stack.pop()
+            w = s[i]
+            c = legacy_node(w)
+            t.add_child(c)
+            stack.append(t)
+
+        i+=1
+    return t
+
+def time_parser(parser, tree_strings, repeat):
+    '''
+    Returns the best time out of repeat runs of the parser over all trees.
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for tree_string in tree_strings:
+            parser(tree_string)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bracketed tree parsing throughput benchmark')
+    parser.add_argument('--input', type=str, default=None, help='Bracketed treebank (a synthetic one is generated if missing)')
+    parser.add_argument('--n_trees', type=int, default=5000, help='Number of synthetic trees')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    in_path = args.input
+    if in_path is None:
+        in_path = os.path.join(tempfile.mkdtemp(), "synthetic.trees")
+        write_const_treebank(in_path, args.n_trees)
+
+    # the legacy parser only understands one tree per line
+    with open(in_path, encoding="utf-8") as f:
+        tree_strings = list(C_Tree.iter_tree_strings(f))
+
+    for tree_string in tree_strings:
+        if str(legacy_from_string(tree_string)) != str(C_Tree.from_string(tree_string)):
+            print("[*] Warning: parsers disagree on tree", tree_string)
+            break
+
+    n_tokens = sum(tree_string.count("(") for tree_string in tree_strings)
+    t_legacy = time_parser(legacy_from_string, tree_strings, args.repeat)
+    t_new = time_parser(C_Tree.from_string, tree_strings, args.repeat)
+
+    print("-----------------------------------------")
+    print('%-22s %d' % ('trees', len(tree_strings)))
+    print('%-22s %d' % ('brackets', n_tokens))
+    print('%-22s %.3fs (%.0f trees/s)' % ('legacy parser', t_legacy, len(tree_strings)/t_legacy))
+    print('%-22s %.3fs (%.0f trees/s)' % ('regex parser', t_new, len(tree_strings)/t_new))
+    print('%-22s %.2fx' % ('speedup', t_legacy/t_new))
+    print("-----------------------------------------")
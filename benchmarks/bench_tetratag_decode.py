@@ -0,0 +1,119 @@
+'''
+Measures the tetratag decoding time per token against the sentence length
+for the three traversal modes, on right-branching trees (the longest right
+spines). The inorder decoder is also compared with the previous one, which
+searched the empty slot from the root of the tree for every operator.
+
+    python -m benchmarks.bench_tetratag_decode [--lengths 10,100,1000] [--repeat N]
+'''
+from codelin.encs.enc_const import C_Tetratag
+from codelin.encs.enc_const.tetratag import build_leaf
+from codelin.models.const_tree import C_Tree
+from codelin.models.linearized_tree import LinearizedTree
+from codelin.utils.constants import C_NONE_LABEL, C_ROOT_LABEL
+from benchmarks.synthetic import right_branching_tree
+
+import argparse
+import sys
+import time
+
+def legacy_combine(tree, new_child):
+    '''
+    Previous implementation of combine
+    '''
+    current_level = tree
+    while(not current_level.has_none_child()):
+        if (len(current_level.children) < 1):
+            current_level.children.append(new_child)
+            return tree
+        current_level = current_level.r_child()
+    if len(current_level.children)==1:
+        current_level.children.append(new_child)
+    elif current_level.children[0].label == C_NONE_LABEL:
+        current_level.children[0] = new_child
+    elif current_level.children[1].label == C_NONE_LABEL:
+        current_level.children[1] = new_child
+    return tree
+
+def legacy_decode_inorder(l_in, ujoiner):
+    '''
+    Previous implementation of decode_inorder
+    '''
+    stack = []
+    for word, postag, feats, label in l_in.iterrows():
+        for op in list(label.n_commons):
+            if op == 'r':
+                stack.append(build_leaf(word, postag, label.unary_chain, ujoiner))
+            elif op == 'l':
+                t = build_leaf(word, postag, label.unary_chain, ujoiner)
+                if not stack:
+                    stack.append(t)
+                else:
+                    stack[-1] = legacy_combine(stack[-1], t)
+            elif op.startswith("R"):
+                if not stack:
+                    stack.append(C_Tree(label.last_common, [build_leaf(word, postag, label.unary_chain, ujoiner), C_Tree.empty_tree()]))
+                else:
+                    stack[-1] = C_Tree(label.last_common, [stack[-1], C_Tree.empty_tree()])
+            elif op.startswith("L"):
+                if not stack:
+                    stack.append(C_Tree(label.last_common, [build_leaf(word, postag, label.unary_chain, ujoiner), C_Tree.empty_tree()]))
+                else:
+                    tree = C_Tree(label.last_common, [stack.pop(), C_Tree.empty_tree()])
+                    if stack:
+                        stack[-1] = legacy_combine(stack[-1], tree)
+                    else:
+                        stack.append(tree)
+    while len(stack) > 1:
+        t = stack.pop()
+        stack[-1] = legacy_combine(stack[-1], t)
+    return stack.pop()
+
+def legacy_decode(encoder, linearized_tree):
+    final_tree = legacy_decode_inorder(linearized_tree, encoder.unary_joiner)
+    if final_tree.label == C_ROOT_LABEL:
+        final_tree = final_tree.children[0]
+    C_Tree.restore_from_binary(final_tree, binary_marker=encoder.binary_marker)
+    return final_tree.uncollapse_unary(encoder.unary_joiner)
+
+def time_decode(decode, encoder, labels, repeat):
+    '''
+    Returns the decoded tree and the best time out of repeat runs; labels
+    are parsed again on every run as decoding modifies them.
+    '''
+    best = None
+    for _ in range(repeat):
+        linearized_tree = LinearizedTree.from_string(labels, mode="CONST", separator="_", unary_joiner="[+]")
+        start = time.perf_counter()
+        tree = decode(encoder, linearized_tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return tree, best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tetratag decoding time against sentence length')
+    parser.add_argument('--lengths', type=str, default="10,50,100,250,500,1000", help='Comma separated sentence lengths')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    args = parser.parse_args()
+
+    # binarization and the tree traversals are recursive
+    sys.setrecursionlimit(100000)
+
+    lengths = [int(l) for l in args.lengths.split(",")]
+    encoders = {mode: C_Tetratag("_", "[+]", mode, "R", "*") for mode in ["inorder", "preorder", "postorder"]}
+    labels = {(mode, n): encoder.encode(C_Tree.from_string(right_branching_tree(n))).to_string(add_bos_eos=False)
+              for mode, encoder in encoders.items() for n in lengths}
+
+    print("-----------------------------------------")
+    print('%-8s %14s' % ('length', 'inorder (prev)') + "".join('%14s' % mode for mode in encoders))
+    for n in lengths:
+        legacy_tree, t_legacy = time_decode(legacy_decode, encoders["inorder"], labels[("inorder", n)], args.repeat)
+        row = ['%12.2fus' % (t_legacy/n*1e6)]
+        for mode, encoder in encoders.items():
+            tree, elapsed = time_decode(C_Tetratag.decode, encoder, labels[(mode, n)], args.repeat)
+            if mode == "inorder" and str(tree) != str(legacy_tree):
+                print("[*] Warning: inorder decoders produced different trees for length", n)
+            row.append('%12.2fus' % (elapsed/n*1e6))
+        print('%-8d ' % n + " ".join(row))
+    print("(decoding time per token)")
+    print("-----------------------------------------")
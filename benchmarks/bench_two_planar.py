@@ -0,0 +1,142 @@
+'''
+Checks that D_Tree.two_planar_greedy and D_Tree.two_planar_propagate assign
+the same arcs to the same planes as their previous implementations on random
+non-projective trees, and compares their running time on increasingly long
+sentences. Exits with status 1 if any tree gets different planes, so
+--check (only the equivalence check, on a fixed set of random trees) can
+be run as a test.
+
+    python -m benchmarks.bench_two_planar [--n_trees N] [--lengths 10,100,500] [--check]
+'''
+from codelin.models.deps_tree import D_Tree
+from benchmarks.synthetic import random_conllu_tree
+
+import argparse
+import random
+import time
+import sys
+
+def legacy_two_planar_greedy(dep_tree):
+    '''
+    Previous implementation of D_Tree.two_planar_greedy.
+    '''
+    p1, p2 = [], []
+    for i in range(len(dep_tree)):
+        for j in range(i, -1, -1):
+            next_arc = dep_tree.get_next_edge(i, j)
+            if next_arc is None:
+                continue
+            else:
+                cross_plane_1 = False
+                cross_plane_2 = False
+                for node in p1:
+                    cross_plane_1 = cross_plane_1 or next_arc.check_cross(node)
+                for node in p2:
+                    cross_plane_2 = cross_plane_2 or next_arc.check_cross(node)
+
+                if not cross_plane_1:
+                    p1.append(next_arc)
+                elif not cross_plane_2:
+                    p2.append(next_arc)
+    return D_Tree(p1), D_Tree(p2)
+
+def legacy_two_planar_propagate(dep_tree):
+    '''
+    Previous implementation of D_Tree.two_planar_propagate.
+    '''
+    def propagate(nodes, fp1, fp2, current_edge, i):
+        fpi  = fp1 if i == 1 else fp2
+        fp3mi= fp2 if i == 1 else fp1
+        fpi.append(current_edge)
+        for node in nodes:
+            if node.check_cross(current_edge):
+                if node not in fp3mi:
+                    (fp1, fp2) = propagate(nodes, fp1, fp2, node, 3-i)
+        return fp1, fp2
+
+    p1, p2, fp1, fp2 = [], [], [], []
+    for i in range(0, (len(dep_tree))):
+        for j in range(i, -1, -1):
+            next_arc = dep_tree.get_next_edge(i, j)
+            if next_arc is None:
+                continue
+            if next_arc not in fp1:
+                p1.append(next_arc)
+                fp1, fp2 = propagate(dep_tree, fp1, fp2, next_arc, 2)
+            elif next_arc not in fp2:
+                p2.append(next_arc)
+                fp1, fp2 = propagate(dep_tree, fp1, fp2, next_arc, 1)
+    return D_Tree(p1),D_Tree(p2)
+
+def random_tree(rnd, max_len):
+    '''
+    Random non-projective tree, with or without dummy root and
+    sometimes with corrupted heads (cycles, out of range) as
+    the ones produced by the decoders before postprocessing
+    '''
+    tree = D_Tree.from_string(random_conllu_tree(rnd.randint(1, max_len), rnd), dummy_root=rnd.random() < 0.5)
+    if rnd.random() < 0.3:
+        for node in tree.nodes:
+            if rnd.random() < 0.2:
+                node.head = rnd.randint(0, len(tree.nodes) + 1)
+    return tree
+
+def same_planes(planes_a, planes_b):
+    return all([node.id for node in pa.nodes] == [node.id for node in pb.nodes] for pa, pb in zip(planes_a, planes_b))
+
+def check_equivalence(new_fn, legacy_fn, n_trees, max_len, seed=1):
+    '''
+    Returns the number of random trees where both functions disagree
+    '''
+    rnd = random.Random(seed)
+    mismatches = 0
+    for _ in range(n_trees):
+        tree = random_tree(rnd, max_len)
+        if not same_planes(new_fn(tree), legacy_fn(tree)):
+            mismatches += 1
+    return mismatches
+
+def time_fn(fn, tree, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Two planar separation equivalence check and benchmark')
+    parser.add_argument('--n_trees', type=int, default=2000, help='Number of random trees for the equivalence check')
+    parser.add_argument('--lengths', type=str, default="10,50,100,250", help='Comma separated sentence lengths (the previous propagate takes seconds over 250)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the best one is reported')
+    parser.add_argument('--check', action='store_true', help='Only run the equivalence check')
+    args = parser.parse_args()
+
+    algorithms = [('greedy', D_Tree.two_planar_greedy, legacy_two_planar_greedy),
+                  ('propagate', D_Tree.two_planar_propagate, legacy_two_planar_propagate)]
+    
+    print("-----------------------------------------")
+    failed = False
+    for name, new_fn, legacy_fn in algorithms:
+        mismatches = check_equivalence(new_fn, legacy_fn, args.n_trees, 30)
+        print('%-22s %d/%d' % (name+' mismatches', mismatches, args.n_trees))
+        failed = failed or mismatches > 0
+    if failed or args.check:
+        print("-----------------------------------------")
+        sys.exit(1 if failed else 0)
+
+    lengths = [int(l) for l in args.lengths.split(",")]
+    rnd = random.Random(1)
+    trees = {n: D_Tree.from_string(random_conllu_tree(n, rnd)) for n in lengths}
+    for name, new_fn, legacy_fn in algorithms:
+        print()
+        print('%-10s %-8s %14s %14s %10s' % (name, 'length', 'legacy', 'indexed', 'speedup'))
+        for n in lengths:
+            t_new = time_fn(new_fn, trees[n], args.repeat)
+            try:
+                t_legacy = time_fn(legacy_fn, trees[n], args.repeat)
+                print('%-10s %-8d %12.2fms %12.2fms %9.1fx' % ("", n, t_legacy*1e3, t_new*1e3, t_legacy/t_new))
+            except RecursionError:
+                print('%-10s %-8d %14s %12.2fms' % ("", n, 'recursion', t_new*1e3))
+    print("-----------------------------------------")
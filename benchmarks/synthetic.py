@@ -0,0 +1,75 @@
+'''
+Random treebanks used by the benchmarks when no real treebank is given.
+'''
+import random
+
+NON_TERMINALS = ["S", "NP", "VP", "PP", "SBAR", "ADJP", "ADVP", "WHNP"]
+POSTAGS = ["DT", "NN", "NNS", "VB", "VBD", "IN", "JJ", "RB", "PRP", "CC"]
+WORDS = ["the", "dog", "cat", "runs", "ran", "in", "big", "very", "he", "and", "house", "of"]
+RELATIONS = ["nsubj", "obj", "det", "amod", "advmod", "case", "nmod", "conj", "cc", "punct", "obl"]
+
+def random_bracketed_tree(max_depth, rnd):
+    '''
+    Returns a random bracketed constituent tree as a string
+    '''
+    def rec(depth):
+        if depth <= 0 or rnd.random() < 0.3:
+            return "(%s %s)" % (rnd.choice(POSTAGS), rnd.choice(WORDS))
+        children = [rec(depth-1) for _ in range(rnd.choice([1, 2, 2, 3, 3, 4]))]
+        return "(%s %s)" % (rnd.choice(NON_TERMINALS), " ".join(children))
+    
+    return "(ROOT %s)" % rec(max_depth)
+
+def right_branching_tree(n_words):
+    '''
+    Returns a bracketed tree where every constituent has a preterminal as
+    left child and the rest of the sentence as right child (depth ~ n_words)
+    '''
+    tree = "(NN w%d)" % n_words
+    for i in range(n_words-1, 0, -1):
+        tree = "(%s (DT w%d) %s)" % (NON_TERMINALS[i % len(NON_TERMINALS)], i, tree)
+    return "(ROOT %s)" % tree
+
+def random_heads(n_words, rnd, projective=False):
+    '''
+    Returns a list of heads (1-indexed, 0 for the root) of
+    a random dependency tree with n_words nodes
+    '''
+    heads = [0] * (n_words + 1)
+    if projective:
+        def rec(lo, hi, h):
+            if lo > hi:
+                return
+            r = rnd.randint(lo, hi)
+            heads[r] = h
+            rec(lo, r - 1, r)
+            rec(r + 1, hi, r)
+        rec(1, n_words, 0)
+    else:
+        order = list(range(1, n_words + 1))
+        rnd.shuffle(order)
+        for i in range(1, len(order)):
+            heads[order[i]] = rnd.choice(order[:i])
+    return heads[1:]
+
+def random_conllu_tree(n_words, rnd, projective=False):
+    '''
+    Returns a random dependency tree as a conllu string
+    '''
+    lines = []
+    for i, h in enumerate(random_heads(n_words, rnd, projective), 1):
+        rel = "root" if h == 0 else rnd.choice(RELATIONS)
+        lines.append("\t".join([str(i), rnd.choice(WORDS), "_", rnd.choice(POSTAGS), "_", "_", str(h), rel, "_", "_"]))
+    return "\n".join(lines)
+
+def write_const_treebank(path, n_trees, max_depth=7, seed=1):
+    rnd = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(n_trees):
+            f.write(random_bracketed_tree(rnd.randint(2, max_depth), rnd) + "\n")
+
+def write_deps_treebank(path, n_trees, max_len=40, projective=False, seed=1):
+    rnd = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(n_trees):
+            f.write(random_conllu_tree(rnd.randint(1, max_len), rnd, projective) + "\n\n")
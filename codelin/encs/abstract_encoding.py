@@ -1,9 +1,53 @@
 from abc import ABC, abstractmethod
 import re
-from concurrent.futures import ProcessPoolExecutor
-import multiprocessing
+from codelin.utils.pool import WorkerPool
+from codelin.models.const_tree import C_Tree
+from codelin.models.deps_tree import D_Tree
+from codelin.utils.constants import C_ROOT_LABEL, C_NONE_LABEL, C_CONFLICT_SEPARATOR
 
-class ADEncoding(ABC):
+def _encode_const_batch(encoder, batch):
+    return [encoder.encode(C_Tree.from_string(t) if type(t) is str else t) for t in batch]
+
+def _encode_deps_batch(encoder, batch):
+    return [encoder.encode(D_Tree.from_string(t) if type(t) is str else t) for t in batch]
+
+class _BatchEncodingMixin:
+    '''
+    Parallel encoding of lists of trees, shared by the dependency and
+    constituent encodings. Subclasses set _batch_task to the module level
+    function that parses (if needed) and encodes a chunk of trees in a worker.
+    '''
+    _batch_task = None
+
+    def batch_pool(self, n_workers=None):
+        '''
+        Returns a WorkerPool of this encoder to be reused across calls
+        to batch_encode. It must be closed (or used as a context manager).
+        The workers keep the copy of the encoder made when the pool starts,
+        so later changes to the encoder are not seen by the pool.
+        '''
+        return WorkerPool(self._batch_task, self, n_workers)
+
+    def batch_encode(self, tree_list, n_workers=None, chunk_size=256, pool=None):
+        '''
+        Encodes a list of trees in parallel. Elements can be tree objects or
+        raw strings (bracketed trees or conllu blocks), in which case they are
+        parsed inside the workers. The encoder is sent once to each worker and
+        the input is shipped in chunks of chunk_size elements. Pass a pool from
+        batch_pool to reuse its workers across calls; otherwise a pool is
+        started and closed for this call. A pool is only checked to come from
+        this encoder object: if the encoder changed after batch_pool, the
+        workers still encode with the old copy.
+        '''
+        chunks = (tree_list[i:i+chunk_size] for i in range(0, len(tree_list), chunk_size))
+        if pool is None:
+            with self.batch_pool(n_workers) as pool:
+                return [lt for chunk in pool.imap(chunks) for lt in chunk]
+        if pool.context is not self:
+            raise Exception("[*] Error: the pool was not created by this encoder's batch_pool")
+        return [lt for chunk in pool.imap(chunks) for lt in chunk]
+
+class ADEncoding(_BatchEncodingMixin, ABC):
     '''
     Abstract class for Dependency Encodings
     Sets the main constructor method and defines the methods
@@ -12,6 +56,8 @@ class ADEncoding(ABC):
     When adding a new Dependency Encoding it must extend this class
     and implement those methods
     '''
+    _batch_task = staticmethod(_encode_deps_batch)
+
     def __init__(self, separator):
         self.separator = separator
     
@@ -20,7 +66,7 @@ class ADEncoding(ABC):
     def decode(self, linearized_tree):
         pass
 
-class ACEncoding(ABC):
+class ACEncoding(_BatchEncodingMixin, ABC):
     '''
     Abstract class for Constituent Encodings
     Sets the main constructor method and defines the abstract methods
@@ -29,15 +75,122 @@ class ACEncoding(ABC):
     When adding a new Constituent Encoding it must extend this class
     and implement those methods
     '''
+    _batch_task = staticmethod(_encode_const_batch)
+
     def __init__(self, separator, ujoiner, reverse):
         self.separator = separator
         self.unary_joiner = ujoiner
         self.reverse = reverse
     
-    def batch_encode(self, tree_list):
-        with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-            return list(executor.map(self.encode, tree_list))
-    
+    def get_depth_rows(self, constituent_tree):
+        '''
+        Shared traversal of the depth-based encodings. Returns a row
+        (word, postag, feats, unary_chain, n_commons, last_common) per word, 
+        where n_commons and last_common describe the lowest common ancestor 
+        with the next word (the last word is paired with a dummy end node).
+        '''
+        constituent_tree.add_end_node()
+        
+        rows = []
+        for word, postag, n_commons, last_common in constituent_tree.get_adjacent_leaves_lca(self.unary_joiner):
+            # Remove the digits and aditional feats in the last common node
+            last_common = self.clean_last_common(last_common)
+            
+            # Build the Leaf Unary Chain
+            unary_chain, postag = self.get_unary_chain(postag)
+            
+            # Clean the POS Tag and extract additional features
+            postag, feats = self.get_features(postag)
+            rows.append((word, postag, feats, unary_chain, n_commons, last_common))
+        
+        return rows
+
+    def build_depth_tree(self, rows):
+        '''
+        Shared decoding of the depth-based encodings. Takes the (word, postag, label)
+        rows with absolute n_commons and builds the tree keeping its rightmost
+        spine as a stack (spine[d] is the rightmost node at depth d), so each
+        label only touches the levels that changed since the previous one. The
+        spine is extended lazily and cut at any node whose children change.
+        '''
+        tree = C_Tree(C_ROOT_LABEL, [])
+        spine = [tree]
+
+        def extend(depth):
+            # follow the rightmost children until reaching depth or a leaf
+            while len(spine) <= depth and spine[-1].children:
+                spine.append(spine[-1].children[-1])
+
+        old_n_commons = 0
+        old_level, old_depth = None, 0
+        for word, postag, label in rows:
+            n_commons = int(label.n_commons)
+            
+            # Descend through the rightmost spine until reach the level indicated by last_common,
+            # adding empty nodes on leaves and below the levels shared with the previous word
+            shared = max(min(n_commons, int(old_n_commons)), 0)
+            while len(spine) <= shared:
+                if not spine[-1].children:
+                    spine[-1].add_child(C_Tree(C_NONE_LABEL, []))
+                spine.append(spine[-1].children[-1])
+            del spine[shared+1:]
+            for level_index in range(shared, n_commons):
+                new_level = C_Tree(C_NONE_LABEL, [])
+                spine[-1].add_child(new_level)
+                spine.append(new_level)
+            depth = max(n_commons, 0)
+
+            # Split the Last Common field of the Label in case it has a Unary Chain Collapsed
+            last_common = label.last_common.split(self.unary_joiner)
+            
+            if len(last_common) == 1:
+                # If current level has no label yet, put the label
+                # If current level has label but different than this one, set it as a conflict
+                current_level = spine[depth]
+                if current_level.label == C_NONE_LABEL:
+                    current_level.label = last_common[0].rstrip()
+                else:
+                    current_level.label = current_level.label + C_CONFLICT_SEPARATOR + last_common[0]
+            else:
+                # Descend to the beginning of the Unary Chain (or the rightmost leaf) and fill it
+                depth = max(n_commons - len(last_common) + 1, 1)
+                extend(depth)
+                depth = min(depth, len(spine)-1)
+                
+                for i in range(len(last_common)-1):
+                    current_level = spine[depth]
+                    if current_level.label == C_NONE_LABEL:
+                        current_level.label = last_common[i]
+                    else:
+                        current_level.label = current_level.label + C_CONFLICT_SEPARATOR + last_common[i]
+                    extend(depth+1)
+                    depth = min(depth+1, len(spine)-1)
+
+                # If we reach a POS tag, set a copy of it as child of the current chain
+                current_level = spine[depth]
+                if current_level.is_preterminal():
+                    word_level = current_level.children[0]
+                    pos_level = C_Tree(current_level.label, [C_Tree(word_level.label, [], word_level.features)], current_level.features)
+                    current_level.label = last_common[-1]
+                    current_level.children = []
+                    current_level.add_child(pos_level)
+                    del spine[depth+1:]
+                else:
+                    current_level.label = last_common[-1]
+            
+            # Fill POS tag in this node or previous one
+            if label.n_commons >= old_n_commons:
+                current_level.fill_pos_nodes(postag, word, label.unary_chain, self.unary_joiner)
+                del spine[depth+1:]
+            else:
+                old_level.fill_pos_nodes(postag, word, label.unary_chain, self.unary_joiner)
+                del spine[old_depth+1:]
+            
+            old_n_commons = label.n_commons
+            old_level, old_depth = current_level, depth
+
+        return tree
+
     def get_unary_chain(self, postag):
         unary_chain = None
         leaf_unary_chain = postag.split(self.unary_joiner)
@@ -1,19 +1,23 @@
 from codelin.models.linearized_tree import LinearizedTree
 from codelin.encs.enc_const import *
 from codelin.utils.constants import C_ABSOLUTE_ENCODING, C_RELATIVE_ENCODING, C_DYNAMIC_ENCODING, C_TETRA_ENCODING, \
-    C_JUXTAPOSED_ENCODING, C_LEFT_DESC_ENCODING, C_RIGHT_DESC_ENCODING
+    C_JUXTAPOSED_ENCODING, C_LEFT_DESC_ENCODING, C_RIGHT_DESC_ENCODING, C_NO_POSTAG_LABEL, C_STRAT_MAX, \
+    LABEL_CACHE_SIZE
 import os
 import stanza.pipeline
 from codelin.models.const_tree import C_Tree
+from codelin.models.label_vocab import LabelVocabulary
 from codelin.encs.abstract_encoding import ACEncoding
 from tqdm import tqdm
+from codelin.utils.pool import WorkerPool, chunked
+from codelin.utils.cache import LRUCache
+from codelin.utils.tagger import get_pipeline
 
 def extract_features_const(in_path):
     file_in = open(in_path, "r")
     feats_set = set()
-    for line in file_in:
-        line = line.rstrip()
-        tree = C_Tree.from_string(line)
+    for tree_string in C_Tree.iter_tree_strings(file_in):
+        tree = C_Tree.from_string(tree_string)
         tree.extract_features()
         feats = tree.get_feature_names()
         
@@ -22,16 +26,39 @@ def extract_features_const(in_path):
     return sorted(feats_set)
 
 
-def batch_encode(self, tree_list):
-        from concurrent.futures import ProcessPoolExecutor
-        import multiprocessing
-        with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-            return list(executor.map(self.encode, tree_list))
+def encode_tree_lines(context, lines):
+    '''
+    Worker task: parses and encodes a chunk of bracketed lines. Returns the
+    labels text ready to be written along with the label vocabulary of the chunk.
+    '''
+    encoder, ignore_postags, f_idx_dict, multitask, n_label_cols, add_bos_eos = context
+    
+    chunk_text = []
+    labels_counter = 0
+    vocab = LabelVocabulary("CONST", encoder.separator, encoder.unary_joiner)
+    for line in lines:
+        try:
+            tree = C_Tree.from_string(line)
+            if ignore_postags:
+                tree.set_dummy_preterminals()
+            linearized_tree = encoder.encode(tree)
+        except Exception as e:
+            raise Exception(f"[*] Error occurred while encoding the following tree:\n{line}") from e
+        
+        chunk_text.append(linearized_tree.to_string(f_idx_dict, separate_columns=multitask, n_label_cols=n_label_cols, add_bos_eos=add_bos_eos))
+        chunk_text.append("\n")
+        labels_counter += len(linearized_tree)
+        for lbl in linearized_tree.labels:
+            vocab.add(lbl)
+    
+    return "".join(chunk_text), len(lines), labels_counter, vocab
 
 def encode_constituent(in_path, out_path, encoding_type, reverse, separator, multitask, n_label_cols, unary_joiner, features, binary, binary_direction, 
-                       binary_marker, traverse_dir, ignore_postags, add_bos_eos):
+                       binary_marker, traverse_dir, ignore_postags, add_bos_eos, chunk_size=1000, n_workers=None):
     '''
-    Encodes the selected file according to the specified parameters.
+    Encodes the selected file according to the specified parameters. The treebank
+    is streamed in chunks of chunk_size raw lines to a pool of n_workers processes
+    that parse and encode them; the labels are written back in input order.
     '''
 
     # Select encoder
@@ -62,7 +89,7 @@ def encode_constituent(in_path, out_path, encoding_type, reverse, separator, mul
 
     # Create output directory
     out_dir = os.path.dirname(out_path)
-    if not os.path.exists(out_dir):
+    if out_dir and not os.path.exists(out_dir):
         os.makedirs(out_dir)
 
     file_out = open(out_path, "w", encoding='utf-8')
@@ -70,57 +97,85 @@ def encode_constituent(in_path, out_path, encoding_type, reverse, separator, mul
 
     tree_counter = 0
     labels_counter = 0
-    label_set = set()
-    nci_set = set()
-    lci_set = set()
-    uci_set = set()
-
-    # Read and parse all trees first
-    parsed_trees = []
-    raw_lines = []
-    for line in file_in:
-        line = line.rstrip()
-        if not line:
-            continue
-        tree = C_Tree.from_string(line)
-        if ignore_postags:
-            tree.set_dummy_preterminals()
-        parsed_trees.append(tree)
-        raw_lines.append(line)
-
-    # Batch encode trees
-    try:
-        linearized_trees = encoder.batch_encode(parsed_trees)
-    except Exception as e:
-        # Debug fallback: try sequentially to identify which tree fails
-        for i, tree in enumerate(parsed_trees):
-            try:
-                encoder.encode(tree)
-            except:
-                print("[*] Error occurred while encoding the following tree:")
-                print(tree)
-                raise Exception(f"Tree encoding error at line {i}") from e
-
-    # Write encoded trees to file
-    for linearized_tree, line in zip(linearized_trees, raw_lines):
-        file_out.write(linearized_tree.to_string(f_idx_dict, separate_columns=multitask, n_label_cols=n_label_cols, add_bos_eos=add_bos_eos))
-        file_out.write("\n")
-        tree_counter += 1
-        labels_counter += len(linearized_tree)
-        for lbl in linearized_tree.labels:
-            label_set.add(str(lbl))
-            lci_set.add(str(lbl.last_common))
-            nci_set.add(str(lbl.n_commons))
-            uci_set.add(str(lbl.unary_chain))
+    vocab = LabelVocabulary("CONST", separator, unary_joiner)
+
+    lines = C_Tree.iter_tree_strings(file_in)
+    context = (encoder, ignore_postags, f_idx_dict, multitask, n_label_cols, add_bos_eos)
+    with WorkerPool(encode_tree_lines, context, n_workers) as pool:
+        for chunk_text, n_trees, n_labels, chunk_vocab in pool.imap(chunked(lines, chunk_size)):
+            file_out.write(chunk_text)
+            tree_counter += n_trees
+            labels_counter += n_labels
+            vocab.update(chunk_vocab)
+
+    file_in.close()
+    file_out.close()
+    return labels_counter, tree_counter, len(vocab), vocab
+
+def fallback_tree(tree_string):
+    '''
+    Returns a flat tree (S (p_1 w_1) ... (p_n w_n)) used in place
+    of a linearized tree that could not be decoded.
+    '''
+    words, postags = [], []
+    for line in tree_string.split("\n"):
+        columns = line.split("\t") if "\t" in line else line.split(" ")
+        words.append(columns[0])
+        postags.append(columns[1] if len(columns) > 2 else C_NO_POSTAG_LABEL)
+    return flat_tree(words, postags)
 
-    return labels_counter, tree_counter, len(label_set), label_set, lci_set, nci_set, uci_set
+def flat_tree(words, postags):
+    return C_Tree("S", [C_Tree(postag, [C_Tree(word)]) for word, postag in zip(words, postags)])
+
+def decode_label_blocks(context, blocks):
+    '''
+    Worker task: decodes and postprocesses a chunk of linearized trees. Trees that 
+    fail to decode are replaced by a flat tree and reported back as errors, so a 
+    bad sentence does not abort the whole run. Also returns the hits and misses
+    of the label cache of the worker while decoding the chunk.
+    '''
+    decoder, separator, unary_joiner, multitask, n_label_cols, conflicts, nulls, lang, cache = context
+
+    hits, misses = cache.hits, cache.misses
+    chunk_text = []
+    errors = []
+    labels_counter = 0
+    for i, tree_string in enumerate(blocks):
+        try:
+            current_tree = LinearizedTree.from_string(
+                tree_string, 
+                mode="CONST", 
+                separator=separator, 
+                unary_joiner=unary_joiner,
+                separate_columns=multitask, 
+                ignore_postags=True, 
+                n_label_cols=n_label_cols,
+                label_cache=cache
+            )
+            if lang is not None:
+                c_tags = get_pipeline(lang, 'tokenize,pos')(current_tree.get_sentence())
+                current_tree.set_postags([word.pos for word in c_tags.words])
+            
+            decoded_tree : C_Tree = decoder.decode(current_tree)
+            decoded_tree = decoded_tree.postprocess_tree(conflicts, nulls)
+        except Exception as e:
+            errors.append((i, f"{tree_string}\n{e}"))
+            decoded_tree = fallback_tree(tree_string)
+        
+        chunk_text.append(str(decoded_tree).replace('\n', '') + '\n')
+        labels_counter += tree_string.count("\n") + 2
+    
+    return "".join(chunk_text), len(blocks), labels_counter, errors, (cache.hits-hits, cache.misses-misses)
 
 def decode_constituent(
     in_path, out_path, encoding_type, lookbehind, separator, multitask, n_label_cols,
-    unary_joiner, conflicts, nulls, postags, lang, binary, binary_marker, traverse_dir
+    unary_joiner, conflicts, nulls, postags, lang, binary, binary_marker, traverse_dir,
+    chunk_size=1000, n_workers=None
 ):
     """
-    Decodes a constituent treebank file using the specified encoding parameters.
+    Decodes a constituent treebank file using the specified encoding parameters. The
+    linearized trees are decoded in parallel by a pool of worker processes and written
+    in input order.
 
     :param in_path: Path to the input labels file.
     :param out_path: Path to save the decoded tree.
@@ -137,6 +192,9 @@ def decode_constituent(
     :param binary: Whether binary encoding was applied.
     :param binary_marker: Marker used for binary encoding.
     :param traverse_dir: Direction for tree traversal.
+    :param chunk_size: Number of trees sent to a worker process at a time.
+    :param n_workers: Number of worker processes (defaults to the number of cpus).
+    :return: Number of trees, number of labels and hits and misses of the label cache.
     """
 
     if encoding_type == C_ABSOLUTE_ENCODING:
@@ -156,45 +214,66 @@ def decode_constituent(
     else:
         raise Exception("Unknown encoding type")
 
-    # Initialize POS tagging if required
-    nlp = None
+    # Download the POS tagging models once; each worker builds its own pipeline
     if postags:
         stanza.download(lang=lang)
-        nlp = stanza.Pipeline(lang=lang, processors='tokenize,pos')
     
     tree_counter, labels_counter = 0, 0
+    cache_hits, cache_misses = 0, 0
     
     with open(in_path, "r", encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
-        tree_string = ""
-        
-        for line in tqdm(f_in, desc="Decoding Trees", unit=" t"):
-            if line == "\n":
-                tree_string = tree_string.rstrip()
-                current_tree = LinearizedTree.from_string(
-                    tree_string, 
-                    mode="CONST", 
-                    separator=separator, 
-                    unary_joiner=unary_joiner,
-                    separate_columns=multitask, 
-                    ignore_postags=True, 
-                    n_label_cols=n_label_cols
-                )
-                if postags and nlp:
-                    c_tags = nlp(current_tree.get_sentence())
-                    current_tree.set_postags([word.pos for word in c_tags.words])
-                try:
-                    decoded_tree : C_Tree = decoder.decode(current_tree)
-                    decoded_tree = decoded_tree.postprocess_tree(conflicts, nulls)
-                except Exception as e:
-                    print(f"[*] Error decoding tree {tree_counter + 1}:\n{current_tree}\n{e}")
-                    print(f"[*] Exiting...")
-                    break
+        # every worker gets its own copy of the label cache, kept for the whole run
+        label_cache = LRUCache(LABEL_CACHE_SIZE)
+        context = (decoder, separator, unary_joiner, multitask, n_label_cols, conflicts, nulls, lang if postags else None, label_cache)
+        with WorkerPool(decode_label_blocks, context, n_workers) as pool, tqdm(desc="Decoding Trees", unit=" t") as pbar:
+            for chunk_text, n_trees, n_labels, errors, (hits, misses) in pool.imap(chunked(LinearizedTree.iter_blocks(f_in), chunk_size)):
+                for i, error in errors:
+                    print(f"[*] Error decoding tree {tree_counter + i + 1}:\n{error}")
+                    print(f"[*] Writing it as a flat tree...")
                 
-                f_out.write(str(decoded_tree).replace('\n', '') + '\n')
-                tree_string = ""
-                tree_counter += 1
-            else:
-                tree_string += line
-            labels_counter += 1
+                f_out.write(chunk_text)
+                tree_counter += n_trees
+                labels_counter += n_labels
+                cache_hits += hits
+                cache_misses += misses
+                pbar.update(n_trees)
     
-    return tree_counter, labels_counter
+    return tree_counter, labels_counter, (cache_hits, cache_misses)
+
+def decode_constituent_arrays(decoder, words, label_ids, offsets, vocabulary, postags=None, conflicts=C_STRAT_MAX, 
+                              nulls=True, to_string=False):
+    '''
+    Decodes the predictions of a tagger straight from memory, without labels files.
+    The label objects are taken from the vocabulary, so no label string is parsed.
+    :param decoder: Constituent encoding used to decode the labels.
+    :param words: Words of all the sentences, concatenated.
+    :param label_ids: Ids in the vocabulary of the label of every word (e.g. a numpy array).
+    :param offsets: Sentence i spans the words offsets[i]..offsets[i+1]-1.
+    :param vocabulary: LabelVocabulary of the labels predicted by the tagger.
+    :param postags: Part of speech tags of the words, concatenated (optional).
+    :param conflicts: Conflict resolution heuristics to apply.
+    :param nulls: Null handling strategy.
+    :param to_string: Return the trees as a string in the format of the decoded files.
+    :return: List of C_Tree, or the decoded trees, one per line, if to_string is set.
+    '''
+    label_ids = label_ids.tolist() if hasattr(label_ids, "tolist") else list(label_ids)
+    offsets = offsets.tolist() if hasattr(offsets, "tolist") else list(offsets)
+    labels = [vocabulary[label_id] for label_id in label_ids]
+
+    trees = []
+    for i in range(len(offsets)-1):
+        start, end = offsets[i], offsets[i+1]
+        sentence = list(words[start:end])
+        tags = list(postags[start:end]) if postags is not None else [C_NO_POSTAG_LABEL]*len(sentence)
+        try:
+            current_tree = LinearizedTree(sentence, tags, ["_"]*len(sentence), labels[start:end], 0)
+            decoded_tree = decoder.decode(current_tree).postprocess_tree(conflicts, nulls)
+        except Exception as e:
+            print(f"[*] Error decoding tree {i + 1}:\n{e}")
+            print(f"[*] Returning it as a flat tree...")
+            decoded_tree = flat_tree(sentence, tags)
+        trees.append(decoded_tree)
+
+    if to_string:
+        return "".join(str(tree).replace('\n', '') + '\n' for tree in trees)
+    return trees
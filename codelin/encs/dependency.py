@@ -1,25 +1,75 @@
 import stanza
-import copy
 from codelin.models.linearized_tree import LinearizedTree
 from codelin.models.deps_label import D_Label
 from codelin.encs.enc_deps import *
 from codelin.utils.constants import *
-from codelin.models.deps_tree import D_Tree
+from codelin.models.deps_tree import D_Tree, D_Node
+from codelin.models.deps_batch import D_TreeBatch, D_LabelBatch
+from codelin.utils.symbols import SymbolTable
+from codelin.models.label_vocab import LabelVocabulary
+from codelin.utils.pool import WorkerPool, chunked
+from codelin.utils.cache import LRUCache
+from codelin.utils.tagger import get_pipeline
+from codelin.utils.conllu import ConlluWriter
+import numpy as np
 
 
 def extract_features_deps(in_path):
     feats_list=set()
-    trees = D_Tree.read_conllu_file(in_path, filter_projective=False)
-    for t in trees:
+    for t in D_Tree.iter_conllu_file(in_path, filter_projective=False):
         for node in t:
-            if node.feats != "_":
-                feats_list = feats_list.union(a for a in (node.feats.keys()))
+            if node.feats != "_" and node.feats != [None]:
+                feats_list = feats_list.union(a.split("=")[0] for a in node.feats)
 
     return sorted(feats_list)
 
+def encode_conllu_blocks(context, blocks):
+    '''
+    Worker task: parses and encodes a chunk of conllu sentence blocks. Returns the
+    labels text ready to be written along with the label vocabulary of the chunk.
+    '''
+    encoder, separator, sep_bit, f_idx_dict, multitask, add_bos_eos = context
+    vocab = LabelVocabulary("DEPS", separator)
+
+    # encodings with a columnar version (ABS and REL) encode the whole chunk
+    # at once; if a block has a malformed id or head column (ValueError) the
+    # chunk goes through the tree by tree loop below, which reports the tree
+    if hasattr(encoder, "encode_tree_batch") and not sep_bit and not f_idx_dict:
+        try:
+            tree_batch = D_TreeBatch.from_conllu_blocks(blocks)
+        except ValueError:
+            tree_batch = None
+        if tree_batch is not None:
+            label_batch = encoder.encode_tree_batch(tree_batch)
+            for label_str in label_batch.label_strings():
+                vocab.add(label_str)
+            return (label_batch.to_string(tree_batch, add_bos_eos=add_bos_eos, separate_columns=multitask),
+                    len(blocks), tree_batch.n_words(), vocab)
+
+    chunk_text = []
+    label_counter = 0
+    for block in blocks:
+        try:
+            linearized_tree = encoder.encode(D_Tree.from_string(block))
+        except Exception as e:
+            raise Exception(f"[*] Error occurred while encoding the following tree:\n{block}") from e
+
+        if sep_bit:
+            for w, p, af, l in linearized_tree.iterrows():
+                xi = l.separate_bits(sep_bit)
+                l.xi = separator.join(xi)
+
+        chunk_text.append(linearized_tree.to_string(f_idx_dict, separate_columns=multitask, add_bos_eos=add_bos_eos))
+        chunk_text.append("\n")
+        label_counter += len(linearized_tree)
+        for lbl in linearized_tree.labels:
+            vocab.add(lbl)
+
+    return "".join(chunk_text), len(blocks), label_counter, vocab
+
 # Encoding
 def encode_dependencies(in_path, out_path, encoding_type, separator, multitask, displacement, 
-                        planar_alg, root_enc, features, sep_bit, add_bos_eos):
+                        planar_alg, root_enc, features, sep_bit, add_bos_eos, chunk_size=1000, n_workers=None):
     '''
     Encodes the selected file according to the specified parameters:
     :param in_path: Path of the file to be encoded
@@ -29,6 +79,8 @@ def encode_dependencies(in_path, out_path, encoding_type, separator, multitask,
     :param displacement: boolean to indicate if use displacement in bracket based encodings
     :param planar_alg: string used to choose the plane separation algorithm
     :param features: features to add as columns to the labels file
+    :param chunk_size: number of sentences sent to a worker process at a time
+    :param n_workers: number of worker processes (defaults to the number of cpus)
     '''
 
     # Create the encoder
@@ -61,35 +113,85 @@ def encode_dependencies(in_path, out_path, encoding_type, separator, multitask,
             i+=1
 
     file_out = open(out_path,"w+")
-    label_set = set()
+    file_in = open(in_path, "r", encoding="utf-8")
+    vocab = LabelVocabulary("DEPS", separator)
     tree_counter = 0
     label_counter = 0
-    trees = D_Tree.read_conllu_file(in_path, filter_projective=False)
     
-    for t in trees:
-        # encode labels
-        linearized_tree = encoder.encode(t)
+    context = (encoder, separator, sep_bit, f_idx_dict, multitask, add_bos_eos)
+    with WorkerPool(encode_conllu_blocks, context, n_workers) as pool:
+        for chunk_text, n_trees, n_labels, chunk_vocab in pool.imap(chunked(D_Tree.iter_conllu_blocks(file_in), chunk_size)):
+            file_out.write(chunk_text)
+            tree_counter += n_trees
+            label_counter += n_labels
+            vocab.update(chunk_vocab)
+    
+    file_in.close()
+    file_out.close()
+    return tree_counter, label_counter, len(vocab)
 
-        if sep_bit:
-            for w, p, af, l in linearized_tree.iterrows():
-                xi = l.separate_bits(sep_bit)
-                l.xi = separator.join(xi)
+def fallback_tree(tree_string):
+    '''
+    Returns a flat dependency tree (all words hanging from the root) 
+    used in place of a linearized tree that could not be decoded.
+    '''
+    words, postags = [], []
+    for line in tree_string.split("\n"):
+        columns = line.split("\t") if "\t" in line else line.split(" ")
+        words.append(columns[0])
+        postags.append(columns[1] if len(columns) > 2 else C_NO_POSTAG_LABEL)
+    return flat_tree(words, postags)
 
-        file_out.write(linearized_tree.to_string(f_idx_dict, separate_columns=multitask, add_bos_eos=add_bos_eos))
-        file_out.write("\n")
-        
-        tree_counter += 1
-        label_counter += len(linearized_tree)
+def flat_tree(words, postags):
+    return D_Tree([D_Node(i, word, upos=postag, head=0, deprel=D_EMPTYREL) for i, (word, postag) in enumerate(zip(words, postags), 1)])
+
+def decode_label_blocks(context, blocks):
+    '''
+    Worker task: decodes and postprocesses a chunk of linearized trees. Trees that 
+    fail to decode are replaced by a flat tree and reported back as errors, so a 
+    bad sentence does not abort the whole run. Also returns the hits and misses
+    of the label cache of the worker while decoding the chunk.
+    '''
+    decoder, mode, separator, multitask, multiroot, root_search, lang, count_heur, cache = context
+
+    hits, misses = cache.hits, cache.misses
+
+    writer = ConlluWriter()
+    errors = []
+    labels_counter = 0
+    heur_counter = 0
+    heur_counts = {}
+    for i, tree_string in enumerate(blocks):
+        try:
+            current_tree = LinearizedTree.from_string(tree_string, mode=mode, separator=separator, separate_columns=multitask, label_cache=cache)
+            if lang is not None:
+                c_tags = get_pipeline(lang, 'tokenize,pos,lemma')(current_tree.get_sentence()).sentences
+                c_tags = [w._words for w in c_tags[1:]]
+                c_tags = [w for w in c_tags[0]]
+                current_tree.set_postags([word._upos for word in c_tags[1:]])
+            
+            decoded_tree = decoder.decode(current_tree)
+            heuristics = decoded_tree.postprocess_tree(root_search, multiroot)
+            if count_heur and heuristics:
+                heur_counter += 1
+                for heuristic in heuristics:
+                    heur_counts[heuristic] = heur_counts.get(heuristic, 0) + 1
+        except Exception as e:
+            errors.append((i, f"{tree_string}\n{e}"))
+            decoded_tree = fallback_tree(tree_string)
+            decoded_tree.postprocess_tree(root_search, multiroot)
         
-        for lbl in linearized_tree.labels:
-            label_set.add(str(lbl))      
+        writer.write_tree(decoded_tree)
+        labels_counter += tree_string.count("\n") + 2
     
-    return tree_counter, label_counter, len(label_set)
+    return writer.getvalue(), len(blocks), labels_counter, heur_counter, heur_counts, errors, (cache.hits-hits, cache.misses-misses)
 
 # Decoding
-def decode_dependencies(in_path, out_path, encoding_type, separator, multitask, displacement, multiroot, root_search, root_enc, postags, lang, sep_bit, count_heur=False):
+def decode_dependencies(in_path, out_path, encoding_type, separator, multitask, displacement, multiroot, root_search, root_enc, postags, lang, sep_bit, count_heur=False,
+                        chunk_size=1000, n_workers=None):
     '''
-    Decodes the selected file according to the specified parameters:
+    Decodes the selected file according to the specified parameters. The linearized
+    trees are decoded in parallel by a pool of worker processes and written in input order:
     :param in_path: Path of the file to be encoded
     :param out_path: Path where to write the encoded labels
     :param encoding_type: Encoding used
@@ -97,6 +199,9 @@ def decode_dependencies(in_path, out_path, encoding_type, separator, multitask,
     :param displacement: boolean to indicate if use displacement in bracket based encodings
     :param multiroot: boolean to indicate if multiroot conll trees are allowed
     :param root_search: strategy to select how to search the root if no root found in decoded tree
+    :param count_heur: count the trees (and the trees per heuristic) modified by the postprocessing
+    :param chunk_size: number of sentences sent to a worker process at a time
+    :param n_workers: number of worker processes (defaults to the number of cpus)
     '''
 
     if encoding_type == D_ABSOLUTE_ENCODING:
@@ -124,49 +229,104 @@ def decode_dependencies(in_path, out_path, encoding_type, separator, multitask,
     tree_counter=0
     labels_counter=0
     heur_counter=0
+    heur_counts={}
+    cache_hits, cache_misses = 0, 0
 
-    tree_string = ""
-
+    # Download the POS tagging models once; each worker builds its own pipeline
     if postags:
         stanza.download(lang=lang)
-        nlp = stanza.Pipeline(lang=lang, processors='tokenize,pos,lemma')
-
-    for line in f_in:
-        if line == "\n":
-            tree_string = tree_string.rstrip()
-            mode = "DEPS" if encoding_type!=D_6TG_ENCODING else "CONST"
-            current_tree = LinearizedTree.from_string(tree_string, mode=mode, separator=separator, separate_columns=multitask)
-            if postags:
-                print(current_tree)
-                c_tags = nlp(current_tree.get_sentence()).sentences                
-                c_tags = [w._words for w in c_tags[1:]]
-                print(c_tags)
-                c_tags = [w for w in c_tags[0]]
 
-                #c_tags = c_tags[0].words
-                #c_tags = [t._words for t in c_tags]
-                #print(c_tags)
-                #c_tags = [t._upos for t in c_tags]
-                current_tree.set_postags([word._upos for word in c_tags[1:]])
+    mode = "DEPS" if encoding_type!=D_6TG_ENCODING else "CONST"
+    # every worker gets its own copy of the label cache, kept for the whole run
+    label_cache = LRUCache(LABEL_CACHE_SIZE)
+    context = (decoder, mode, separator, multitask, multiroot, root_search, lang if postags else None, count_heur, label_cache)
+    with WorkerPool(decode_label_blocks, context, n_workers) as pool:
+        for chunk_text, n_trees, n_labels, n_heur, chunk_heur_counts, errors, (hits, misses) in pool.imap(chunked(LinearizedTree.iter_blocks(f_in), chunk_size)):
+            for i, error in errors:
+                print(f"[*] Error decoding tree {tree_counter + i + 1}:\n{error}")
+                print(f"[*] Writing it as a flat tree...")
             
-            decoded_tree = decoder.decode(current_tree)
-            if count_heur:
-                base_tree = copy.deepcopy(decoded_tree)
-                decoded_tree.postprocess_tree(root_search, multiroot)
-                for n1, n2 in zip(base_tree.nodes, decoded_tree.nodes):
-                    if n1 != n2:
-                        heur_counter+=1
-                        break
+            f_out.write(chunk_text)
+            tree_counter += n_trees
+            labels_counter += n_labels
+            heur_counter += n_heur
+            cache_hits += hits
+            cache_misses += misses
+            for heuristic, count in chunk_heur_counts.items():
+                heur_counts[heuristic] = heur_counts.get(heuristic, 0) + count
 
-            decoded_tree.postprocess_tree(root_search, multiroot)
-            f_out.write("# text = "+decoded_tree.get_sentence()+"\n")
-            f_out.write(str(decoded_tree))
-            
-            tree_string = ""
-            tree_counter+=1
-        
-        tree_string += line
-        labels_counter += 1
+    f_in.close()
+    f_out.close()
+    return tree_counter, labels_counter, heur_counter, heur_counts, (cache_hits, cache_misses)
 
+def label_arrays(vocabulary, symbols):
+    '''
+    Returns three arrays indexed by label id with the head field, whether it
+    is D_NONE_LABEL and the relation id (interned in symbols) of the labels
+    of a dependency vocabulary; None if some head field is not a number.
+    '''
+    intern = symbols.intern
+    xi, xi_none, li = [], [], []
+    for label_id in range(len(vocabulary)):
+        label = vocabulary[label_id]
+        none = label.xi == D_NONE_LABEL
+        try:
+            xi.append(0 if none else int(label.xi))
+        except ValueError:
+            return None
+        xi_none.append(none)
+        li.append(intern(label.li))
+    return np.array(xi, dtype=np.int32), np.array(xi_none, dtype=bool), np.array(li, dtype=np.int32)
+
+def decode_dependencies_arrays(decoder, words, label_ids, offsets, vocabulary, postags=None, multiroot=False, 
+                               root_search=D_ROOT_HEAD, to_string=False):
+    '''
+    Decodes the predictions of a tagger straight from memory, without labels files.
+    The ABS and REL encodings decode the whole batch with array operations; the
+    rest decode tree by tree the label objects of the vocabulary.
+    :param decoder: Dependency encoding used to decode the labels
+    :param words: words of all the sentences, concatenated
+    :param label_ids: ids in the vocabulary of the label of every word (e.g. a numpy array)
+    :param offsets: sentence i spans the words offsets[i]..offsets[i+1]-1
+    :param vocabulary: LabelVocabulary of the labels predicted by the tagger
+    :param postags: part of speech tags of the words, concatenated (optional)
+    :param multiroot: boolean to indicate if multiroot conll trees are allowed
+    :param root_search: strategy to select how to search the root if no root found in decoded tree
+    :param to_string: return the trees as a conllu string
+    :return: list of D_Tree, or the conllu string of the trees if to_string is set
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    symbols = SymbolTable()
+    tables = label_arrays(vocabulary, symbols) if hasattr(decoder, "decode_label_batch") else None
+    if tables is not None:
+        xi, xi_none, li = tables
+        label_ids = np.asarray(label_ids, dtype=np.int64)
+        label_batch = D_LabelBatch(xi[label_ids], xi_none[label_ids], li[label_ids], offsets, decoder.separator, symbols)
+        decoded_trees = decoder.decode_label_batch(label_batch, list(words), postags).to_trees()
+    else:
+        label_ids = label_ids.tolist() if hasattr(label_ids, "tolist") else list(label_ids)
+        labels = [vocabulary[label_id] for label_id in label_ids]
+        decoded_trees = None
+
+    trees = []
+    for i, (start, end) in enumerate(zip(offsets[:-1].tolist(), offsets[1:].tolist())):
+        sentence = list(words[start:end])
+        tags = list(postags[start:end]) if postags is not None else [C_NO_POSTAG_LABEL]*len(sentence)
+        try:
+            if decoded_trees is not None:
+                decoded_tree = decoded_trees[i]
+            else:
+                decoded_tree = decoder.decode(LinearizedTree(sentence, tags, ["_"]*len(sentence), labels[start:end], 0))
+            decoded_tree.postprocess_tree(root_search, multiroot)
+        except Exception as e:
+            print(f"[*] Error decoding tree {i + 1}:\n{e}")
+            print(f"[*] Returning it as a flat tree...")
+            decoded_tree = flat_tree(sentence, tags)
+            decoded_tree.postprocess_tree(root_search, multiroot)
+        trees.append(decoded_tree)
 
-    return tree_counter, labels_counter, heur_counter
+    if to_string:
+        writer = ConlluWriter()
+        writer.write_trees(trees)
+        return writer.getvalue()
+    return trees
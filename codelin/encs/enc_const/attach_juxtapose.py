@@ -4,7 +4,6 @@ from codelin.models.const_label import C_Label
 from codelin.models.linearized_tree import LinearizedTree
 from codelin.models.const_tree import C_Tree
 from dataclasses import dataclass
-import copy
 import re
 
 @dataclass
@@ -21,117 +20,110 @@ def attach(new_rightmost_subtree, target_node, parent_label):
     Given a target node, a input token and (optionally) a parent label
     this function will create a new subtree as (parent_label(current_token))
     and attach it as the new rightmost subtree of the target node.
+    Returns the attached subtree.
     '''
     if parent_label is not None:
         new_rightmost_subtree = C_Tree(parent_label, children=[new_rightmost_subtree])
-        target_node.add_child(new_rightmost_subtree)
-        return new_rightmost_subtree
     
     target_node.add_child(new_rightmost_subtree)
+    return new_rightmost_subtree
 
 def juxtapose(new_subtree, target_node, parent_label, new_label):
     '''
     Given a target node, a parent label (optionally) and a new label this function 
     will create a new subtree as (parent_label(target_node)) and a new node with label
     new_label and children as the target node and the newly created subtree. This new 
-    node will replace the target node in the tree.
+    node replaces the target node, that must be the rightmost child of its parent.
+    Returns the new node.
     '''
     if parent_label is not None:
         new_subtree = C_Tree(parent_label, children=[new_subtree])
 
-    if target_node.parent is not None:
-        cpy_target_node = copy.deepcopy(target_node)
-        new_node = C_Tree(new_label, children=[cpy_target_node, new_subtree])
-        parent_node = target_node.parent
-        parent_node.children[parent_node.children.index(target_node)] = new_node
+    parent_node = target_node.parent
+    new_node = C_Tree(new_label, children=[target_node, new_subtree])
+    if parent_node is not None:
+        parent_node.children[-1] = new_node
+        new_node.parent = parent_node
     
-    else:
-        # we are at the root node
-        cpy_target_node = copy.deepcopy(target_node)
-        new_node = C_Tree(new_label, children=[cpy_target_node, new_subtree])
-        target_node.label = new_node.label
-        target_node.children = new_node.children
+    return new_node
 
-def get_level_of_subtree(t, st):
+def extend_rightmost_chain(chain, node):
     '''
-    Given a tree and a subtree representing the rightmost 
-    subtree of the tree, it returns the level of the subtree
+    Appends to chain the nodes from node down to its last word
     '''
-    if t == st:
-        return -1
-    else:
-        return 1 + get_level_of_subtree(t.children[-1], st)
+    chain.append(node)
+    while node.children:
+        node = node.children[-1]
+        chain.append(node)
 
-def _get_action_list(tree):
+def oracle_action_sequence(t):
     '''
-    Given a tree, it returns the action that caused the last subtree to be
-    attached to the tree. 
-    
-    problema:
+    Returns the (word, postag, action) rows that build the tree t word by word.
+    Words are removed from the end of the tree keeping its rightmost chain (the
+    nodes from the root to the last word) in a list, so the target of each action
+    is found by position and its depth is its index in the chain.
     
-    The tree must have NO unary chains (i.e. it must
-    collapse them first, including part of speech tags.)
+    The tree must have NO intermediate unary chains (i.e. it must
+    collapse them first)
     '''
-    last_postag = tree.get_terminals()[-1].parent
-    last_word   = last_postag.children[0]               
-    siblings    = last_postag.parent.children[:-1] if last_postag.parent is not None else []
+    if t is None:
+        return []
     
-    if siblings != []:
-        parent_label = None
-        last_subtree = last_postag
-        last_subtree_siblings = siblings
-    else:
-        last_subtree = last_postag.parent
-        if last_subtree is None:
-            return last_word.label, last_postag.label, \
-                Action(name="attach", target_node=0, parent_label=None, new_label=None), None
-        last_subtree_siblings = last_subtree.parent.children[:-1] if last_subtree.parent is not None else []
-        parent_label = last_subtree.label
-
-    if last_subtree.parent is None:
-        return last_word.label, last_postag.label, \
-            Action(name="attach", target_node=0, parent_label=parent_label, new_label=None), None 
-
-    elif len(last_subtree_siblings)==1 and not last_subtree_siblings[0].is_preterminal():
-        target_node_depth = get_level_of_subtree(tree, last_subtree)
+    rows = []
+    chain = []
+    extend_rightmost_chain(chain, t)
+    while True:
+        tree = chain[0]
+        if len(tree.children)==0 or (len(tree.children)==1 and tree.children[0].is_preterminal()):
+            p = tree.children[0].label if len(tree.children) > 0 else "POS"
+            w = tree.children[0].children[0].label if len(tree.children) > 0 else "WORD"
+            rows.append((w, p, Action(name="attach", target_node=0, parent_label=tree.label, new_label=None)))
+            break
+
+        last_word = chain[-1]
+        postag_idx = len(chain)-2
+        last_postag = chain[postag_idx]
+        postag_parent = chain[postag_idx-1] if postag_idx > 0 else None
         
-        new_label = last_subtree.parent.label
-        target_node = last_subtree_siblings[0]
-        grand_parent = last_subtree.parent.parent
-        if grand_parent is None:
-            tree = target_node
-            target_node.parent = None
+        if postag_parent is not None and len(postag_parent.children) > 1:
+            parent_label = None
+            subtree_idx = postag_idx
         else:
-            grand_parent.children = [target_node if c == last_subtree.parent else c for c in grand_parent.children]
-            target_node.parent = grand_parent
+            subtree_idx = postag_idx-1
+            if subtree_idx < 0:
+                rows.append((last_word.label, last_postag.label, Action(name="attach", target_node=0, parent_label=None, new_label=None)))
+                break
+            parent_label = chain[subtree_idx].label
         
-        return last_word.label, last_postag.label, \
-            Action(name="juxtapose", target_node = target_node_depth, parent_label = parent_label, new_label = new_label), tree
-    
-    else:
-        target_node_depth = get_level_of_subtree(tree, last_subtree)
-
-        target_node = last_subtree.parent
-        target_node.children.remove(last_subtree)
+        if subtree_idx == 0:
+            rows.append((last_word.label, last_postag.label, Action(name="attach", target_node=0, parent_label=parent_label, new_label=None)))
+            break
         
-        return last_word.label, last_postag.label, \
-            Action(name="attach", target_node = target_node_depth, parent_label = parent_label, new_label = None), tree
-
-def oracle_action_sequence(t):
-    # print(f"remaining tree\t\t {t}")
-    if t is None:
-        return []
-    if len(t.children)==0 or (len(t.children)==1 and t.children[0].is_preterminal()):
-        p = t.children[0].label if len(t.children) > 0 else "POS"
-        w = t.children[0].children[0].label if len(t.children) > 0 else "WORD"
+        # the target node is the parent of the last subtree
+        target_idx = subtree_idx-1
+        target_node = chain[target_idx]
+        last_subtree_siblings = target_node.children[:-1]
+        
+        if len(last_subtree_siblings)==1 and not last_subtree_siblings[0].is_preterminal():
+            # the sibling of the last subtree takes the place of their parent
+            rows.append((last_word.label, last_postag.label, Action(name="juxtapose", target_node=target_idx, parent_label=parent_label, new_label=target_node.label)))
+            sibling = last_subtree_siblings[0]
+            grand_parent = chain[target_idx-1] if target_idx > 0 else None
+            if grand_parent is not None:
+                grand_parent.children[-1] = sibling
+            sibling.parent = grand_parent
+            
+            del chain[target_idx:]
+            extend_rightmost_chain(chain, sibling)
+        else:
+            rows.append((last_word.label, last_postag.label, Action(name="attach", target_node=target_idx, parent_label=parent_label, new_label=None)))
+            target_node.children.pop()
+            
+            del chain[target_idx:]
+            extend_rightmost_chain(chain, target_node)
     
-        a = Action(name="attach", target_node=0, parent_label=t.label, new_label=None)
-        lin_tree_row = (w, p, a)
-        return [lin_tree_row]
-    else:
-        w, p, a, t = _get_action_list(t)
-        lin_tree_row = (w, p, a)
-        return oracle_action_sequence(t) + [lin_tree_row]
+    rows.reverse()
+    return rows
 
 class C_AttachJuxtapose(ACEncoding):
     def __init__(self, separator, unary_joiner, binary, binary_direction=None, binary_marker=None):        
@@ -173,65 +165,63 @@ class C_AttachJuxtapose(ACEncoding):
         return lc_tree
 
     def decode(self, linearized_tree):
-        t = C_Tree(C_NONE_LABEL)
-        st = t
-
-        is_first = True
+        # rightmost chain of the tree being built, without its last preterminal
+        tree = None
+        chain = []
         for word, postag, feats, label in linearized_tree.iterrows():
-            # reset level
-            t = st
-            
-            # extract action info from label
-            target_node = label.n_commons
-            action  = label.last_common.split("[;]")
-            action_name = None
-            parent_label = C_NONE_LABEL
+            # extract action info from label (name-target_node and pl=parent_label[;]nl=new_label)
+            action_name, target_node = label.n_commons.rsplit("-", 1)
+            parent_label = None
             new_label = C_NONE_LABEL
-            
-            for element in action:
-                n, v = element.split("=") if "=" in element else (element, None)
-                if n == "an":
-                    action_name = v
-                elif n == "pl":
+            for element in label.last_common.split("[;]"):
+                n, v = element.split("=", 1) if "=" in element else (element, None)
+                if n == "pl":
                     parent_label = v
                 elif n == "nl":
                     new_label = v
-
-            # enforce first action is an attach action
-            if is_first:
-                is_first = False
-                if action_name != "attach":
-                    #raise Exception("First action must be an attach action")
-                    action_name = "attach"
-                
             
-            action = Action(name=action_name, target_node=target_node, parent_label=parent_label, new_label=new_label)
+            action = Action(name=action_name, target_node=int(target_node), parent_label=parent_label, new_label=new_label)
 
-            # build terminal
-            term_tree = C_Tree(postag,[C_Tree(word)])
+            # build terminal (the leaf unary chain is restored with the intermediate ones)
             if label.unary_chain is not None and label.unary_chain != "":
-                for uc in reversed(label.unary_chain.split(self.unary_joiner)):
-                    term_tree = C_Tree(uc, [term_tree])
+                postag = label.unary_chain + self.unary_joiner + postag
+            term_tree = C_Tree(postag, [C_Tree(word)])
             
-            # take action
-            target_level = action.target_node
+            # enforce first action is an attach action
+            if tree is None:
+                tree = term_tree if action.parent_label is None else C_Tree(action.parent_label, [term_tree])
+                if not tree.is_preterminal():
+                    chain.append(tree)
+                continue
             
-            # descend until target level OR when we reach a preterminal node (postag)
-            while target_level > 0 and len(t.children) > 0 and not t.children[-1].is_preterminal():
-                t = t.children[-1]
-                target_level -= 1
+            if not chain:
+                # no node to attach to
+                tree = C_Tree(C_NONE_LABEL, [tree])
+                chain.append(tree)
+
+            # the target is at the given depth of the chain (or at its end)
+            target_level = max(min(action.target_node, len(chain)-1), 0)
+            target = chain[target_level]
+            del chain[target_level:]
             
             # apply action
-            if action.name == "attach":
-                attach(term_tree, t, action.parent_label)
+            if action.name == "juxtapose":
+                target = juxtapose(term_tree, target, action.parent_label, action.new_label)
+                if target_level == 0:
+                    tree = target
+                chain.append(target)
+                new_subtree = target.children[-1]
+            else:
+                chain.append(target)
+                new_subtree = attach(term_tree, target, action.parent_label)
             
-            elif action.name == "juxtapose":
-                t = juxtapose(term_tree, t, action.parent_label, action.new_label)
+            if not new_subtree.is_preterminal():
+                chain.append(new_subtree)
                 
-        final_tree = st.children[0]
+        final_tree = tree
         
         if self.binary:
             final_tree = C_Tree.restore_from_binary(final_tree, self.binary_marker)
         final_tree = final_tree.uncollapse_unary(self.unary_joiner)
         
-        return final_tree
\ No newline at end of file
+        return final_tree
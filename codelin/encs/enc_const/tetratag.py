@@ -3,10 +3,8 @@ from codelin.utils.constants import C_TETRA_ENCODING, C_ROOT_LABEL, C_CONFLICT_S
 from codelin.models.const_label import C_Label
 from codelin.models.linearized_tree import LinearizedTree
 from codelin.models.const_tree import C_Tree
-from typing import List
 
 import re
-import copy
 
 
 def shift_action(node):
@@ -37,50 +35,115 @@ def combine(tree, new_child):
     if type(new_child) is str:
         new_child = C_Tree(new_child)
     
-    current_level = tree
+    fill_slot(tree, new_child)
+    return tree
+
+def fill_slot(start, new_child, new_child_start=None):
+    '''
+    Replaces the first C_NONE_LABEL found walking down the right 
+    spine from 'start' with new_child. Returns the node where the next 
+    search on the same tree can start, as all the nodes above it in the 
+    right spine are already filled. When new_child ends up as the 
+    rightmost child its own start node (new_child_start) is inherited.
+    '''
+    current_level = start
     
     while(not current_level.has_none_child()):
         if (len(current_level.children) < 1):
-            current_level.children.append(new_child)
-            return tree
+            current_level.add_child(new_child)
+            return next_start(current_level, new_child, new_child_start)
             
-        current_level = current_level.r_child()
+        current_level = current_level.children[-1]
     
     # problem if here it does not have a none label
     if len(current_level.children)==1:
-        current_level.children.append(new_child)
-        return tree
-
-
-    if current_level.children[0].label == C_NONE_LABEL:
+        current_level.add_child(new_child)
+    
+    elif current_level.children[0].label == C_NONE_LABEL:
         current_level.children[0] = new_child
+        new_child.parent = current_level
     
     elif current_level.children[1].label == C_NONE_LABEL:
         current_level.children[1] = new_child
+        new_child.parent = current_level
     
-    return tree
+    return next_start(current_level, new_child, new_child_start)
 
-## Inorder functions
-def encode_inorder(tree: C_Tree, sep, ujoiner):    
-    tags    = [n.label for n in tree.get_preterminals()]
-    words   = [n.label for n in tree.get_terminals()]
-    tree = tree.remove_preterminals()
-    nodes: List[C_Tree] = []
+def next_start(current_level, new_child, new_child_start):
+    if new_child_start is not None and current_level.children[-1] is new_child and not current_level.has_none_child():
+        return new_child_start
+    return current_level
 
+def build_leaf(word, postag, unary_chain, ujoiner):
+    '''
+    Builds the subtree of a word: its part of speech 
+    tag and its leaf unary chain (if any)
+    '''
+    if postag == C_NONE_LABEL:
+        t = C_Tree(word)
+    else:
+        t = C_Tree(postag, [C_Tree(word)])
     
-    C_Tree.inorder(tree, lambda x: nodes.append(x))
+    # unary-chain (e.g. FIRST, NAME, etc)
+    if unary_chain:
+        for uc in reversed(unary_chain.split(ujoiner)):
+            t = C_Tree(uc, [t])
+    return t
+
+def pop_nonterminal(nts):
+    '''
+    Returns the next non terminal to reduce from the reversed 
+    list 'nts'; the last one is kept for any further reduction
+    '''
+    if len(nts) > 1:
+        return nts.pop()
+    return nts[0] if nts else ""
+
+def count_terminals(tree, counts):
+    '''
+    Returns len(tree.get_terminals()) memoizing the count of every
+    node in 'counts', so subtrees shared between trees are visited once
+    '''
+    pending = [tree]
+    while pending:
+        node = pending[-1]
+        if id(node) in counts:
+            pending.pop()
+            continue
+        
+        missing = [c for c in node.children if id(c) not in counts]
+        if missing:
+            pending.extend(missing)
+            continue
+        
+        pending.pop()
+        counts[id(node)] = sum(counts[id(c)] for c in node.children) if node.children else 1
+    return counts[id(tree)]
+
+def tetratag_actions(tree, traversal):
+    '''
+    Returns the words and part of speech tags of a tree along with the
+    actions of the nodes of the tree without preterminals, in the order
+    of the traversal ("inorder", "preorder" or "postorder"), as tuples
+    (is terminal, shift or reduce action, label of the non-terminal)
+    '''
+    actions = [(True, "r" if is_left else "l", None) if is_leaf else (False, "R" if is_left else "L", label)
+               for is_leaf, is_left, label in tree.get_traversal(traversal, preterminals_as_leaves=True)]
+    return tree.get_words(), tree.get_postags(), actions
+
+## Inorder functions
+def encode_inorder(tree: C_Tree, sep, ujoiner):    
+    words, tags, actions = tetratag_actions(tree, "inorder")
     lintree = LinearizedTree.empty_tree()
     cl = []
     lc = None
     i = 0
 
-    for node in nodes:
-        if node.is_terminal():
-            # print(f"[DEBUG] processing node {node.label} and it is a right child {node.is_right_child()}")
-            lbl = shift_action(node)
+    for is_terminal, lbl, nt in actions:
+        if is_terminal:
             cl.append(lbl)
         else:
-            lbl, lc = reduce_action(node)
+            lc = nt
             cl.append(lbl)
             
             ### INORDER => Append in non-terminals
@@ -106,111 +169,84 @@ def encode_inorder(tree: C_Tree, sep, ujoiner):
 
 
 def decode_inorder(l_in, ujoiner):
+    # subtrees being built along with the node where the
+    # search for their next C_NONE_LABEL slot has to start
     stack = []
+    slots = []
     for word, postag, feats, label in l_in.iterrows():
         # ensure n_commons is a str
-        if isinstance(label.n_commons, int):
-            label.n_commons = 'l'
-        operators = list(label.n_commons)
+        operators = list(label.n_commons) if not isinstance(label.n_commons, int) else ['l']
 
         for op in operators:
             # --- SHIFT = build a leaf subtree + unary chain, then push (if 'r') or combine (if 'l') ---
 
             if op == 'r':
-                # build leaf
-                if postag == C_NONE_LABEL:
-                    t = C_Tree(word)
-                else:
-                    t = C_Tree(postag, [C_Tree(word)])
-                
-                # unary-chain (e.g. FIRST, NAME, etc)
-                if label.unary_chain:
-                    for uc in reversed(label.unary_chain.split(ujoiner)):
-                        t = C_Tree(uc, [t])
+                t = build_leaf(word, postag, label.unary_chain, ujoiner)
                 stack.append(t)
+                slots.append(t)
 
             elif op == 'l':
-                # build leaf
-                if postag == C_NONE_LABEL:
-                    t = C_Tree(word)
-                else:
-                    t = C_Tree(postag, [C_Tree(word)])
-                if label.unary_chain:
-                    for uc in reversed(label.unary_chain.split(ujoiner)):
-                        t = C_Tree(uc, [t])
+                t = build_leaf(word, postag, label.unary_chain, ujoiner)
 
                 # combine into placeholder on top-of-stack (or push if empty)
                 if not stack:
                     stack.append(t)
+                    slots.append(t)
                 else:
-                    stack[-1] = combine(stack[-1], t)
+                    slots[-1] = fill_slot(slots[-1], t)
 
             # --- REDUCE = build a new NT with one child + ∅ placeholder ---
 
             elif op.startswith("R"):
                 nt = label.last_common
                 if not stack:
-                    # first operator is R => we must first build the leaf
-                    if postag == C_NONE_LABEL:
-                        t = C_Tree(word)
-                    else:
-                        t = C_Tree(postag, [C_Tree(word)])
-                    if label.unary_chain:
-                        for uc in reversed(label.unary_chain.split(ujoiner)):
-                            t = C_Tree(uc, [t])
-                    # now wrap
+                    # first operator is R => we must first build the leaf and wrap it
+                    t = build_leaf(word, postag, label.unary_chain, ujoiner)
                     tree = C_Tree(nt, [t, C_Tree.empty_tree()])
                     stack.append(tree)
+                    slots.append(tree)
                 else:
                     # normal left-corner reduce
                     tree = C_Tree(nt, [stack[-1], C_Tree.empty_tree()])
                     stack[-1] = tree
+                    slots[-1] = tree
 
             elif op.startswith("L"):
                 nt = label.last_common
                 if not stack:
                     # first operator is L => same hack
-                    if postag == C_NONE_LABEL:
-                        t = C_Tree(word)
-                    else:
-                        t = C_Tree(postag, [C_Tree(word)])
-                    if label.unary_chain:
-                        for uc in reversed(label.unary_chain.split(ujoiner)):
-                            t = C_Tree(uc, [t])
+                    t = build_leaf(word, postag, label.unary_chain, ujoiner)
                     tree = C_Tree(nt, [t, C_Tree.empty_tree()])
                     stack.append(tree)
+                    slots.append(tree)
                 else:
                     # normal right-corner reduce
                     child = stack.pop()
+                    slots.pop()
                     tree  = C_Tree(nt, [child, C_Tree.empty_tree()])
                     if stack:
-                        stack[-1] = combine(stack[-1], tree)
+                        slots[-1] = fill_slot(slots[-1], tree, tree)
                     else:
                         stack.append(tree)
+                        slots.append(tree)
 
     while len(stack) > 1:
         t = stack.pop()
-        stack[-1] = combine(stack[-1], t)
+        t_slot = slots.pop()
+        slots[-1] = fill_slot(slots[-1], t, t_slot)
     final_tree=stack.pop()
     return final_tree
 
 ## Preorder functions
 
 def encode_preorder(tree, sep, ujoiner):
-    tags    = [n.label for n in tree.get_preterminals()]
-    words   = [n.label for n in tree.get_terminals()]
-
-    tree = tree.remove_preterminals()
-    nodes = []
-    
-    C_Tree.preorder(tree, lambda x: nodes.append(x))
+    words, tags, actions = tetratag_actions(tree, "preorder")
     lintree = LinearizedTree.empty_tree()
     cl = []
     lc = None
     i = 0
-    for node in nodes:
-        if node.is_terminal():
-            lbl = shift_action(node)
+    for is_terminal, lbl, nt in actions:
+        if is_terminal:
             cl.append(lbl)
             
             ### PREORDER => Append in terminals
@@ -238,7 +274,7 @@ def encode_preorder(tree, sep, ujoiner):
             lc = None
             cl = []
         else:
-            lbl, lc_i = reduce_action(node)
+            lc_i = nt
             if lc is None:
                 lc = lc_i
             else:
@@ -250,12 +286,10 @@ def decode_preorder(l_in, ujoiner):
     stack = []
     for word, postag, feats, label in l_in.iterrows():
         # print(word,'\t\t', label)
+        # non terminals of the label (NT1>NT2>...) pending to be reduced, reversed
+        nts = label.last_common.split(">")[::-1]
         operators = list(label.n_commons)
         for op in operators:
-            # print("*** running",word,op)
-            for x in stack:
-                C_Tree.pretty_print(x)
-            
             if op == 'r':
                 # r => node is a left terminal children, add it to the stack
                 terminal_tree = C_Tree(postag, children=[C_Tree(word)])
@@ -297,24 +331,20 @@ def decode_preorder(l_in, ujoiner):
                     # print("combining",parent_tree.children[1],"with",terminal_tree)
                     parent_tree.children[1] = combine(parent_tree.children[1], terminal_tree)
 
+                parent_tree.children[1].parent = parent_tree
                 while not parent_tree.has_none_child() and len(stack)>0:
                     parent_tree = stack.pop()
-                    parent_tree.update_custody()
                 
                 stack.append(parent_tree)
 
             elif op.startswith("R"):
                 # get the non terminal (or non terminals)
-                if ">" in label.last_common:
-                    nt = label.last_common.split(">")[0]
-                    label.last_common = ">".join(label.last_common.split(">")[1:])
-                else:
-                    nt = label.last_common
+                nt = pop_nonterminal(nts)
                 
                 if len(stack) > 0:
                     l_child = C_Tree(nt, children=[C_Tree(C_NONE_LABEL), C_Tree(C_NONE_LABEL)])
                     stack[-1].children[0] = l_child
-                    stack[-1].update_custody()
+                    l_child.parent = stack[-1]
                     
                     stack.append(l_child)
                 else:
@@ -322,20 +352,17 @@ def decode_preorder(l_in, ujoiner):
 
             elif op.startswith("L"):
                 # get the non terminal (or non terminals)
-                if ">" in label.last_common:
-                    nt = label.last_common.split(">")[0]
-                    label.last_common = ">".join(label.last_common.split(">")[1:])
-                else:
-                    nt = label.last_common
+                nt = pop_nonterminal(nts)
                 
                 if len(stack)>0:
-                    # create a new tree T with label=nt children=<bottom of the stack children>
-                    # and replace the rightmost children of the bottom of the stack with T
-                    r_child = C_Tree(nt, copy.deepcopy(stack[-1].children))
-                    # print(">> running L for rchild",r_child,"and into",stack[-1])
+                    # create a new tree T with label=nt and replace the rightmost child of
+                    # the bottom of the stack with T. The replaced child is moved into T and
+                    # the left child of T is a new empty slot, so no node has two parents
+                    # (the left child of the bottom of the stack stays there)
+                    r_child = C_Tree(nt, [C_Tree(C_NONE_LABEL), stack[-1].children[1]])
 
                     stack[-1].children[1] = r_child
-                    stack[-1].update_custody()
+                    r_child.parent = stack[-1]
 
                     # append it to the bottom of the stack again as it is the new rightmost node
                     stack.append(r_child)
@@ -344,32 +371,27 @@ def decode_preorder(l_in, ujoiner):
     
     # get the tree with all the words (hope for the best)
     final_tree = stack.pop()
+    n_terminals = {}
     try:
-        while(len(final_tree.get_terminals()) < len(l_in)):
+        while(count_terminals(final_tree, n_terminals) < len(l_in)):
             final_tree = stack.pop()
     except:
         print(l_in)
 
-    if final_tree.label == "-ROOT-" and len(final_tree.children[0].get_terminals())==len(final_tree.get_terminals()):
+    if final_tree.label == "-ROOT-" and count_terminals(final_tree.children[0], n_terminals)==count_terminals(final_tree, n_terminals):
         final_tree.inherit_tree(force=True)
 
     return final_tree
 
 ## Postorder functions
 def encode_postorder(tree, sep, ujoiner):
-    tags    = [n.label for n in tree.get_preterminals()]
-    words   = [n.label for n in tree.get_terminals()]
-    tree = tree.remove_preterminals()
-    nodes = []
-    
-    C_Tree.postorder(tree, lambda x: nodes.append(x))
+    words, tags, actions = tetratag_actions(tree, "postorder")
     lintree = LinearizedTree.empty_tree()
     cl = []
     lc = None
     i = 0
-    for node in nodes:
-        if node.is_terminal():
-            lbl = shift_action(node)
+    for is_terminal, lbl, nt in actions:
+        if is_terminal:
             cl.append(lbl)
             
             ### POSTORDER  => Append in terminals (but binarized to the left)
@@ -397,7 +419,7 @@ def encode_postorder(tree, sep, ujoiner):
             lc = None
             cl = []
         else:
-            lbl, lc_i = reduce_action(node)
+            lc_i = nt
             if lc is None:
                 lc = lc_i
             else:
@@ -413,6 +435,8 @@ def encode_postorder(tree, sep, ujoiner):
 def decode_postorder(l_in, ujoiner):
     stack = []
     for word, postag, feats, label in l_in.iterrows():
+        # non terminals of the label (NT1>NT2>...) pending to be reduced, reversed
+        nts = label.last_common.split(">")[::-1]
         operators = list(label.n_commons)
         for op in operators:
             if op == 'r':
@@ -434,8 +458,8 @@ def decode_postorder(l_in, ujoiner):
                         terminal_tree = C_Tree(uc, [terminal_tree])
 
                 # remove from the non-terminal list the associate -none- (if exists)
-                if C_NONE_LABEL == label.last_common.split(">")[0]:
-                    label.last_common = ">".join(label.last_common.split(">")[1:])
+                if nts and nts[-1] == C_NONE_LABEL:
+                    nts.pop()
 
                 # See if we can close this node
                 if not stack[-1].has_none_child():
@@ -445,19 +469,16 @@ def decode_postorder(l_in, ujoiner):
                     parent_tree = stack.pop()
                     parent_tree.children[1] = terminal_tree
 
+                terminal_tree.parent = parent_tree
+
                 # moving up the tree until we find a node with a right child
                 while not parent_tree.has_none_child() and len(stack)>0:
                     parent_tree = stack.pop()
-                    parent_tree.update_custody()
                 stack.append(parent_tree)
 
             elif op.startswith("R"):
                 # get the non terminal
-                if ">" in label.last_common:
-                    nt = label.last_common.split(">")[0]
-                    label.last_common = ">".join(label.last_common.split(">")[1:])
-                else:
-                    nt = label.last_common
+                nt = pop_nonterminal(nts)
 
                 # node is a left non terminal child, combine it with the top of the stack
                 if len(stack) > 0 :
@@ -466,7 +487,6 @@ def decode_postorder(l_in, ujoiner):
                     
                     new_children = [l_child] if r_child is None else [r_child, l_child]
                     p_tree  = C_Tree(nt, children=new_children)
-                    p_tree.update_custody()
                     stack.append(p_tree)
                 else:
                     stack.append(C_Tree(nt, [C_Tree.empty_tree(), C_Tree.empty_tree()]))
@@ -475,11 +495,7 @@ def decode_postorder(l_in, ujoiner):
                 # L => node is a right non terminal child, combine it with the top of the stack
                 
                 # get the non terminal (or non terminals)
-                if ">" in label.last_common:
-                    nt = label.last_common.split(">")[0]
-                    label.last_common = ">".join(label.last_common.split(">")[1:])
-                else:
-                    nt = label.last_common
+                nt = pop_nonterminal(nts)
 
                 if len(stack)>0:
                     l_child = stack.pop() if len(stack) > 0 else None
@@ -487,8 +503,6 @@ def decode_postorder(l_in, ujoiner):
                     
                     new_children = [l_child] if r_child is None else [r_child, l_child]
                     p_tree  = C_Tree(nt, children=new_children)
-                    
-                    p_tree.update_custody()
                     stack.append(p_tree)
 
     final_tree = stack.pop()
@@ -512,9 +526,9 @@ class C_Tetratag(ACEncoding):
         constituent_tree = constituent_tree.collapse_unary(self.unary_joiner)
         # print(f"collapsed tree: {constituent_tree}")
         if self.binary_direction=="R":
-            constituent_tree = C_Tree.to_binary_right(constituent_tree, self.binary_marker)
+            constituent_tree = type(constituent_tree).to_binary_right(constituent_tree, self.binary_marker)
         elif self.binary_direction=="L":
-            constituent_tree = C_Tree.to_binary_left(constituent_tree, self.binary_marker)
+            constituent_tree = type(constituent_tree).to_binary_left(constituent_tree, self.binary_marker)
         else:
             raise Exception("Binary direction not supported")
         # print(constituent_tree)
@@ -1,15 +1,13 @@
 from codelin.encs.abstract_encoding import ADEncoding
-from codelin.models.deps_label import D_Label
 from codelin.models.deps_tree import D_Tree
-from codelin.encs.constituent import C_Tetratag
-from codelin.models.const_tree import C_Tree
-from codelin.utils.constants import D_NONE_LABEL, D_2P_GREED, D_2P_PROP, C_NONE_LABEL
+from codelin.encs.enc_const import C_Tetratag
 from codelin.models.linearized_tree import LinearizedTree
 
 class D_HexatagEncoding(ADEncoding):
-    
+
     def __init__(self, separator:str = "_"):
         super().__init__(separator)
+        self.tagger = C_Tetratag(separator=self.separator, unary_joiner="[+]", mode="inorder", binary_direction="R", binary_marker="[b]")
 
     def __str__(self):
         return "Dependency Hexa-Tags Encoding"
@@ -17,35 +15,28 @@ class D_HexatagEncoding(ADEncoding):
     def encode(self, dep_tree):
         # to encode hexatags we employ tetratagging into a bht converted dependency tree
         # the reltype encoding will be dealt by the unary chain encoding mechanism
-        bht_tree = D_Tree.to_bht(dep_tree, include_reltype=True)
-        print(bht_tree)
-        tagger = C_Tetratag(separator=self.separator, unary_joiner="[+]", mode="inorder", binary_marker="[b]")
-        lin_tree = tagger.encode(bht_tree)
-
-        # resort the words of the linearized tree to match the original order
-        # this is necessary because the tetratagging process may change the order
-        # of the words in the tree
-        lin_tree = LinearizedTree.sort_words(lin_tree, dep_tree)
-
+        word_ids = []
+        bht_tree = D_Tree.to_bht(dep_tree, include_reltype=True, word_ids=word_ids)
+        bht_lin_tree = self.tagger.encode(bht_tree)
+
+        # the rows follow the terminals of the bht; put each one back at the
+        # position of its word (they only differ if the tree is not projective)
+        rows = [None]*len(dep_tree)
+        first_id = dep_tree[0].id
+        for row, wid in enumerate(word_ids):
+            rows[wid - first_id] = row
+
+        lin_tree = LinearizedTree.empty_tree()
+        for row in rows:
+            if row is not None:
+                lin_tree.add_row(bht_lin_tree.get_word(row), bht_lin_tree.get_postag(row),
+                                 bht_lin_tree.get_additional_feat(row), bht_lin_tree.get_label(row))
         return lin_tree
-        
+
     def decode(self, lin_tree):
-        tagger = C_Tetratag(separator=self.separator, unary_joiner="[+]", mode="inorder", binary_marker="[b]")
-        bht_tree = tagger.decode(lin_tree)
+        # the terminals of the decoded bht are the rows of the linearized tree,
+        # so the words keep their positions (and the dummy root its id 0)
+        bht_tree = self.tagger.decode(lin_tree)
         dectree = D_Tree.from_bht(bht_tree)
-
-        # remove first node if id = 0 and form = '-ROOT-'
-        if dectree.nodes[0].id == 0 and dectree.nodes[0].form == "-ROOT-":
-            dectree.nodes.pop(0)
-
-        # remove -NONE- nodes
-        for node in dectree.nodes:
-            if node.form == "-NONE-":
-                dectree.nodes.remove(node)
-        
-        # fix ids starting in 0
-        if dectree.nodes[0].id == 0:
-            for node in dectree.nodes:
-                node.id += 1
-
-        return dectree
\ No newline at end of file
+        dectree.remove_dummy()
+        return dectree
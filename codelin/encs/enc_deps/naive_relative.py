@@ -2,7 +2,9 @@ from codelin.encs.abstract_encoding import ADEncoding
 from codelin.models.deps_label import D_Label
 from codelin.models.linearized_tree import LinearizedTree
 from codelin.models.deps_tree import D_Tree
-from codelin.utils.constants import D_NONE_LABEL
+from codelin.models.deps_batch import D_TreeBatch, D_LabelBatch, word_positions
+from codelin.utils.constants import D_NONE_LABEL, C_NO_POSTAG_LABEL
+import numpy as np
 
 class D_NaiveRelativeEncoding(ADEncoding):
     def __init__(self, separator, hang_from_root):
@@ -45,4 +47,27 @@ class D_NaiveRelativeEncoding(ADEncoding):
             i+=1
 
         dep_tree.remove_dummy()
-        return dep_tree
\ No newline at end of file
+        return dep_tree
+
+    def encode_tree_batch(self, tree_batch):
+        '''
+        Encodes all the trees of a D_TreeBatch at once; the
+        labels are the offsets to the heads and the relations
+        '''
+        xi_none = np.zeros(tree_batch.n_words(), dtype=bool)
+        if self.hfr:
+            root = tree_batch.symbols.get_id('root')
+            if root is not None:
+                xi_none = tree_batch.relations == root
+        return D_LabelBatch(tree_batch.heads - tree_batch.ids, xi_none, tree_batch.relations, tree_batch.offsets, self.separator, tree_batch.symbols)
+
+    def decode_label_batch(self, label_batch, forms, postags=None):
+        '''
+        Decodes all the labels of a D_LabelBatch at once into a D_TreeBatch
+        '''
+        positions = word_positions(label_batch.offsets)
+        heads = np.where(label_batch.xi_none, 0, label_batch.xi + positions)
+        symbols = label_batch.symbols
+        intern = symbols.intern
+        upos = [intern(p) for p in postags] if postags is not None else np.full(len(forms), intern(C_NO_POSTAG_LABEL))
+        return D_TreeBatch(forms, positions, heads, upos, label_batch.li, label_batch.offsets, symbols)
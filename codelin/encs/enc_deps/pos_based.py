@@ -1,3 +1,4 @@
+import bisect
 from codelin.encs.abstract_encoding import ADEncoding
 from codelin.models.deps_label import D_Label
 from codelin.models.deps_tree import D_Tree
@@ -46,16 +47,21 @@ class D_PosBasedEncoding(ADEncoding):
 
         i = 1
         postags = lin_tree.postags
+        
+        # positions (1-indexed) of the words with each postag
+        positions = {}
+        for position, postag in enumerate(postags, 1):
+            positions.setdefault(postag, []).append(position)
+
         for word, postag, features, label in lin_tree.iterrows():
             node_id = i
-            if label.xi == D_NONE_LABEL:
-                label.xi = POS_ROOT_LABEL
+            xi = label.xi if label.xi != D_NONE_LABEL else POS_ROOT_LABEL
             
             dep_tree.update_word(node_id, word)
             dep_tree.update_upos(node_id, postag)
             dep_tree.update_relation(node_id, label.li)
             
-            oi, pi = label.xi.split('--')
+            oi, pi = xi.split('--')
             oi = int(oi)
 
             # Set head for root
@@ -64,18 +70,23 @@ class D_PosBasedEncoding(ADEncoding):
                 i+=1
                 continue
 
-            # Compute head position
-            target_oi = oi
-
-            step = 1 if oi > 0 else -1
-            stop_point = (len(postags)+1) if oi > 0 else 0
-
-            for j in range(node_id+step, stop_point, step):
-                if (pi == postags[j-1]):
-                    target_oi -= step
-                
-                if (target_oi==0):
-                    break
+            # Compute head position: the oi-th word tagged as pi
+            # to the right (oi > 0) or to the left (oi < 0) of the node
+            pi_positions = positions.get(pi, [])
+            if oi > 0:
+                idx = bisect.bisect_right(pi_positions, node_id) + oi - 1
+                if idx < len(pi_positions):
+                    j = pi_positions[idx]
+                elif node_id < len(postags):
+                    # not enough words tagged as pi, stop at the last word
+                    j = len(postags)
+            else:
+                idx = bisect.bisect_left(pi_positions, node_id) + oi
+                if idx >= 0:
+                    j = pi_positions[idx]
+                elif node_id > 1:
+                    # not enough words tagged as pi, stop at the first word
+                    j = 1
             
             head_id = j
             dep_tree.update_head(node_id, head_id)
@@ -1,6 +1,9 @@
 from codelin.utils.constants import C_ABSOLUTE_ENCODING, C_RELATIVE_ENCODING, C_NONE_LABEL, C_TETRA_ENCODING, C_JUXTAPOSED_ENCODING
 
 class C_Label:
+    # one label per token: slots instead of a __dict__ save memory
+    __slots__ = ('encoding_type', 'n_commons', 'last_common', 'unary_chain', 'separator', 'unary_joiner')
+
     def __init__(self, nc, lc, uc, et, sp, uj):
         self.encoding_type = et
         self.n_commons = int(nc) if et in [C_ABSOLUTE_ENCODING, C_RELATIVE_ENCODING] else nc
@@ -14,6 +17,9 @@ class C_Label:
         return (str(self.n_commons) + ("*" if self.encoding_type==C_RELATIVE_ENCODING else "")
         + self.separator + str(self.last_common) + (self.separator + unary_str if self.unary_chain else ""))
     
+    def copy(self):
+        return C_Label(self.n_commons, self.last_common, self.unary_chain, self.encoding_type, self.separator, self.unary_joiner)
+
     def to_absolute(self, last_label):
         self.n_commons+=last_label.n_commons
         if self.n_commons<=0:
@@ -1,16 +1,25 @@
 from codelin.utils.constants import C_END_LABEL, C_START_LABEL, C_NONE_LABEL, C_ROOT_LABEL
 from codelin.utils.constants import C_CONFLICT_SEPARATOR, C_STRAT_MAX, C_STRAT_FIRST, C_STRAT_LAST, C_NONE_LABEL
 import copy
+import re
+
+# brackets and runs of characters that are neither brackets nor whitespace
+_BRACKETED_TOKENS = re.compile(r"\(|\)|[^\s()]+")
 
 
 class C_Tree:
+    # nodes have no __dict__ to keep large treebanks small in memory; the
+    # leftmost/rightmost child caches are only set by their precompute functions
+    __slots__ = ('parent', 'label', 'children', 'features', '_rmost_child', '_lmost_child')
+
     def __init__(self, label, children=[], feats=None):
         self.parent = None
         self.label = label
         self.children = []
         self.features = feats
 
-        self.add_child(children)
+        if children:
+            self.add_child(children)
 
 # Adders and deleters
     def add_child(self, child):
@@ -99,7 +108,7 @@ class C_Tree:
     def precompute_rmost_child(self):
         """
         Recursively computes and stores the rightmost child for each subtree.
-        Adds `_rmost_child` attribute to every node.
+        Sets the `_rmost_child` slot of every node.
         """
         if not self.children:
             self._rmost_child = self
@@ -131,7 +140,7 @@ class C_Tree:
     def precompute_lmost_child(self):
         """
         Recursively computes and stores the leftmost child for each subtree.
-        Adds `_lmost_child` attribute to every node.
+        Sets the `_lmost_child` slot of every node.
         """
         if not self.children:
             self._lmost_child = self
@@ -208,7 +217,25 @@ class C_Tree:
             return [self.label]
         else:
             return [node for child in self.children for node in child.get_words()]
-    
+
+    def get_postags(self):
+        '''
+        Returns the labels of the preterminal nodes of the tree
+        '''
+        return [node.label for node in self.get_preterminals()]
+
+    def get_traversal(self, order, preterminals_as_leaves=False):
+        '''
+        Returns a tuple (is leaf, is left child, label) for every node
+        of the tree in the given order ("preorder", "inorder" or "postorder").
+        If preterminals_as_leaves is set the preterminals are removed and
+        their words are taken as the leaves.
+        '''
+        tree = self.remove_preterminals() if preterminals_as_leaves else self
+        nodes = []
+        getattr(C_Tree, order)(tree, nodes.append)
+        return [(node.is_terminal(), node.is_left_child(), node.label) for node in nodes]
+
     def get_non_terminals(self):
         '''
         Returns the unique labels of the non-terminal nodes of the tree
@@ -557,10 +584,18 @@ class C_Tree:
         self.children = self.children[0].children
 
     def add_root_node(self):
-        copy_tree = copy.deepcopy(self)
+        '''
+        Function that adds a root node on top of the tree. The
+        node keeps its identity and its contents are moved to a
+        new child, so the tree is not copied
+        '''
+        child = C_Tree(self.label, feats=copy.copy(self.features))
+        child.children = self.children
+        for c in child.children:
+            c.parent = child
+        child.parent = self
         self.label = C_ROOT_LABEL
-        self.children = [copy_tree]
-        copy_tree.parent = self
+        self.children = [child]
 
     def add_end_node(self):
         '''
@@ -597,6 +632,42 @@ class C_Tree:
         self.add_end_node() 
         return path_to_leaves_rec(self, [], [], 0)
     
+    def get_adjacent_leaves_lca(self, unary_joiner="[+]"):
+        '''
+        Returns, for every leaf but the last one, a tuple (leaf, parent, n_commons, lca) 
+        where lca is the lowest common ancestor of the leaf and the next one and
+        n_commons the number of nodes from the root to the lca (both included), 
+        counting each member of a collapsed unary chain. Node labels are indexed 
+        as in path_to_leaves. Computed in a single traversal: the lca of two
+        adjacent leaves is the node whose next child is being visited.
+        '''
+        leaves = []
+        prev_leaf = None
+        root_key = self.label+'[0]'
+        
+        # frames shaped as [node, indexed label, n_commons, index, next child]
+        stack = [[self, root_key, len(root_key.split(unary_joiner)), 0, 0]]
+        while stack:
+            frame = stack[-1]
+            node, key, n_commons, idx, k = frame
+            if k == len(node.children):
+                stack.pop()
+                continue
+            frame[4] += 1
+            
+            if k > 0 and prev_leaf is not None:
+                leaves.append((prev_leaf[0], prev_leaf[1], n_commons, key))
+                prev_leaf = None
+
+            child = node.children[k]
+            if len(child.children) == 0:
+                prev_leaf = (child.label, key)
+            else:
+                child_key = child.label+'['+str(idx+k)+']'
+                stack.append([child, child_key, n_commons+len(child_key.split(unary_joiner)), idx+k, 0])
+        
+        return leaves
+
     def path_to_leaves_nodes(self):
         '''
         Returns the list of tree nodes from the root to the leaves
@@ -853,58 +924,88 @@ class C_Tree:
 # Tree creation
     @staticmethod
     def from_string(s):
-        s = s.replace("(","( ")
-        s = s.replace(")"," )")
-        s = s.split(" ")
-        
-        # create dummy label and append it to the stack
-        stack = []        
-        i=0
-        while i < (len(s)):
-            if s[i]=="(":
-                # If we find a l_brk we create a new tree
-                # with label=next_word. Skip next_word.
-                w = s[i+1]
-                t = C_Tree(w, [])
-                stack.append(t)
-                i+=1
-
-            elif s[i]==")":
-                # If we find a r_brk set top of the stack
-                # as children to the second top of the stack
-
-                t = stack.pop()
+        '''
+        Parses a bracketed tree in a single regex scan using an
+        explicit stack. Tokens can be separated by any amount of whitespace
+        (including newlines) and escaped brackets (-LBR-, -RBR-) are kept
+        as regular words. Brackets without label (e.g. the PTB "( (S ...) )")
+        get an empty label.
+        '''
+        # nodes are created without going through __init__/add_child,
+        # as the parser already knows every child is a C_Tree
+        new_node = object.__new__
+        stack = []
+        tokens = iter(_BRACKETED_TOKENS.findall(s))
+        for token in tokens:
+            if token == ")":
+                if not stack:
+                    raise Exception("[*] Error: unbalanced bracket in tree "+s)
+                tree = stack.pop()
+                if not stack:
+                    return tree
+            
+            elif token == "(":
+                label = next(tokens, ")")
+                while label == "(":
+                    tree = C_Tree("")
+                    if stack:
+                        stack[-1].add_child(tree)
+                    stack.append(tree)
+                    label = next(tokens, ")")
                 
-                if len(stack)==0:
-                    return t
-
-                pt = stack.pop()
-                pt.add_child(t)
-                stack.append(pt)
+                if label == ")":
+                    raise Exception("[*] Error: empty bracket in tree "+s)
+                
+                tree = new_node(C_Tree)
+                tree.label = label
+                tree.children = []
+                tree.features = None
+                tree.parent = stack[-1] if stack else None
+                if stack:
+                    stack[-1].children.append(tree)
+                stack.append(tree)
             
             else:
-                # If we find a word set it as children
-                # of the current tree.
-                t = stack.pop()
-                w = s[i]
-                c = C_Tree(w, [])
-                t.add_child(c)
-                stack.append(t)
+                # words are added as terminal children of the current tree
+                if not stack:
+                    raise Exception("[*] Error: word outside brackets in tree "+s)
+                parent = stack[-1]
+                tree = new_node(C_Tree)
+                tree.label = token
+                tree.children = []
+                tree.features = None
+                tree.parent = parent
+                parent.children.append(tree)
+
+        raise Exception("[*] Error: unbalanced bracket in tree "+s)
 
-            i+=1
-        return t
+    @staticmethod
+    def iter_tree_strings(file_io):
+        '''
+        Yields the bracketed trees of a file one by one. Trees
+        may span several lines, in which case their lines are joined.
+        '''
+        lines = []
+        depth = 0
+        for line in file_io:
+            line = line.strip()
+            if not line:
+                continue
+            
+            lines.append(line)
+            depth += line.count("(") - line.count(")")
+            if depth <= 0:
+                yield " ".join(lines)
+                lines = []
+                depth = 0
+        
+        if lines:
+            yield " ".join(lines)
 
     @staticmethod
     def read_trees_file(file_path):
-        trees = []
         with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                # fix for windows
-                if line.endswith("\n"):
-                    line = line[:-1]
-                    
-                trees.append(C_Tree.from_string(line))
-        return trees
+            return [C_Tree.from_string(tree_string) for tree_string in C_Tree.iter_tree_strings(f)]
 
 # node creation
     @staticmethod
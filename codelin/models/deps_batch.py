@@ -0,0 +1,209 @@
+from codelin.models.deps_label import D_Label
+from codelin.models.deps_tree import D_Tree, D_Node
+from codelin.utils.constants import BOS, EOS, C_NONE_LABEL, D_NONE_LABEL
+from codelin.utils.symbols import SymbolTable
+import numpy as np
+
+
+def word_positions(offsets):
+    '''
+    Returns the position (starting at 1) of every word in its
+    sentence, given the offsets of the sentences of a batch
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts = np.repeat(offsets[:-1], np.diff(offsets))
+    return (np.arange(offsets[-1]) - starts + 1).astype(np.int32)
+
+class D_TreeBatch:
+    '''
+    Columnar view of a batch of dependency trees: the fields of all
+    the words of the batch are concatenated in arrays and the words of
+    the sentence i are those in offsets[i]..offsets[i+1]-1.
+        - ids, heads: int32 arrays with the conllu ids and heads
+        - upos, relations: int32 arrays with the ids of the part of speech
+          tags and dependency relations in symbols
+        - forms: list with the words
+        - symbols: SymbolTable of the batch
+    Only the fields used by the encodings are kept (no lemmas, features...)
+    and the dummy root is not stored.
+    '''
+    __slots__ = ('forms', 'ids', 'heads', 'upos', 'relations', 'offsets', 'symbols')
+
+    def __init__(self, forms, ids, heads, upos, relations, offsets, symbols):
+        self.forms = forms
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.heads = np.asarray(heads, dtype=np.int32)
+        self.upos = np.asarray(upos, dtype=np.int32)
+        self.relations = np.asarray(relations, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.symbols = symbols
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def n_words(self):
+        return len(self.forms)
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def get_postags(self, i):
+        symbols = self.symbols
+        return [symbols[u] for u in self.upos[self.offsets[i]:self.offsets[i+1]].tolist()]
+
+    def get_words(self, i):
+        return self.forms[self.offsets[i]:self.offsets[i+1]]
+
+    def get_tree(self, i):
+        '''
+        Returns the sentence i as a D_Tree (without dummy root)
+        '''
+        symbols = self.symbols
+        start, end = self.offsets[i], self.offsets[i+1]
+        return D_Tree([D_Node(wid, form, upos=symbols[upos], head=head, deprel=symbols[rel]) for wid, form, upos, head, rel in
+                       zip(self.ids[start:end].tolist(), self.forms[start:end], self.upos[start:end].tolist(),
+                           self.heads[start:end].tolist(), self.relations[start:end].tolist())])
+
+    def to_trees(self):
+        return [self.get_tree(i) for i in range(len(self))]
+
+    @staticmethod
+    def from_trees(trees, symbols=None):
+        '''
+        Builds the batch from D_Tree objects (the dummy roots are skipped),
+        interning their fields in symbols (a new table if not given)
+        '''
+        symbols = symbols if symbols is not None else SymbolTable()
+        intern = symbols.intern
+        forms, ids, heads, upos, relations, offsets = [], [], [], [], [], [0]
+        for tree in trees:
+            for node in tree:
+                if node.id == 0:
+                    continue
+                forms.append(node.form)
+                ids.append(node.id)
+                heads.append(node.head)
+                upos.append(intern(node.upos))
+                # relations set to None are written as "_" in the labels
+                relations.append(intern(node.relation if node.relation is not None else "_"))
+            offsets.append(len(forms))
+        return D_TreeBatch(forms, ids, heads, upos, relations, offsets, symbols)
+
+    @staticmethod
+    def from_conllu_blocks(blocks, symbols=None):
+        '''
+        Builds the batch straight from conllu sentence blocks, skipping
+        the same lines as D_Tree.from_string (comments, contractions
+        and omitted words) without creating D_Node objects. The fields
+        are interned in symbols (a new table if not given).
+        '''
+        rows, offsets = [], [0]
+        for block in blocks:
+            for line in block.split('\n'):
+                columns = line.split('\t')
+                if len(columns) < 10:
+                    continue
+                wid = columns[0]
+                if "#" in wid or "-" in wid or "." in wid:
+                    continue
+                rows.append(columns)
+            offsets.append(len(rows))
+
+        symbols = symbols if symbols is not None else SymbolTable()
+        intern_all = symbols.intern_all
+        forms = [row[1] if row[1] else "_" for row in rows]
+        ids = [int(row[0]) for row in rows]
+        heads = [int(row[6]) for row in rows]
+        upos = intern_all([row[3] if row[3] else "_" for row in rows])
+        relations = intern_all([row[7] for row in rows])
+        return D_TreeBatch(forms, ids, heads, upos, relations, offsets, symbols)
+
+
+class D_LabelBatch:
+    '''
+    Labels of a batch of dependency trees as arrays, with the offsets
+    of the D_TreeBatch they belong to:
+        - xi: int32 array with the head field of the labels
+        - xi_none: bool array, set where the head field is D_NONE_LABEL
+        - li: int32 array with the ids of the relations in symbols
+        - symbols: SymbolTable of the batch (the one of the D_TreeBatch
+          when the labels come from encode_tree_batch)
+    The labels are only turned into strings when they are written.
+    '''
+    __slots__ = ('xi', 'xi_none', 'li', 'offsets', 'separator', 'symbols')
+
+    def __init__(self, xi, xi_none, li, offsets, separator, symbols):
+        self.xi = np.asarray(xi, dtype=np.int32)
+        self.xi_none = np.asarray(xi_none, dtype=bool)
+        self.li = np.asarray(li, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.separator = separator
+        self.symbols = symbols
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def label_strings(self):
+        '''
+        Returns the labels of the batch as they are written (i.e. as str(D_Label))
+        '''
+        symbols = self.symbols.symbols
+        sep = self.separator
+        xi_strs = list(map(str, self.xi.tolist()))
+        if self.xi_none.any():
+            for i in np.flatnonzero(self.xi_none).tolist():
+                xi_strs[i] = D_NONE_LABEL
+        return [xi + sep + symbols[li] for xi, li in zip(xi_strs, self.li.tolist())]
+
+    def get_labels(self, i):
+        '''
+        Returns the labels of the sentence i as D_Label objects
+        '''
+        start, end = self.offsets[i], self.offsets[i+1]
+        symbols = self.symbols
+        return [D_Label(D_NONE_LABEL if none else xi, symbols[li], self.separator) for xi, none, li in
+                zip(self.xi[start:end].tolist(), self.xi_none[start:end].tolist(), self.li[start:end].tolist())]
+
+    @staticmethod
+    def from_strings(labels, offsets, separator, symbols=None):
+        '''
+        Builds the batch from label strings shaped as xi + separator + li,
+        interning the relations in symbols (a new table if not given)
+        '''
+        symbols = symbols if symbols is not None else SymbolTable()
+        fields = [label.split(separator) for label in labels]
+        xi_none = [x == D_NONE_LABEL for x, _ in fields]
+        xi = [0 if none else int(x) for (x, _), none in zip(fields, xi_none)]
+        li = symbols.intern_all([l for _, l in fields])
+        return D_LabelBatch(xi, xi_none, li, offsets, separator, symbols)
+
+    def to_string(self, tree_batch, add_bos_eos=True, separate_columns=False, n_label_cols=1):
+        '''
+        Writes the linearized trees of the batch as LinearizedTree.to_string
+        does (without additional features), each one followed by a blank line
+        '''
+        sep = self.separator
+        labels = self.label_strings()
+        postags = [tree_batch.symbols[u] for u in tree_batch.upos.tolist()]
+        if separate_columns:
+            rows = []
+            for form, postag, label in zip(tree_batch.forms, postags, labels):
+                label_split = label.split(sep)
+                if len(label_split) < n_label_cols:
+                    label_split += [C_NONE_LABEL] * (n_label_cols - len(label_split))
+                rows.append("\t".join([form, postag] + label_split)+"\n")
+        else:
+            rows = [form+"\t"+postag+"\t"+label+"\n" for form, postag, label in zip(tree_batch.forms, postags, labels)]
+
+        bos_row = "\t".join([BOS]*(3 if not separate_columns else 2+n_label_cols))+"\n"
+        eos_row = "\t".join([EOS, EOS] + ([EOS] if not separate_columns else [BOS]*n_label_cols))+"\n"
+        lines = []
+        offsets = self.offsets.tolist()
+        for i in range(len(self)):
+            if add_bos_eos:
+                lines.append(bos_row)
+            lines.extend(rows[offsets[i]:offsets[i+1]])
+            if add_bos_eos:
+                lines.append(eos_row)
+            lines.append("\n")
+        return "".join(lines)
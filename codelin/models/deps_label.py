@@ -1,4 +1,7 @@
 class D_Label:
+    # one label per token: slots instead of a __dict__ save memory
+    __slots__ = ('separator', 'xi', 'li')
+
     def __init__(self, xi, li, sp):
         self.separator = sp
 
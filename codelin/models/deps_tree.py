@@ -1,9 +1,12 @@
-from codelin.utils.constants import D_ROOT_HEAD, D_NULLHEAD, D_ROOT_REL, D_POSROOT, D_EMPTYREL, D_2P_GREED, D_2P_PROP
+from codelin.utils.constants import D_ROOT_HEAD, D_NULLHEAD, D_ROOT_REL, D_POSROOT, D_EMPTYREL, D_NONE_LABEL, D_2P_GREED, D_2P_PROP
 from codelin.models.const_tree import C_Tree
-import copy
+from codelin.utils.conllu import ConlluWriter
 
 
 class D_Node:
+    # one node per token: slots instead of a __dict__ save memory on large treebanks
+    __slots__ = ('id', 'form', 'lemma', 'upos', 'xpos', '_feats', '_feats_parsed', 'head', 'relation', 'deps', 'misc')
+
     def __init__(self, wid, form, lemma=None, upos=None, xpos=None, feats=None, head=None, deprel=None, deps=None, misc=None):
         # word id
         self.id = int(wid)                      
@@ -16,8 +19,9 @@ class D_Node:
         self.upos = upos if upos else "_"       
         # language_specific postag
         self.xpos = xpos if xpos else "_"       
-        # morphological features
-        self.feats = self.parse_feats(feats) if feats else "_"    
+        # morphological features (kept as read, parsed on first access)
+        self._feats = feats
+        self._feats_parsed = False
         
         # head of the current word
         head = 0 if head is None else head
@@ -30,6 +34,18 @@ class D_Node:
         # miscelaneous data
         self.misc = misc if misc else "_"
     
+    @property
+    def feats(self):
+        if not self._feats_parsed:
+            self._feats = self.parse_feats(self._feats) if self._feats else "_"
+            self._feats_parsed = True
+        return self._feats
+    
+    @feats.setter
+    def feats(self, feats):
+        self._feats = feats
+        self._feats_parsed = True
+
     def is_left_arc(self):
         return self.head > self.id
 
@@ -43,7 +59,10 @@ class D_Node:
             return [x for x in feats.split('|')]
         
     def feats_to_str(self):
-        if type(self.feats) is str:
+        if not self._feats_parsed:
+            # no need to parse the features just to write them back
+            return self._feats if self._feats else "_"
+        elif type(self.feats) is str:
             return self.feats
         elif self.feats == [None] or self.feats is None:
             return "_"
@@ -67,17 +86,29 @@ class D_Node:
 
         return head_inside^id_inside
     
+    def get_fields(self):
+        '''
+        Returns the ten conllu columns of the node
+        '''
+        return (self.id, self.form, self.lemma, self.upos, self.xpos, self.feats_to_str(), 
+                self.head, self.relation, self.deps, self.misc)
+
     def __repr__(self):
-        node_fields = copy.deepcopy(self.__dict__)
-        node_fields['feats'] = self.feats_to_str()
-        return '\t'.join(str(e) for e in list(node_fields.values()))+'\n'
+        return '\t'.join(str(e) for e in self.get_fields())+'\n'
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__    
+        return self.get_fields() == other.get_fields()
 
     @staticmethod
     def from_string(conll_str):
-        wid,form,lemma,upos,xpos,feats,head,deprel,deps,misc = conll_str.split('\t')
+        return D_Node.from_columns(conll_str.split('\t'))
+
+    @staticmethod
+    def from_columns(columns):
+        '''
+        Creates a node from the already split columns of a conllu line
+        '''
+        wid,form,lemma,upos,xpos,feats,head,deprel,deps,misc = columns
         return D_Node(int(wid), form, lemma, upos, xpos, feats, int(head), deprel, deps, misc)
 
     @staticmethod
@@ -88,9 +119,80 @@ class D_Node:
     def empty_node():
         return D_Node(0, None, None, None, None, None, 0, None, None, None)
 
+class _MinSegmentTree:
+    '''
+    Point update / range minimum query over the positions 0..size-1
+    '''
+    def __init__(self, size, default):
+        self.size = size
+        self.tree = [default]*(2*size)
+    
+    def get(self, position):
+        return self.tree[position + self.size]
+
+    def update(self, position, value):
+        # keep the minimum value seen at the position
+        position += self.size
+        while position >= 1 and value < self.tree[position]:
+            self.tree[position] = value
+            position //= 2
+    
+    def query(self, lo, hi, default):
+        # minimum over the positions [lo, hi)
+        result = default
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                result = min(result, self.tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = min(result, self.tree[hi])
+            lo //= 2
+            hi //= 2
+        return result
+
+class _PlaneIndex:
+    '''
+    Index of the arcs placed in a plane by their endpoints, to check in
+    O(log n) if a new arc crosses any of them according to D_Node.check_cross:
+    an arc (x, y) crosses a placed arc (l, r) when exactly one of its ends is 
+    strictly inside (l, r) and the other strictly outside, or when the head y 
+    is strictly inside and the dependant x is an end of the placed arc.
+    '''
+    def __init__(self, size):
+        self.size = size
+        # -r of the longest arc starting at l, and l of the longest arc ending at r
+        self.neg_right_by_left = _MinSegmentTree(size, 0)
+        self.left_by_right = _MinSegmentTree(size, size)
+    
+    def add(self, wid, head):
+        left, right = min(wid, head), max(wid, head)
+        self.neg_right_by_left.update(left, -right)
+        self.left_by_right.update(right, left)
+
+    def crosses(self, wid, head):
+        if wid == head:
+            return False
+        left, right = min(wid, head), max(wid, head)
+        
+        # arcs starting inside and ending after the arc
+        if -self.neg_right_by_left.query(left+1, right, 0) > right:
+            return True
+        # arcs ending inside and starting before the arc
+        if self.left_by_right.query(left+1, right, self.size) < left:
+            return True
+        # arcs with an end on the dependant enclosing the head
+        if head > wid:
+            return -self.neg_right_by_left.get(wid) > head
+        else:
+            return self.left_by_right.get(wid) < head
+
 class D_Tree:
     def __init__(self, nodes: list):
         self.nodes = nodes
+        self._dependants_index = None
 
 # getters    
     def get_node(self, id):
@@ -175,54 +277,111 @@ class D_Tree:
         one with the dependants to the left of the head
         and one to the right
         '''
-        dependants =  list(filter((lambda x :x.head == head and x.id!=head), self.nodes))
-        dependants_left = list(filter((lambda x :x.id < head), dependants))
-        dependants_right = list(filter((lambda x :x.id > head), dependants))
-        return dependants_left, dependants_right
+        left, right, _ = self.get_dependants_index().get(head, ([], [], None))
+        return list(left), list(right)
+
+    def get_dependants_index(self):
+        '''
+        Returns a dictionary head -> (left dependants, right dependants, 
+        (leftmost id, rightmost id)) built lazily in one pass over the nodes.
+        Dependants keep the order of the nodes (i.e. sorted by id) and the 
+        leftmost/rightmost ids include the nodes headed by themselves.
+
+        The index is rebuilt if the list of nodes is replaced or changes its 
+        length, and cleared by the methods of the tree that modify heads. Code 
+        that modifies the heads or ids of the nodes directly must call 
+        invalidate_index().
+        '''
+        cached = getattr(self, '_dependants_index', None)
+        if cached is not None and cached[0] is self.nodes and cached[1] == len(self.nodes):
+            return cached[2]
+
+        index = {}
+        for node in self.nodes:
+            head = node.head
+            entry = index.get(head)
+            if entry is None:
+                entry = index[head] = ([], [], [node.id, node.id])
+            
+            extremes = entry[2]
+            if node.id < extremes[0]:
+                extremes[0] = node.id
+            if node.id > extremes[1]:
+                extremes[1] = node.id
+            
+            if node.id < head:
+                entry[0].append(node)
+            elif node.id > head:
+                entry[1].append(node)
+
+        self._dependants_index = (self.nodes, len(self.nodes), index)
+        return index
+
+    def invalidate_index(self):
+        '''
+        Discards the head -> dependants index after the
+        heads or ids of the nodes have been modified
+        '''
+        self._dependants_index = None
 
 # update functions
+    def find_node(self, node_id):
+        '''
+        Returns the node with the given id. Nodes are kept sorted by id, so the
+        node is looked up first at its expected position (with and without 
+        dummy root) and only searched linearly if the ids have gaps
+        '''
+        nodes = self.nodes
+        for position in (node_id, node_id-1):
+            if 0 <= position < len(nodes) and nodes[position].id == node_id:
+                return nodes[position]
+        
+        for node in nodes:
+            if node.id == node_id:
+                return node
+        return None
+
     def append_node(self, node):
         '''
         Append a node to the tree and sorts the nodes by id
         '''
-        self.nodes.append(node)
-        self.nodes.sort(key=lambda x: x.id)
+        nodes = self.nodes
+        nodes.append(node)
+        if len(nodes) > 1 and nodes[-2].id > node.id:
+            nodes.sort(key=lambda x: x.id)
 
     def update_head(self, node_id, head_value):
         '''
         Update the head of a node indicated by its id
         '''
-        for node in self.nodes:
-            if node.id == node_id:
-                node.head = head_value
-                break
+        node = self.find_node(node_id)
+        if node is not None:
+            node.head = head_value
+            self.invalidate_index()
     
     def update_relation(self, node_id, relation_value):
         '''
         Update the relation of a node indicated by its id
         '''
-        for node in self.nodes:
-            if node.id == node_id:
-                node.relation = relation_value
-                break
+        node = self.find_node(node_id)
+        if node is not None:
+            node.relation = relation_value
     
     def update_word(self, node_id, word):
         '''
         Update the word of a node indicated by its id
         '''
-        for node in self.nodes:
-            if node.id == node_id:
-                node.form = word
-                break
+        node = self.find_node(node_id)
+        if node is not None:
+            node.form = word
 
     def update_upos(self, node_id, postag):
         '''
         Update the upos field of a node indicated by its id
         '''
-        for node in self.nodes:
-            if node.id == node_id:
-                node.upos = postag
-                break
+        node = self.find_node(node_id)
+        if node is not None:
+            node.upos = postag
 
     def get_next_edge(self, idx_l, idx_r):
         next_arc = None
@@ -241,37 +400,95 @@ class D_Tree:
         Returns true if the given node is the 
         leftmost dependant of its head
         '''
-        head = node.head
-        head_dependants = [x.id for x in self.nodes if x.head == head]
-        head_dependants.sort()
-        return head_dependants[0] == node.id
+        return self.get_dependants_index()[node.head][2][0] == node.id
     
     def is_rightmost(self, node):
         ''' 
         Returns true if the given node is the 
         rightmost dependant of its head
         '''
-        head = node.head
-        head_dependants = [x.id for x in self.nodes if x.head == head]
-        head_dependants.sort()
-        return head_dependants[-1] == node.id
+        return self.get_dependants_index()[node.head][2][1] == node.id
         
+    def get_arc_spans(self, filter_root=True):
+        '''
+        Returns the arcs of the tree as (left, right) position
+        spans, optionally ignoring the arcs from the root
+        '''
+        spans = []
+        for node in self.nodes:
+            if filter_root and node.head == 0:
+                continue
+            spans.append((node.id, node.head) if node.id < node.head else (node.head, node.id))
+        return spans
+
     def is_projective(self, filter_root=True):
         '''
         Returns a boolean indicating if the dependency tree
         is projective (i.e. no edges are crossing). The main difference
         between projective trees and planar trees is that in projective
         trees the ROOT node is ignored.
+
+        Arcs are sorted by left end (longest first) and swept with
+        a stack of open arcs, which must be nested: O(n log n).
         '''
-        arcs = self.get_arcs()
-        # remove arc with head 0
-        if filter_root:
-            arcs = list(filter((lambda x :x[1]!=0), arcs))
-        for (i,j) in arcs:
-            for (k,l) in arcs:
-                if (i,j) != (k,l) and min(i,j) < min(k,l) < max(i,j) < max(k,l):
-                    return False
+        spans = self.get_arc_spans(filter_root)
+        spans.sort(key=lambda x: (x[0], -x[1]))
+        
+        stack = []
+        for left, right in spans:
+            # close the arcs that end before this one starts
+            while stack and stack[-1] <= left:
+                stack.pop()
+            # the innermost open arc ends inside this one
+            if stack and stack[-1] < right:
+                return False
+            stack.append(right)
         return True
+
+    def count_crossing_arcs(self, filter_root=True):
+        '''
+        Returns the number of pairs of crossing arcs in the tree. Arcs are
+        visited by left end while a Fenwick tree counts the right ends of the
+        previously started arcs that fall strictly inside the current arc:
+        O(n log n).
+        '''
+        spans = self.get_arc_spans(filter_root)
+        if len(spans) < 2:
+            return 0
+        spans.sort()
+        
+        size = max(right for left, right in spans) + 2
+        fenwick = [0]*(size+1)
+        
+        def add(position):
+            position += 1
+            while position <= size:
+                fenwick[position] += 1
+                position += position & -position
+
+        def prefix(position):
+            # number of right ends <= position
+            position += 1
+            total = 0
+            while position > 0:
+                total += fenwick[position]
+                position -= position & -position
+            return total
+
+        crossings = 0
+        i = 0
+        while i < len(spans):
+            # arcs starting at the same position can not cross each other
+            j = i
+            while j < len(spans) and spans[j][0] == spans[i][0]:
+                left, right = spans[j]
+                if right - left > 1:
+                    crossings += prefix(right-1) - prefix(left)
+                j += 1
+            for k in range(i, j):
+                add(spans[k][1])
+            i = j
+        return crossings
     
     def shallow_equals(self, other):
         '''
@@ -308,25 +525,48 @@ class D_Tree:
     def postprocess_tree(self, search_root_strat=D_ROOT_HEAD, allow_multi_roots=False):
         '''
         Postprocess the tree by finding the root according to the selected 
-        strategy and fixing cycles and out of bounds heads
-        '''
+        strategy and fixing cycles and out of bounds heads in O(n). Returns 
+        a dictionary with the number of heads changed by each heuristic
+        (empty if the tree was already well formed).
+        '''
+        nodes = self.nodes
+        heads = [node.head for node in nodes]
+        # heuristic that first modified the head of each node
+        fired = [None]*len(nodes)
+        def mark(positions, heuristic):
+            for position in positions:
+                if fired[position] is None:
+                    fired[position] = heuristic
+
         # 1) Find the root
         root = self.root_search(search_root_strat)
+        mark([root-1], "root")
         
         # 2) Fix oob heads
-        self.fix_oob_heads()
+        mark(self.fix_oob_heads(), "oob_heads")
         
         # 3) Fix cycles
-        self.fix_cycles(root)
+        mark(self.fix_cycles(root), "cycles")
         
         # 4) Set all null heads to root and remove other root candidates
-        for node in self.nodes:
+        for position, node in enumerate(nodes):
             if node.id == root:
                 continue
             if node.head == D_NULLHEAD:
                 node.head = root
+                mark([position], "null_heads")
             if not allow_multi_roots and node.head == 0:
                 node.head = root
+                mark([position], "multi_roots")
+
+        self.invalidate_index()
+        
+        # report only the heads that actually changed
+        heuristics = {}
+        for position, node in enumerate(nodes):
+            if node.head != heads[position]:
+                heuristics[fired[position]] = heuristics.get(fired[position], 0) + 1
+        return heuristics
 
     def root_search(self, search_root_strat):
         '''
@@ -340,42 +580,68 @@ class D_Tree:
                     break
             
             elif search_root_strat == D_ROOT_REL:
-                if node.rel == 'root' or node.rel == 'ROOT':
+                if node.relation == 'root' or node.relation == 'ROOT':
                     root = node.id
                     break
 
         # Enforce root
         self.nodes[root-1].head = 0
+        self.invalidate_index()
 
         return root
 
     def fix_oob_heads(self):
         '''
         Fixes heads of the tree (if they dont exist, if they are out of bounds, etc)
-        If a head is out of bounds set it to nullhead
+        If a head is out of bounds set it to nullhead. Returns the positions of
+        the fixed nodes.
         '''
-        for node in self.nodes:
+        fixed = []
+        n_nodes = len(self.nodes)
+        for position, node in enumerate(self.nodes):
             if node.head==D_NULLHEAD:
                 continue
-            if int(node.head) < 0:
-                node.head = D_NULLHEAD
-            elif int(node.head) > len(self.nodes):
+            head = int(node.head)
+            if head < 0 or head > n_nodes:
                 node.head = D_NULLHEAD
+                fixed.append(position)
+        self.invalidate_index()
+        return fixed
     
     def fix_cycles(self, root):
         '''
-        Breaks cycles in the tree by setting the head of the node to root_id
+        Breaks cycles in the tree by setting the head of the node to nullhead. 
+        Head chains are followed from each node in order marking the nodes as 
+        in the current chain (gray) or known to reach the root or a nullhead 
+        (black); reaching a gray node closes a cycle, which is broken there. 
+        Each node is walked once: O(n). Returns the positions of the cut nodes.
         '''
-        for node in self.nodes:
-            visited = []
+        nodes = self.nodes
+        n_nodes = len(nodes)
+        WHITE, GRAY, BLACK = 0, 1, 2
+        color = [WHITE]*n_nodes
+        
+        cut = []
+        for start in range(n_nodes):
+            path = []
+            position = start
+            while color[position] == WHITE:
+                node = nodes[position]
+                if node.id == root or node.head == D_NULLHEAD:
+                    break
+                color[position] = GRAY
+                path.append(position)
+                position = min(max(node.head-1, 0), n_nodes-1)
             
-            while (node.id != root) and (node.head !=D_NULLHEAD):
-                if node in visited:
-                    node.head = D_NULLHEAD
-                else:
-                    visited.append(node)
-                    next_node = min(max(node.head-1, 0), len(self.nodes)-1)
-                    node = self.nodes[next_node]
+            if color[position] == GRAY:
+                # the chain came back to itself
+                nodes[position].head = D_NULLHEAD
+                cut.append(position)
+            
+            for position in path:
+                color[position] = BLACK
+        self.invalidate_index()
+        return cut
         
 # python related functions
     def __repr__(self):
@@ -442,12 +708,7 @@ class D_Tree:
         ''' 
         Creates an empty dependency tree with l nodes
         '''
-        t = D_Tree([])
-        for i in range(l):
-            n = D_Node.empty_node()
-            n.id = i
-            t.append_node(n)
-        return t
+        return D_Tree([D_Node(i, None, None, None, None, None, 0, None, None, None) for i in range(l)])
 
 # reader and writter
     @staticmethod
@@ -455,23 +716,19 @@ class D_Tree:
         '''
         Create a ConllTree from a dependency tree conll-u string.
         '''
-        data = conll_str.split('\n')
-        dependency_tree_start_index = 0
-        for line in data:
-            if len(line)>0 and line[0]!="#":
-                break
-            dependency_tree_start_index+=1
-        data = data[dependency_tree_start_index:]
         nodes = []
         if dummy_root:
             nodes.append(D_Node.dummy_root())
         
-        for line in data:
+        for line in conll_str.split('\n'):
+            # split each line only once
+            columns = line.split('\t')
+
             # check if not valid line (empty or not enough fields)
-            if (len(line)<=1) or len(line.split('\t'))<10:
+            if len(columns)<10:
                 continue 
             
-            wid = line.split('\t')[0]
+            wid = columns[0]
 
             # check if node is a comment (comments are marked with #)
             if "#" in wid:
@@ -485,8 +742,7 @@ class D_Tree:
             if clean_omisions and "." in wid:
                 continue
 
-            conll_node = D_Node.from_string(line)
-            nodes.append(conll_node)
+            nodes.append(D_Node.from_columns(columns))
         
         return D_Tree(nodes)
     
@@ -495,20 +751,40 @@ class D_Tree:
         '''
         Read a conllu file and return a list of ConllTree objects.
         '''
+        return list(D_Tree.iter_conllu_file(file_path, filter_projective, remove_root, filter_root_projective))
+
+    @staticmethod
+    def iter_conllu_file(file_path, filter_projective = False, remove_root = False, filter_root_projective=True):
+        '''
+        Read a conllu file yielding one ConllTree at a time. Only the
+        sentence block being parsed is kept in memory.
+        '''
         with open(file_path, 'r', encoding="utf-8") as f:
-            data = f.read()
-        data = data.split('\n\n')
-        # remove last empty line
-        data = data[:-1]
-        
-        trees = []
-        for x in data:
-            t = D_Tree.from_string(x)
-            if not filter_projective or t.is_projective(filter_root_projective):
-                if remove_root:
-                    t.remove_dummy()
-                trees.append(t)
-        return trees    
+            for x in D_Tree.iter_conllu_blocks(f):
+                t = D_Tree.from_string(x)
+                if not filter_projective or t.is_projective(filter_root_projective):
+                    if remove_root:
+                        t.remove_dummy()
+                    yield t
+
+    @staticmethod
+    def iter_conllu_blocks(file_io):
+        '''
+        Yields the raw sentence blocks (separated by blank lines) 
+        of an already open conllu file.
+        '''
+        block = []
+        for line in file_io:
+            line = line.rstrip("\r\n")
+            if line != "":
+                block.append(line)
+            elif len(block) > 0:
+                yield "\n".join(block)
+                block = []
+        
+        # last sentence without trailing blank line
+        if len(block) > 0:
+            yield "\n".join(block)
 
     @staticmethod
     def write_conllu_file(file_path, trees, write_sentence=False):
@@ -516,10 +792,8 @@ class D_Tree:
         Write a list of ConllTree objects to a conllu file.
         '''
         with open(file_path, 'w') as f:
-            for t in trees:
-                if write_sentence:
-                    f.write("# text = "+t.get_sentence()+"\n")
-                f.write("".join(str(e) for e in t)+"\n")
+            with ConlluWriter(f) as writer:
+                writer.write_trees(trees, write_sentence)
 
     @staticmethod
     def write_conllu(file_io, tree):
@@ -527,8 +801,8 @@ class D_Tree:
         Write a single ConllTree to a already open file.
         Includes the # text = ... line
         '''
-        file_io.write("# text = "+tree.get_sentence()+"\n")
-        file_io.write("".join(str(e) for e in tree)+"\n")
+        with ConlluWriter(file_io) as writer:
+            writer.write_tree(tree)
 
     @staticmethod
     def short_print(tree):
@@ -544,78 +818,85 @@ class D_Tree:
         Separates the node of a given dependency tree into two
         non-crossing planes using the propagation algorithm.
         '''
+        nodes = dep_tree.nodes
+        # nodes are compared by value, as the list membership checks did
+        keys = [node.get_fields() for node in nodes]
+        positions = {id(node): k for k, node in enumerate(nodes)}
         
-        def propagate(nodes, fp1, fp2, current_edge, i):
-            # add the current edge to the forbidden plane opposite to the plane
-            # where the node has already been added
-            fpi  = None
-            fp3mi= None
-            if i == 1:
-                fpi  = fp1
-                fp3mi= fp2
-            if i == 2:
-                fpi  = fp2
-                fp3mi= fp1
-            fpi.append(current_edge)
+        # crossing graph: crossed[u] holds the nodes whose arc crosses 
+        # the arc of node u (check_cross is not symmetric)
+        crossed = [[v for v, other in enumerate(nodes) if other.check_cross(node)] for node in nodes]
+        
+        # forbidden planes
+        forbidden = {1: set(), 2: set()}
+        def propagate(u, i):
+            # add the edge to the forbidden plane i and all the edges that 
+            # cross it to the opposite one, until no more edges are affected
+            forbidden[i].add(keys[u])
+            stack = [(u, i)]
+            while stack:
+                u, i = stack.pop()
+                for v in crossed[u]:
+                    if keys[v] not in forbidden[3-i]:
+                        forbidden[3-i].add(keys[v])
+                        stack.append((v, 3-i))
+
+        p1, p2 = [], []
+        for next_arc in dep_tree.get_arcs_by_position():
+            u = positions[id(next_arc)]
+            # check restrictions
+            if keys[u] not in forbidden[1]:
+                p1.append(next_arc)
+                propagate(u, 2)
             
-            # add all nodes from the dependency graph that crosses the current edge
-            # to the corresponding forbidden plane
-            for node in nodes:
-                if node.check_cross(current_edge):
-                    if node not in fp3mi:
-                        # y si es for nodes in that plane?
-                        (fp1, fp2) = propagate(nodes, fp1, fp2, node, 3-i)
-            return fp1, fp2
-        
-        p1, p2, fp1, fp2 = [], [], [], []
-        for i in range(0, (len(dep_tree))):
-            for j in range(i, -1, -1):
-                # if the node in position 'i' has an arc with head 'j' 
-                # or node in position 'j' has an arc with head 'i'
-                next_arc = dep_tree.get_next_edge(i, j)
-                if next_arc is None:
-                    continue
-                # check restrictions
-                if next_arc not in fp1:
-                    p1.append(next_arc)
-                    fp1, fp2 = propagate(dep_tree, fp1, fp2, next_arc, 2)
-                
-                elif next_arc not in fp2:
-                    p2.append(next_arc)
-                    fp1, fp2 = propagate(dep_tree, fp1, fp2, next_arc, 1)        
+            elif keys[u] not in forbidden[2]:
+                p2.append(next_arc)
+                propagate(u, 1)
         return D_Tree(p1),D_Tree(p2)
     
+    def get_arcs_by_position(self):
+        '''
+        Returns the nodes in the order in which the two planar algorithms 
+        visit them by pairs of positions (i, j) with j <= i; that is, sorted by
+        right position and then by decreasing left position. Only nodes 
+        whose head is a valid position are returned (see get_next_edge).
+        '''
+        n = len(self.nodes)
+        arcs = {}
+        # arcs where the node at position i has head j
+        for i, node in enumerate(self.nodes):
+            if type(node.head) is int and 0 <= node.head <= i:
+                arcs[(i, node.head)] = node
+        
+        # arcs where the node at position j has head i, unless 
+        # the node at position i already has head j
+        for j, node in enumerate(self.nodes):
+            if type(node.head) is int and j < node.head < n and (node.head, j) not in arcs:
+                arcs[(node.head, j)] = node
+
+        return [arcs[pair] for pair in sorted(arcs, key=lambda x: (x[0], -x[1]))]
+
     @staticmethod
     def two_planar_greedy(dep_tree):
         '''
         Separates the node of a given dependency tree into two
-        non-crossing planes using the greedy algorithm.
+        non-crossing planes using the greedy algorithm. Each arc goes 
+        to the first plane where it does not cross (as in check_cross) any 
+        of the arcs already placed there.
         '''
-
-        p1, p2 = [], []
-        for i in range(len(dep_tree)):
-            for j in range(i, -1, -1):
-                # if the node in position 'i' has an arc to 'j' 
-                # or node in position 'j' has an arc to 'i'
-                next_arc = dep_tree.get_next_edge(i, j)
-                if next_arc is None:
-                    continue
-
-                else:
-                    cross_plane_1 = False
-                    cross_plane_2 = False
-                    for node in p1:
-                        cross_plane_1 = cross_plane_1 or next_arc.check_cross(node)
-                    for node in p2:
-                        cross_plane_2 = cross_plane_2 or next_arc.check_cross(node)
-                    
-                    if not cross_plane_1:
-                        p1.append(next_arc)
-                    elif not cross_plane_2:
-                        p2.append(next_arc)
+        arcs = dep_tree.get_arcs_by_position()
+        size = max([max(arc.id, arc.head) for arc in arcs], default=0) + 1
+        planes = ([], _PlaneIndex(size)), ([], _PlaneIndex(size))
+        
+        for next_arc in arcs:
+            for plane, index in planes:
+                if not index.crosses(next_arc.id, next_arc.head):
+                    plane.append(next_arc)
+                    index.add(next_arc.id, next_arc.head)
+                    break
 
         # processs them separately
-        return D_Tree(p1), D_Tree(p2)
+        return D_Tree(planes[0][0]), D_Tree(planes[1][0])
 
     @staticmethod
     def to_latex(tree, include_col=False, planar_separate = False, planar_alg = D_2P_GREED, planar_colors = ["black", "blue"], additional_labels = None):
@@ -696,7 +977,7 @@ class D_Tree:
         return latex
     
     @staticmethod
-    def to_bht(tree, include_reltype=False):
+    def to_bht(tree, include_reltype=False, word_ids=None):
         '''
         Converts a dependency tree into a binary head tree.
         We will consider a bht as a constituent tree.
@@ -705,143 +986,116 @@ class D_Tree:
         the internal nodes are labeled with an 'L' or 'R' depending
         of the position of the head in the dependency tree
 
-        The tree is built using a stack and push/make_node operations.
-        We start from the root and performa a DFS traversal.
+        The tree is built bottom-up in a DFS traversal from the root
+        that keeps an explicit stack, so deep trees do not hit the
+        recursion limit. If a list is given as word_ids, the ids of the
+        words are appended to it in the order of the terminals of the
+        bht (which is the order of the sentence if the tree is projective).
         '''
-        def to_bht_rec(node):
-            stack.append(node)
-            ld, rd = tree.get_dependants(node.id)
-            for dep in reversed(ld):
-                to_bht_rec(dep)
-                left  = stack.pop()
-                right = stack.pop()
-                
-                if type(left) is not C_Tree:
-                    if include_reltype:
-                        left = C_Tree(label=str(left.relation), 
-                                      children=[C_Tree(label=str(left.upos), 
-                                                       children=[C_Tree(str(left.form))])])
-                    else:
-                        left = C_Tree(label=str(left.upos), children=[C_Tree(str(left.form))])
-                
-                if type(right) is not C_Tree:
-                    if include_reltype:
-                        right = C_Tree(label=str(right.relation), 
-                                      children=[C_Tree(label=str(right.upos), 
-                                                       children=[C_Tree(str(right.form))])])
-                    else:
-                        right = C_Tree(label=str(right.upos), children=[C_Tree(str(right.form))])
-                
-                new_node = C_Tree.make_node('R', left, right)
-                stack.append(new_node)
-            
-            for dep in rd:
-                to_bht_rec(dep)
-                left = stack.pop()
-                right = stack.pop()
-                
-                if type(left) is not C_Tree:
-                    if include_reltype:
-                        left = C_Tree(label=str(left.relation), 
-                                      children=[C_Tree(label=str(left.upos), 
-                                                       children=[C_Tree(str(left.form))])])
-                    else:
-                        left = C_Tree(label=str(left.upos), children=[C_Tree(str(left.form))])
-                if type(right) is not C_Tree:
-                    if include_reltype:
-                        right = C_Tree(label=str(right.relation), 
-                                      children=[C_Tree(label=str(right.upos), 
-                                                       children=[C_Tree(str(right.form))])])
-                    else:
-                        right = C_Tree(label=str(right.upos), children=[C_Tree(str(right.form))])
+        def make_leaf(node):
+            leaf = C_Tree(label=str(node.upos), children=[C_Tree(str(node.form))])
+            if include_reltype:
+                leaf = C_Tree(label=str(node.relation), children=[leaf])
+            return leaf
 
-                new_node = C_Tree.make_node('L', right, left)
-                stack.append(new_node)
+        def expand(node):
+            # closest left dependants attach first, then the right ones
+            ld, rd, _ = dependants_index.get(node.id, ([], [], None))
+            return [make_leaf(node), [('R', dep) for dep in reversed(ld)] + [('L', dep) for dep in rd], 0]
 
-        tree_root = tree[0]
-        stack = []
-        to_bht_rec(tree_root)
-        return stack.pop()
+        dependants_index = tree.get_dependants_index()
+        
+        if word_ids is not None:
+            pending = [(tree[0], False)]
+            while pending:
+                node, visited = pending.pop()
+                if visited:
+                    word_ids.append(node.id)
+                    continue
+                ld, rd, _ = dependants_index.get(node.id, ([], [], None))
+                pending.extend((dep, False) for dep in reversed(rd))
+                pending.append((node, True))
+                pending.extend((dep, False) for dep in reversed(ld))
+
+        # frames are [subtree built so far, dependants, next dependant]
+        stack = [expand(tree[0])]
+        while True:
+            frame = stack[-1]
+            if frame[2] < len(frame[1]):
+                stack.append(expand(frame[1][frame[2]][1]))
+                continue
+            
+            stack.pop()
+            if not stack:
+                return frame[0]
+            
+            head = stack[-1]
+            if head[1][head[2]][0] == 'R':
+                # R => head to the right and dependant to the left
+                head[0] = C_Tree.make_node('R', frame[0], head[0])
+            else:
+                # L => head to the left and dependant to the right
+                head[0] = C_Tree.make_node('L', head[0], frame[0])
+            head[2] += 1
 
     @staticmethod
     def from_bht(bht):
         '''
         Converts a constituent tree shaped as a binary head tree back into
-        a dependency tree.
-        '''
-        def from_bht_rec(node, recursion_depth=0):
-            
+        a dependency tree in O(n). The terminals of the bht are taken as the
+        words of the sentence in order: if the first one is the dummy root
+        it is kept as the node 0, otherwise the words are numbered from 1.
+        Empty terminals left by the decoding are skipped and the words whose
+        head is not found hang from the root.
+        '''
+        words = []
+        heads = []
+
+        # postorder traversal; values holds the word index of the head of
+        # each subtree already visited (None for the empty ones)
+        values = []
+        stack = [(bht, False)]
+        while stack:
+            node, visited = stack.pop()
             if node.is_terminal():
-                return node
-            
-            if node.is_preterminal():
-                return node.children[0]
-            
-            if node.children[0].is_preterminal():
-                return node.children[0].children[0]
+                if node.label == D_NONE_LABEL:
+                    values.append(None)
+                else:
+                    values.append(len(words))
+                    words.append(node)
+                    heads.append(None)
+                continue
             
-            left  = from_bht_rec(node.children[0], recursion_depth+1)
-            if len(node.children) >= 2:
-                right = from_bht_rec(node.children[1], recursion_depth+1)
-            else:
-                right = D_Node.empty_node()
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
             
-            if node.label == 'L':
+            n_children = len(node.children)
+            children_heads = values[-n_children:]
+            del values[-n_children:]
+            if n_children == 2 and None not in children_heads:
                 # L => head to the left and dependant to the right
-                node_head      = word_idxs[left]   if type(left) is C_Tree else int(left.head)
-                node_dependant = word_idxs[right]  if type(right) is C_Tree else int(right.head)
-                node_deprel    = word_deprels[node_dependant]
-                node_postag    = word_postags[node_dependant]
-                node_form = right.label if type(right) is C_Tree else str(idx_words[node_dependant])                
-                n = D_Node(wid=node_dependant, upos=node_postag, form=node_form, head=node_head, deprel=node_deprel)
-                nodes.append(n)
+                head, dependant = children_heads if node.label == 'L' else children_heads[::-1]
+                heads[dependant] = head
+                values.append(head)
             else:
-                # R => head to the right and dependant to the left
-                node_head      = word_idxs[right] if type(right) is C_Tree else int(right.head)
-                node_dependant = word_idxs[left]  if type(left) is C_Tree else int(left.head)
-                node_deprel    = word_deprels[node_dependant]
-                node_postag    = word_postags[node_dependant]
-                node_form = left.label if type(left) is C_Tree else str(idx_words[node_dependant])
-                n = D_Node(wid=node_dependant, upos=node_postag, form=node_form, head=node_head, deprel=node_deprel)
-                nodes.append(n)
-                
-            return n        
-        nodes=[]
-
-        # build a dictionary of the info stored in the unary chains
-        word_idxs = {}
-        word_dict = {}
-        word_deprels = {}
-        word_postags = {}
-        i = 0
-        for word in bht.get_terminals():
-            word_idxs[word] = i
-            word_dict[i] = word
-            word_postags[i] = word.parent.label if word.parent is not None else "-NONE-"
-            word_deprels[i] = word.parent.parent.label if (word.parent is not None and word.parent.parent is not None) else "-NONE-"
-            i+=1
-        idx_words = {value: key for key, value in word_idxs.items()}
-        from_bht_rec(bht)
-        nodes = sorted(nodes, key=lambda x: x.id)
-        
-        # fix brackets
-        for node in nodes:
-            if node.form == '-RBR-':
-                node.form = ')'
-            if node.form == '-LRB-':
-                node.form = '('
-
-        # fix for non-found nodes
-        for i, n in enumerate(nodes):
-            if n.id != i and i in idx_words and i in word_postags and i in word_deprels:
-                # new nodes will hang from root
-                new_node = D_Node.empty_node()
-                new_node.form = str(idx_words[i])
-                new_node.upos = str(word_postags[i])
-                new_node.id = i
-                new_node.head = 0
-                new_node.relation = str(word_deprels[i])
-                nodes.insert(i, new_node)
+                values.append(next((h for h in children_heads if h is not None), None))
+
+        offset = 0 if words and words[0].label == D_POSROOT else 1
+        nodes = []
+        for i, word in enumerate(words):
+            form = word.label
+            if form == '-RBR-':
+                form = ')'
+            elif form == '-LRB-':
+                form = '('
+            
+            postag = word.parent
+            upos   = postag.label if postag is not None else D_NONE_LABEL
+            deprel = postag.parent.label if (postag is not None and postag.parent is not None and len(postag.parent.children) == 1) else D_NONE_LABEL
+            head   = heads[i] + offset if heads[i] is not None else 0
+            nodes.append(D_Node(wid=i+offset, upos=upos, form=form, head=head, deprel=deprel))
         return D_Tree(nodes)
         
 
@@ -917,6 +1171,15 @@ class D_Tree:
                 tree_dependants[node.head] = tree_dependants.get(node.head, 0) + 1
             avgs.append(sum(tree_dependants.values())/len(tree_dependants))        
         return sum(avgs)/len(avgs)
+
+    @staticmethod
+    def get_avg_crossing_arcs(trees):
+        '''
+        Given a list of trees returns the average number
+        of pairs of crossing arcs per tree
+        '''
+        crossings = [tree.count_crossing_arcs() for tree in trees]
+        return sum(crossings)/len(crossings) if len(crossings)>0 else 0
         
     @staticmethod
     def get_avg_distance_head_dependant(trees):
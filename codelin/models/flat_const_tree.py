@@ -0,0 +1,445 @@
+from codelin.models.const_tree import C_Tree
+from codelin.utils.constants import C_END_LABEL, C_ROOT_LABEL
+from codelin.utils.symbols import SymbolTable
+from array import array
+
+
+class FlatCTree:
+    '''
+    Constituent tree stored as flat integer arrays instead of linked C_Tree
+    nodes. Nodes are numbered in preorder (the root is node 0) and the
+    arrays are indexed by node:
+        - labels: id of the node label in the SymbolTable of the tree (symbols)
+        - parent, first_child, next_sibling: links between nodes (-1 if missing)
+        - end: the subtree of a node spans the nodes node..end[node]-1
+        - leaf_start, leaf_end: the subtree of a node spans the leaves leaf_start..leaf_end-1
+    leaves holds the node of every leaf (word) in sentence order and features the
+    features of the nodes that have them. The symbol table can be shared by the
+    trees of a batch (e.g. the ones read from a file), so every distinct label
+    string is stored once per batch; the trees derived from a tree use its table.
+
+    The transformations used by the encoders (collapse_unary, to_binary_right,
+    to_binary_left) return new trees; add_root_node and add_end_node modify the
+    tree in place as in C_Tree.
+    '''
+    __slots__ = ('labels', 'parent', 'first_child', 'next_sibling', 'end', 'leaf_start', 'leaf_end', 'leaves', 'features', 'symbols')
+
+    def __init__(self, labels, parents, symbols, features=None):
+        '''
+        Builds the tree from the label ids (in symbols) and the parents of its nodes in preorder
+        '''
+        self.symbols = symbols
+        self.features = features if features else {}
+        self.build(labels, parents)
+
+    def build(self, labels, parents):
+        # the links are computed over lists, as indexing them is
+        # faster than indexing arrays, and stored as arrays
+        n = len(labels)
+        parents = list(parents)
+
+        # children links
+        first_child = [-1]*n
+        next_sibling = [-1]*n
+        last_child = [-1]*n
+        for node in range(1, n):
+            p = parents[node]
+            if last_child[p] == -1:
+                first_child[p] = node
+            else:
+                next_sibling[last_child[p]] = node
+            last_child[p] = node
+
+        # leaves and spans; descendants follow their ancestors in preorder
+        leaves = [node for node in range(n) if first_child[node] == -1]
+        leaf_start = [0]*n
+        leaf_end = [0]*n
+        n_leaves = 0
+        for node in range(n):
+            leaf_start[node] = n_leaves
+            if first_child[node] == -1:
+                n_leaves += 1
+            leaf_end[node] = n_leaves
+
+        end = list(range(1, n+1))
+        for node in range(n-1, 0, -1):
+            p = parents[node]
+            if end[node] > end[p]:
+                end[p] = end[node]
+            if leaf_end[node] > leaf_end[p]:
+                leaf_end[p] = leaf_end[node]
+
+        self.labels = array('i', labels)
+        self.parent = array('i', parents)
+        self.first_child = array('i', first_child)
+        self.next_sibling = array('i', next_sibling)
+        self.leaves = array('i', leaves)
+        self.leaf_start = array('i', leaf_start)
+        self.leaf_end = array('i', leaf_end)
+        self.end = array('i', end)
+
+# Getters
+    def get_label(self, node):
+        return self.symbols[self.labels[node]]
+
+    def get_children(self, node):
+        children = []
+        child = self.first_child[node]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def get_words(self):
+        '''
+        Returns the labels of the terminal nodes of the tree
+        '''
+        symbols = self.symbols
+        return [symbols[self.labels[leaf]] for leaf in self.leaves]
+
+    def get_postags(self):
+        '''
+        Returns the labels of the preterminal nodes of the tree
+        '''
+        symbols = self.symbols
+        return [symbols[self.labels[node]] for node in self.get_preterminals()]
+
+    def get_preterminals(self):
+        '''
+        Returns the preterminal nodes of the tree
+        '''
+        return [node for node in range(len(self.labels)) if self.is_preterminal(node)]
+
+    def n_nodes(self):
+        return len(self.labels)
+
+# Checkers
+    def is_terminal(self, node):
+        return self.first_child[node] == -1
+
+    def is_preterminal(self, node):
+        child = self.first_child[node]
+        return child != -1 and self.next_sibling[child] == -1 and self.first_child[child] == -1
+
+    def is_unary_chain(self, node):
+        child = self.first_child[node]
+        return child != -1 and self.next_sibling[child] == -1 and self.first_child[child] != -1
+
+    def is_left_child(self, node):
+        p = self.parent[node]
+        return p == -1 or self.first_child[p] == node
+
+# Traversals
+    def is_traversal_leaf(self, node, preterminals_as_leaves):
+        return self.first_child[node] == -1 or (preterminals_as_leaves and self.is_preterminal(node))
+
+    def preorder(self, preterminals_as_leaves=False):
+        '''
+        Returns the nodes in preorder. If preterminals_as_leaves is set the
+        preterminals are taken as leaves (i.e. as if they were replaced by their words).
+        '''
+        if not preterminals_as_leaves:
+            return list(range(len(self.labels)))
+        return [node for node in range(len(self.labels))
+                if not (self.first_child[node] == -1 and node > 0 and self.is_preterminal(self.parent[node]))]
+
+    def inorder(self, preterminals_as_leaves=False):
+        '''
+        Returns the nodes in the inorder of C_Tree.inorder: all children but
+        the last one, the node and the last child.
+        '''
+        nodes = []
+        stack = [(0, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited or self.is_traversal_leaf(node, preterminals_as_leaves):
+                nodes.append(node)
+                continue
+
+            children = self.get_children(node)
+            if len(children) > 1:
+                stack.append((children[-1], False))
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children[:max(len(children)-1, 1)]))
+        return nodes
+
+    def postorder(self, preterminals_as_leaves=False):
+        '''
+        Returns the nodes in postorder
+        '''
+        nodes = []
+        stack = [(0, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited or self.is_traversal_leaf(node, preterminals_as_leaves):
+                nodes.append(node)
+                continue
+
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(self.get_children(node)))
+        return nodes
+
+    def get_traversal(self, order, preterminals_as_leaves=False):
+        '''
+        Same as C_Tree.get_traversal: returns a tuple (is leaf, is left child,
+        label) for every node in the given order ("preorder", "inorder" or
+        "postorder"). If preterminals_as_leaves is set the preterminals are
+        taken as leaves labeled with their word.
+        '''
+        symbols, labels = self.symbols, self.labels
+        traversal = []
+        for node in getattr(self, order)(preterminals_as_leaves):
+            is_leaf = self.is_traversal_leaf(node, preterminals_as_leaves)
+            label_node = self.first_child[node] if is_leaf and self.first_child[node] != -1 else node
+            traversal.append((is_leaf, self.is_left_child(node), symbols[labels[label_node]]))
+        return traversal
+
+# Tree processing
+    def collapse_unary(self, unary_joiner="[+]", intermediate_only=False):
+        '''
+        Returns a new tree where the unary chains are replaced by a
+        node labeled with the members of the chain joined by unary_joiner,
+        as C_Tree.collapse_unary does.
+        '''
+        symbols = self.symbols
+        labels, parents = [], []
+        stack = [(0, -1)]
+        while stack:
+            node, p = stack.pop()
+            label = self.labels[node]
+            child = self.first_child[node]
+            if self.is_unary_chain(node) and (not intermediate_only or not self.is_preterminal(child)):
+                chain = [symbols[label], symbols[self.labels[child]]]
+                while self.is_unary_chain(child):
+                    child = self.first_child[child]
+                    chain.append(symbols[self.labels[child]])
+                label = symbols.intern(unary_joiner.join(chain))
+                node = child
+
+            labels.append(label)
+            parents.append(p)
+            new_node = len(labels)-1
+            stack.extend((child, new_node) for child in reversed(self.get_children(node)))
+
+        return FlatCTree(labels, parents, symbols)
+
+    @staticmethod
+    def to_binary_right(t, binary_marker="*"):
+        '''
+        Returns the right binarization of a tree (see C_Tree.to_binary_right)
+        '''
+        return FlatCTree.to_binary(t, binary_marker, right=True)
+
+    @staticmethod
+    def to_binary_left(t, binary_marker="*"):
+        '''
+        Returns the left binarization of a tree (see C_Tree.to_binary_left)
+        '''
+        return FlatCTree.to_binary(t, binary_marker, right=False)
+
+    @staticmethod
+    def to_binary(t, binary_marker, right):
+        if t is None or t.first_child[0] == -1:
+            return None
+
+        symbols = t.symbols
+        t_labels, get_children = t.labels, t.get_children
+        labels, parents, features = [], [], {}
+
+        # entries (label id, children, parent in the new tree, node in the old tree or -1
+        # for the intermediate nodes that group the rest of the children)
+        stack = [(t_labels[0], get_children(0), -1, 0)]
+        while stack:
+            label, children, p, node = stack.pop()
+            if node != -1 and t.features and node in t.features:
+                features[len(labels)] = t.features[node]
+            labels.append(label)
+            parents.append(p)
+            new_node = len(labels)-1
+
+            if len(children) <= 2:
+                stack.extend((t_labels[c], get_children(c), new_node, c) for c in reversed(children))
+                continue
+
+            label_str = symbols[label]
+            rest_label = label if label_str.endswith(binary_marker) else symbols.intern(label_str + binary_marker)
+            if right:
+                first = children[0]
+                stack.append((rest_label, children[1:], new_node, -1))
+                stack.append((t_labels[first], get_children(first), new_node, first))
+            else:
+                last = children[-1]
+                stack.append((t_labels[last], get_children(last), new_node, last))
+                stack.append((rest_label, children[:-1], new_node, -1))
+
+        return FlatCTree(labels, parents, symbols, features)
+
+    def add_root_node(self):
+        '''
+        Adds a root node on top of the tree
+        '''
+        features = {node+1: feats for node, feats in self.features.items()}
+        if 0 in self.features:
+            features[0] = self.features[0]
+        self.features = features
+        self.build([self.symbols.intern(C_ROOT_LABEL)] + list(self.labels), [-1] + [p+1 for p in self.parent])
+
+    def add_end_node(self):
+        '''
+        Adds a dummy end node (preterminal and terminal) as the
+        rightmost child of the root. The new nodes go last in preorder,
+        so the arrays are only extended.
+        '''
+        n = len(self.labels)
+        n_leaves = len(self.leaves)
+        end_label = self.symbols.intern(C_END_LABEL)
+
+        child = self.first_child[0]
+        if child == -1:
+            self.first_child[0] = n
+        else:
+            while self.next_sibling[child] != -1:
+                child = self.next_sibling[child]
+            self.next_sibling[child] = n
+
+        self.labels.extend((end_label, end_label))
+        self.parent.extend((0, n))
+        self.first_child.extend((n+1, -1))
+        self.next_sibling.extend((-1, -1))
+        self.end.extend((n+2, n+2))
+        self.end[0] = n+2
+        self.leaf_start.extend((n_leaves, n_leaves))
+        self.leaf_end.extend((n_leaves+1, n_leaves+1))
+        self.leaf_end[0] = n_leaves+1
+        self.leaves.append(n+1)
+
+    def get_adjacent_leaves_lca(self, unary_joiner="[+]"):
+        '''
+        Same as C_Tree.get_adjacent_leaves_lca: returns, for every leaf but the
+        last one, a tuple (leaf, parent, n_commons, lca) with the labels indexed as
+        in C_Tree.path_to_leaves. The lca of a leaf and the next one is the node
+        whose previous child ends in the leaf, so the leaf spans give it directly.
+        '''
+        symbols = self.symbols
+        labels, first_child, next_sibling = self.labels, self.first_child, self.next_sibling
+
+        n = len(labels)
+        keys = [None]*n
+        indexes = [0]*n
+        n_commons = [0]*n
+        keys[0] = symbols[labels[0]]+'[0]'
+        n_commons[0] = len(keys[0].split(unary_joiner))
+
+        for node in range(n):
+            child = first_child[node]
+            k = 0
+            while child != -1:
+                if first_child[child] != -1:
+                    idx = indexes[node]+k
+                    key = symbols[labels[child]]+'['+str(idx)+']'
+                    keys[child] = key
+                    indexes[child] = idx
+                    n_commons[child] = n_commons[node]+len(key.split(unary_joiner))
+                child = next_sibling[child]
+                k += 1
+
+        rows = [None]*len(self.leaves)
+        for node in range(n):
+            previous = first_child[node]
+            child = next_sibling[previous] if previous != -1 else -1
+            while child != -1:
+                leaf = self.leaves[self.leaf_end[previous]-1]
+                rows[self.leaf_start[leaf]] = (symbols[labels[leaf]], keys[self.parent[leaf]], n_commons[node], keys[node])
+                previous = child
+                child = next_sibling[child]
+
+        return [row for row in rows if row is not None]
+
+# Conversions
+    @staticmethod
+    def from_labels(labels, parents, features=None, symbols=None):
+        '''
+        Builds a tree from the label strings and parents of its nodes in
+        preorder, interning the labels in symbols (a new table if not given)
+        '''
+        symbols = symbols if symbols is not None else SymbolTable()
+        return FlatCTree(symbols.intern_all(labels), parents, symbols, features)
+
+    @staticmethod
+    def from_c_tree(tree, symbols=None):
+        '''
+        Flattens a C_Tree, interning its labels in symbols (a new table if
+        not given). The nodes are copied into the arrays; the label strings
+        are shared with the C_Tree.
+        '''
+        symbols = symbols if symbols is not None else SymbolTable()
+        intern = symbols.intern
+        labels, parents, features = [], [], {}
+        stack = [(tree, -1)]
+        while stack:
+            node, p = stack.pop()
+            if node.features is not None:
+                features[len(labels)] = node.features
+            labels.append(intern(node.label))
+            parents.append(p)
+            new_node = len(labels)-1
+            stack.extend((child, new_node) for child in reversed(node.children))
+        return FlatCTree(labels, parents, symbols, features)
+
+    def to_c_tree(self):
+        '''
+        Returns the tree as new linked C_Tree nodes sharing the label strings
+        '''
+        symbols = self.symbols
+        nodes = []
+        for node in range(len(self.labels)):
+            c_node = C_Tree(symbols[self.labels[node]], feats=self.features.get(node))
+            p = self.parent[node]
+            if p != -1:
+                c_node.parent = nodes[p]
+                nodes[p].children.append(c_node)
+            nodes.append(c_node)
+        return nodes[0]
+
+    @staticmethod
+    def from_string(s, symbols=None):
+        '''
+        Parses a bracketed tree with C_Tree.from_string and flattens it
+        '''
+        return FlatCTree.from_c_tree(C_Tree.from_string(s), symbols)
+
+    @staticmethod
+    def read_trees_file(file_path):
+        '''
+        Reads the trees of a file, all of them sharing one symbol table
+        '''
+        symbols = SymbolTable()
+        with open(file_path, "r", encoding="utf-8") as f:
+            return [FlatCTree.from_string(tree_string, symbols) for tree_string in C_Tree.iter_tree_strings(f)]
+
+# Printing and python-related functions
+    def __str__(self):
+        '''
+        Bracketed tree, written as C_Tree writes it
+        '''
+        symbols = self.symbols
+        parts = []
+        for node in range(len(self.labels)):
+            if not self.is_left_child(node):
+                parts.append(" ")
+
+            label = symbols[self.labels[node]]
+            if self.first_child[node] != -1:
+                parts.append("(" + label + " ")
+                continue
+
+            parts.append(label.replace("(","-LBR-").replace(")","-RBR-").replace(" ","-BLK-"))
+            # close the subtrees that end in this leaf
+            p = self.parent[node]
+            while p != -1 and self.end[p] == node+1:
+                parts.append(")")
+                p = self.parent[p]
+        return "".join(parts)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,126 @@
+from codelin.models.const_label import C_Label
+from codelin.models.deps_label import D_Label
+
+
+class LabelVocabulary:
+    '''
+    Interns the labels of a treebank: every distinct label string gets
+    an integer id (in order of appearance), a single parsed label object
+    shared by all the tokens that carry it, and the number of times it
+    has been counted. Label objects are parsed from their string on first
+    use, so the vocabulary can be built while encoding (from the label
+    objects or strings) and used while decoding (label id or string to
+    label object).
+
+    The shared label objects must not be modified; the decoders work on
+    copies when they need to change a label.
+    '''
+    def __init__(self, mode, separator, unary_joiner="[+]"):
+        if mode not in ["CONST", "DEPS"]:
+            raise ValueError(f"[!] Unknown mode: {mode}")
+        self.mode = mode
+        self.separator = separator
+        self.unary_joiner = unary_joiner
+        self.ids = {}
+        self.strings = []
+        self.counts = []
+        self.labels = []
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, label):
+        return (label if type(label) is str else str(label)) in self.ids
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __getitem__(self, label_id):
+        '''
+        Returns the shared label object of label_id
+        '''
+        label = self.labels[label_id]
+        if label is None:
+            label = self.labels[label_id] = self.parse_string(self.strings[label_id])
+        return label
+
+    def parse_string(self, label_str):
+        if self.mode == "CONST":
+            return C_Label.from_string(label_str, self.separator, self.unary_joiner)
+        return D_Label.from_string(label_str, self.separator)
+
+    def get_id(self, label, default=None):
+        return self.ids.get(label if type(label) is str else str(label), default)
+
+    def add(self, label, count=1):
+        '''
+        Adds count occurrences of a label (string or label object)
+        and returns its id
+        '''
+        label_str = label if type(label) is str else str(label)
+        label_id = self.ids.get(label_str)
+        if label_id is None:
+            label_id = self.ids[label_str] = len(self.strings)
+            self.strings.append(label_str)
+            self.counts.append(0)
+            self.labels.append(None)
+        self.counts[label_id] += count
+        return label_id
+
+    def update(self, other):
+        '''
+        Adds the labels and counts of another vocabulary
+        '''
+        for label_str, count in zip(other.strings, other.counts):
+            self.add(label_str, count)
+
+    def parse(self, label_str):
+        '''
+        Returns the shared label object of a label string,
+        adding it to the vocabulary (without counting it) if new
+        '''
+        label_id = self.ids.get(label_str)
+        if label_id is None:
+            label_id = self.add(label_str, count=0)
+        return self[label_id]
+
+    def field_values(self):
+        '''
+        Returns the sets of n_commons, last_common and unary_chain
+        values of the labels of a constituent vocabulary
+        '''
+        if self.mode != "CONST":
+            raise ValueError("[!] Error: label fields are only available for constituent labels")
+        nci_set, lci_set, uci_set = set(), set(), set()
+        for label_id in range(len(self)):
+            label = self[label_id]
+            nci_set.add(str(label.n_commons))
+            lci_set.add(str(label.last_common))
+            uci_set.add(str(label.unary_chain))
+        return nci_set, lci_set, uci_set
+
+    def most_common(self, n=None):
+        '''
+        Returns the (label string, count) pairs sorted by count
+        '''
+        pairs = sorted(zip(self.strings, self.counts), key=lambda x: -x[1])
+        return pairs if n is None else pairs[:n]
+
+    def save(self, file_path):
+        '''
+        Writes the vocabulary as tab separated label and count lines, in id order
+        '''
+        with open(file_path, "w", encoding="utf-8") as f:
+            for label_str, count in zip(self.strings, self.counts):
+                f.write(label_str+"\t"+str(count)+"\n")
+
+    @staticmethod
+    def load(file_path, mode, separator, unary_joiner="[+]"):
+        vocab = LabelVocabulary(mode, separator, unary_joiner)
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if line:
+                    label_str, count = line.rsplit("\t", 1)
+                    vocab.add(label_str, int(count))
+        return vocab
@@ -169,11 +169,14 @@ class LinearizedTree:
 
     @staticmethod
     def from_string(content, mode, separator="[_]", unary_joiner="[+]", separate_columns=False, n_label_cols=1, 
-                    ignore_postags=False, n_features=0, sep_bits=-1):
+                    ignore_postags=False, n_features=0, sep_bits=-1, vocabulary=None, label_cache=None):
         '''
         Reads a linearized tree from a string shaped as:
         word \t postag \t (...) \t label \n
-        This version does not rely on -BOS- or -EOS- markers.
+        This version does not rely on -BOS- or -EOS- markers. If a LabelVocabulary
+        is given the labels are its shared label objects; if a label_cache (an
+        LRUCache) is given they are shared through it; otherwise each label is
+        parsed into a new object.
         '''
         labels = []
         words = []
@@ -217,20 +220,62 @@ class LinearizedTree:
             postags.append(postag)
             additional_feats.append(feats)
 
-            if mode == "CONST":
+            if mode == "DEPS" and sep_bits > 0:
+                label_parts = label.split(separator)
+                deprel = label_parts[-1]
+                bits = "".join(label_parts[:-1])
+                label = separator.join([bits, deprel])
+
+            if vocabulary is not None:
+                labels.append(vocabulary.parse(label))
+            elif label_cache is not None:
+                labels.append(LinearizedTree.parse_label(label, mode, separator, unary_joiner, label_cache))
+            elif mode == "CONST":
                     labels.append(C_Label.from_string(label, separator, unary_joiner))
             elif mode == "DEPS":
-                if sep_bits > 0:
-                    label_parts = label.split(separator)
-                    deprel = label_parts[-1]
-                    bits = "".join(label_parts[:-1])
-                    label = separator.join([bits, deprel])
                 labels.append(D_Label.from_string(label, separator))
             else:
                 raise ValueError(f"[!] Unknown mode: {mode}")
         
         return LinearizedTree(words, postags, additional_feats, labels, n_features)
 
+    @staticmethod
+    def parse_label(label, mode, separator, unary_joiner, label_cache):
+        '''
+        Returns the label object of a label string. Each label is parsed once
+        and then shared through label_cache, so the labels returned must not
+        be modified.
+        '''
+        key = (label, separator, unary_joiner, mode)
+        parsed = label_cache.get(key)
+        if parsed is None:
+            if mode == "CONST":
+                parsed = C_Label.from_string(label, separator, unary_joiner)
+            elif mode == "DEPS":
+                parsed = D_Label.from_string(label, separator)
+            else:
+                raise ValueError(f"[!] Unknown mode: {mode}")
+            label_cache.put(key, parsed)
+        return parsed
+
+    @staticmethod
+    def iter_blocks(file_io):
+        '''
+        Yields the raw linearized trees (blocks of rows separated by 
+        blank lines) of an already open labels file.
+        '''
+        block = []
+        for line in file_io:
+            line = line.rstrip("\r\n")
+            if line != "":
+                block.append(line)
+            elif len(block) > 0:
+                yield "\n".join(block)
+                block = []
+        
+        if len(block) > 0:
+            yield "\n".join(block)
+
     @staticmethod
     def to_look_behind(lin_tree: 'LinearizedTree'):
         '''
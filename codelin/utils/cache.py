@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''
+    Mapping bounded to maxsize entries that evicts the least recently
+    used one when full. Counts the hits and misses of its lookups.
+    '''
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.entries.get(key, default)
+        if value is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        '''
+        Returns the hits, misses and hit rate of the lookups so far
+        '''
+        lookups = self.hits + self.misses
+        return self.hits, self.misses, self.hits/lookups if lookups else 0.0
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
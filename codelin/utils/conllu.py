@@ -0,0 +1,51 @@
+class ConlluWriter:
+    '''
+    Buffered conllu serializer. Nodes are formatted straight into
+    a list of strings that is written to the file once it grows over
+    buffer_size entries. Without file the buffer is kept in memory
+    and can be retrieved with getvalue().
+    '''
+    def __init__(self, file_io=None, buffer_size=4096):
+        self.file_io = file_io
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.n_tokens = 0
+
+    def write_tree(self, tree, write_sentence=True):
+        '''
+        Adds a tree to the buffer, optionally preceded by its # text = ... line
+        '''
+        buffer = self.buffer
+        nodes = tree.nodes
+        if write_sentence:
+            buffer.append("# text = "+" ".join([node.form for node in nodes])+"\n")
+
+        for node in nodes:
+            buffer.append(f"{node.id}\t{node.form}\t{node.lemma}\t{node.upos}\t{node.xpos}\t{node.feats_to_str()}\t"
+                          f"{node.head}\t{node.relation}\t{node.deps}\t{node.misc}\n")
+        buffer.append("\n")
+        self.n_tokens += len(nodes)
+
+        if self.file_io is not None and len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_trees(self, trees, write_sentence=True):
+        for tree in trees:
+            self.write_tree(tree, write_sentence)
+
+    def getvalue(self):
+        return "".join(self.buffer)
+
+    def flush(self):
+        if self.file_io is not None and self.buffer:
+            self.file_io.write("".join(self.buffer))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
@@ -9,6 +9,9 @@ F_DEPENDENCY = "DEPS"
 OP_ENC = "ENC"
 OP_DEC = "DEC"
 
+# distinct parsed labels kept by the label cache of a decode run
+LABEL_CACHE_SIZE = 65536
+
 # CONSTITUENT ENCODINGS
 
 C_ABSOLUTE_ENCODING = 'ABS'
@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import multiprocessing
+
+# context of the current worker process, set once by the pool initializer
+_worker_context = None
+
+def _init_worker(context):
+    global _worker_context
+    _worker_context = context
+
+def _run_task(task, chunk):
+    return task(_worker_context, chunk)
+
+def chunked(iterable, chunk_size):
+    '''
+    Groups the elements of an iterable into lists of
+    at most chunk_size elements.
+    '''
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class WorkerPool:
+    '''
+    Persistent pool of worker processes. The context (usually an encoder
+    and its options) is sent once to every worker when the pool starts;
+    afterwards only the chunks of raw input are shipped.
+
+    Tasks must be module level functions shaped as task(context, chunk).
+    '''
+    def __init__(self, task, context, n_workers=None):
+        self.task = task
+        self.context = context
+        self.n_workers = n_workers if n_workers else multiprocessing.cpu_count()
+        self.executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker, initargs=(context,))
+
+    def imap(self, chunks):
+        '''
+        Runs the task over an iterable of chunks yielding the results in
+        input order. At most 2*n_workers chunks are in flight, so chunks
+        are consumed lazily.
+        '''
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self.executor.submit(_run_task, self.task, chunk))
+            if len(pending) > 2 * self.n_workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,41 @@
+class SymbolTable:
+    '''
+    Interns strings as consecutive integer ids. The first object
+    seen for every string is the one kept, so the strings returned
+    by the table are shared (not copied) between their users.
+    '''
+    def __init__(self):
+        self.ids = {}
+        self.symbols = []
+
+    def intern(self, symbol):
+        '''
+        Returns the id of symbol, adding it to the table if needed
+        '''
+        sid = self.ids.get(symbol)
+        if sid is None:
+            sid = self.ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return sid
+
+    def intern_all(self, symbols):
+        '''
+        Returns the ids of a list of symbols, adding the new ones to the table
+        '''
+        get = self.ids.get
+        sids = [get(symbol, -1) for symbol in symbols]
+        if -1 in sids:
+            sids = [sid if sid != -1 else self.intern(symbol) for sid, symbol in zip(sids, symbols)]
+        return sids
+
+    def get_id(self, symbol, default=None):
+        return self.ids.get(symbol, default)
+
+    def __getitem__(self, sid):
+        return self.symbols[sid]
+
+    def __contains__(self, symbol):
+        return symbol in self.ids
+
+    def __len__(self):
+        return len(self.symbols)
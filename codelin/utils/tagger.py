@@ -0,0 +1,13 @@
+import stanza
+
+# stanza pipelines already built in the current process
+_pipelines = {}
+
+def get_pipeline(lang, processors):
+    '''
+    Returns a stanza pipeline for the given language and processors. The
+    pipeline is built only once per process (i.e. once per worker).
+    '''
+    if (lang, processors) not in _pipelines:
+        _pipelines[(lang, processors)] = stanza.Pipeline(lang=lang, processors=processors)
+    return _pipelines[(lang, processors)]
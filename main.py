@@ -103,6 +103,12 @@ if __name__=="__main__":
     parser.add_argument('--add_bos_eos', required=False, action='store_true', default=False,    
                         help = 'Add BOS and EOS tokens to the labels')
 
+    parser.add_argument('--chunk_size', required=False, type=int, default=1000,
+                        help = 'Number of trees sent to a worker process at a time')
+
+    parser.add_argument('--workers', required=False, type=int, default=None,
+                        help = 'Number of worker processes (defaults to the number of cpus)')
+
     args = parser.parse_args()
 
     if args.time:
@@ -111,30 +117,34 @@ if __name__=="__main__":
     if args.formalism == F_CONSTITUENT:
         
         if args.operation == OP_ENC:
-            n_labels, n_trees, n_diff_labels, label_set, lci_set, nci_set, uci_set = encode_constituent(args.input, args.output, args.enc, args.incremental,
+            n_labels, n_trees, n_diff_labels, label_vocab = encode_constituent(args.input, args.output, args.enc, args.incremental,
                                                                   args.sep, args.multitask, args.n_label_cols,
                                                                   args.ujoiner, args.feats, 
                                                                   args.binary, args.b_direction, args.b_marker,
-                                                                  args.traverse, args.ignore_postags, args.add_bos_eos)
+                                                                  args.traverse, args.ignore_postags, args.add_bos_eos, 
+                                                                  args.chunk_size, args.workers)
         
         elif args.operation == OP_DEC:
             n_diff_labels = None
-            n_trees, n_labels = decode_constituent(args.input, args.output, args.enc, args.incremental, args.sep, 
+            n_trees, n_labels, cache_stats = decode_constituent(args.input, args.output, args.enc, args.incremental, args.sep, 
                                                    args.multitask, args.n_label_cols, args.ujoiner, args.conflict, args.nulls, 
                                                    args.postags, args.lang, 
-                                                   args.binary, args.b_marker, args.traverse)
+                                                   args.binary, args.b_marker, args.traverse,
+                                                   args.chunk_size, args.workers)
     
     elif args.formalism == F_DEPENDENCY:
         
         if args.operation == OP_ENC:
             n_trees, n_labels, n_diff_labels = encode_dependencies(args.input, args.output, args.enc, args.sep, args.multitask,
-                                                                   args.disp, args.planar, args.hfr, args.feats, args.sep_bits, args.add_bos_eos)
+                                                                   args.disp, args.planar, args.hfr, args.feats, args.sep_bits, args.add_bos_eos,
+                                                                   args.chunk_size, args.workers)
         
         elif args.operation == OP_DEC:
             n_diff_labels = None
-            n_trees, n_labels, n_heur = decode_dependencies(args.input, args.output, args.enc, args.sep, args.multitask, args.n_label_cols,
+            n_trees, n_labels, n_heur, heur_counts, cache_stats = decode_dependencies(args.input, args.output, args.enc, args.sep, args.multitask, args.n_label_cols,
                                                     args.disp, args.rsingle, args.rsearch, 
-                                                    args.hfr, args.lang, args.sep_bits, args.count_heur)
+                                                    args.hfr, args.lang, args.sep_bits, args.count_heur,
+                                                    args.chunk_size, args.workers)
 
 
 
@@ -153,9 +163,14 @@ if __name__=="__main__":
         print('%10s' % ('total labels'),n_labels)
         if n_diff_labels is not None:
             print('%10s' % ('unique labels'),n_diff_labels)
+        if args.operation == OP_DEC:
+            hits, misses = cache_stats
+            print('%10s' % ('label cache hit rate'),"{:.5f}".format(hits/(hits+misses) if hits+misses else 0))
         if n_heur != 0:
             print('%10s' % ('trees w/ heuristics'),n_heur)
             print('%10s' % ('heuristics percentage'),"{:.5f}".format(n_heur/n_trees))
+            for heuristic, count in sorted(heur_counts.items()):
+                print('%10s' % ('trees w/ '+heuristic),count)
         print('%10s' % ('time per label'),ls_str)
         print('%10s' % ('time per tree'),ts_str)
         print('%10s' % ('total time'),t_str)